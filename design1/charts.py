@@ -1,5 +1,4 @@
 # charts.py
-import json
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
@@ -10,11 +9,15 @@ from config_data import (
     US_CENTER_LAT,
     US_CENTER_LON,
     US_ZOOM_LEVEL,
+    ZIP_ZOOM_LEVEL,
     US_BOUNDS,
 )
 from config_data import get_colorscale
-from config_data import compute_rankings
-from geo_utils import build_city_cbsa_polygons
+from config_data import RANK_COLUMNS, compute_rankings
+from geo_utils import build_city_cbsa_polygons, get_geojson, load_centroids
+from utils.data_version import current_data_version
+from utils.geometry import attach_centers
+from utils.affordability import AFFORDABILITY_COLORS
 
 # ----------------- METRO LEVEL -----------------
 def create_city_choropleth(df_city, cbsa_gdf, map_style, metric_name, is_dark_mode=False):
@@ -26,21 +29,20 @@ def create_city_choropleth(df_city, cbsa_gdf, map_style, metric_name, is_dark_mo
         st.warning(f"No valid data for {metric_name}")
         return None, None
 
-    city_polygons = build_city_cbsa_polygons(df_city, cbsa_gdf, metric_name)
+    city_polygons = build_city_cbsa_polygons(df_city, cbsa_gdf, metric_name, current_data_version())
     if city_polygons.empty:
         return None, None
 
     city_polygons = city_polygons.reset_index(drop=True)
-    city_polygons["id"] = city_polygons.index.astype(str)
+    city_polygons["id"] = city_polygons["city"].astype(str)
 
-    city_polygons_4326 = city_polygons.to_crs(epsg=4326)
-    city_polygons_proj = city_polygons_4326.to_crs(epsg=2163)
-    centroids_proj = city_polygons_proj.geometry.centroid
-    centroids_4326 = gpd.GeoSeries(centroids_proj, crs=2163).to_crs(epsg=4326)
-    city_polygons_4326["center_lat"] = centroids_4326.y
-    city_polygons_4326["center_lon"] = centroids_4326.x
+    # Hover points come from the prebuilt centroid table, looked up by GEOID
+    city_polygons_4326 = attach_centers(
+        city_polygons.to_crs(epsg=4326), load_centroids(), "cbsa", "cbsa_geoid"
+    )
 
-    geojson = json.loads(city_polygons_4326.to_json())
+    # Geometry is serialized once per metro set; each render only adds z / customdata
+    geojson = get_geojson("cbsa", "US", "full", city_polygons_4326, "id")
     vmin = float(city_polygons["avg_metric_value"].min())
     vmax = float(city_polygons["avg_metric_value"].max())
     colorscale = get_colorscale(metric_name, is_dark_mode)
@@ -70,7 +72,7 @@ def create_city_choropleth(df_city, cbsa_gdf, map_style, metric_name, is_dark_mo
             geojson=geojson,
             locations=city_polygons_4326["id"],
             z=city_polygons_4326["avg_metric_value"],
-            featureidkey="properties.id",
+            featureidkey="id",
             colorscale=colorscale,
             zmin=vmin,
             zmax=vmax,
@@ -145,7 +147,8 @@ def create_city_choropleth(df_city, cbsa_gdf, map_style, metric_name, is_dark_mo
 
 # ----------------- ZIP LEVEL -----------------
 def create_zip_choropleth(
-    gdf, map_style, city_coords, center_df, metric_name, is_dark_mode=False
+    gdf, map_style, city_coords, center_df, metric_name, is_dark_mode=False,
+    metro=None, detail="full",
 ):
     if gdf.empty:
         return None, None
@@ -156,8 +159,9 @@ def create_zip_choropleth(
         return None, None
 
     gdf = gdf.reset_index(drop=True)
-    gdf["id"] = gdf.index.astype(str)
-    gdf = compute_rankings(gdf, "metric_value", "zip_code_str")
+    gdf["id"] = gdf["zip_code_str"].astype(str)
+    if not set(RANK_COLUMNS).issubset(gdf.columns):
+        gdf = compute_rankings(gdf, "metric_value", "zip_code_str")
 
     gdf_4326 = (
         gdf.to_crs(epsg=4326)
@@ -165,17 +169,16 @@ def create_zip_choropleth(
         else gdf.copy()
     )
 
-    if isinstance(gdf_4326, gpd.GeoDataFrame) and gdf_4326.geometry.notna().any():
-        gdf_proj = gdf_4326.to_crs(epsg=2163)
-        centroids_proj = gdf_proj.geometry.centroid
-        centroids_4326 = gpd.GeoSeries(centroids_proj, crs=2163).to_crs(epsg=4326)
-        gdf_4326["center_lat"] = centroids_4326.y
-        gdf_4326["center_lon"] = centroids_4326.x
-    else:
+    # Geometry packs carry precomputed centroids; otherwise look them up by ZCTA
+    has_centers = {"center_lat", "center_lon"}.issubset(gdf_4326.columns)
+    if not has_centers and isinstance(gdf_4326, gpd.GeoDataFrame) and gdf_4326.geometry.notna().any():
+        gdf_4326 = attach_centers(gdf_4326, load_centroids(), "zcta", "zip_code_str")
+    elif not has_centers:
         gdf_4326["center_lat"] = center_df["lat"]
         gdf_4326["center_lon"] = center_df["lon"]
 
-    geojson = json.loads(gdf_4326.to_json())
+    # Geometry is serialized once per (metro, detail); each render only adds z / customdata
+    geojson = get_geojson("zcta", metro or "", detail, gdf_4326, "id")
 
     if city_coords:
         center_lat, center_lon = city_coords
@@ -196,7 +199,7 @@ def create_zip_choropleth(
             geojson=geojson,
             locations=gdf_4326["id"],
             z=gdf_4326["metric_value"],
-            featureidkey="properties.id",
+            featureidkey="id",
             colorscale=colorscale,
             zmin=vmin,
             zmax=vmax,
@@ -248,7 +251,7 @@ def create_zip_choropleth(
     fig.update_layout(
         mapbox=dict(
             style=map_style,
-            zoom=9,
+            zoom=ZIP_ZOOM_LEVEL,
             center={"lat": center_lat, "lon": center_lon},
             bounds=US_BOUNDS,
         ),
@@ -351,14 +354,6 @@ def create_history_chart(zip_hist: pd.DataFrame, metro_avg: float, metric_name:
     )
     return fig
 
-# Affordability color bands for PTI
-AFFORDABILITY_COLORS = {
-    "Affordable": "#4CAF50",                # green
-    "Moderately Unaffordable": "#FFC107",   # amber
-    "Seriously Unaffordable": "#FF9800",    # orange
-    "Severely Unaffordable": "#E57373",     # light red
-    "Impossibly Unaffordable": "#B71C1C",   # dark red
-}
 
 # ----------------- METRO TIME SERIES CHART -----------------
 def create_metro_timeseries_chart(metro_hist: pd.DataFrame, metric_name: str, is_dark_mode: bool = False):
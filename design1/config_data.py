@@ -6,6 +6,8 @@ Central place for:
 - Colorscales
 - Data loading (Databricks or local files)
 - Metric utilities: PTI, rankings, YoY
+- Precomputed metric cube (both metrics × all years, ZIP and metro level)
+- Sorted (city, zip, year) row index for ZIP history lookups
 
 If you want to switch from Databricks to local CSV/Parquet later,
 you only need to modify:
@@ -19,6 +21,12 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
+from utils.aggregates import aggregate_exists, read_aggregate
+from utils.data_version import current_data_version
+from utils.house_store import ipc_exists, partitions_exist, read_ipc, read_partitions
+from utils.query import query, register_table
+from utils.schema import apply_schema
+
 # Get the absolute path to the design1 directory (where this module is located)
 _DESIGN1_DIR = Path(__file__).parent.resolve()
 
@@ -36,6 +44,14 @@ USE_LOCAL_DATA = True
 
 # Local file paths (you can change these later)
 LOCAL_HOUSE_FILE = "data/house_ts_agg.csv"   # or .csv
+# Optional metro=XXX/year=YYYY copy of LOCAL_HOUSE_FILE for ZIP drill-downs, built with
+#   python -m utils.build_data partitions --source design1/data/house_ts_agg.csv \
+#       --out design1/data/house_ts_agg_partitioned
+LOCAL_HOUSE_PARTITIONS = "data/house_ts_agg_partitioned"
+# Optional memory-mapped Arrow IPC copy of LOCAL_HOUSE_FILE, shared by all processes:
+#   python -m utils.build_data ipc --source design1/data/house_ts_agg.csv \
+#       --out design1/data/house_ts_agg.arrow
+LOCAL_HOUSE_IPC = "data/house_ts_agg.arrow"
 #LOCAL_ZIP_GEO_FILE = "data/zip_geo.parquet"      # or .csv
 
 # ============================================================
@@ -57,6 +73,8 @@ ZCTA_ZIP_PATH = "data/zcta_shapes.zip"
 US_CENTER_LAT = 39.8283
 US_CENTER_LON = -98.5795
 US_ZOOM_LEVEL = 3.8
+# Zoom the ZIP drill-down map opens at (also picks the polygon detail level)
+ZIP_ZOOM_LEVEL = 9
 
 # Map bounds to keep users within the U.S. region when panning
 US_BOUNDS = {
@@ -66,11 +84,6 @@ US_BOUNDS = {
     "north": 52,
 }
 
-# Manual mapping for special metros → CBSA.NAME (keys are lowercase)
-MANUAL_CBSA_NAME_MAP = {
-    "dc_metro": "Washington-Arlington-Alexandria, DC-VA-MD-WV",
-}
-
 # ============================================================
 # 3. Theme CSS & colorscales
 # ============================================================
@@ -197,18 +210,17 @@ def _standardize_house_df(df: pd.DataFrame) -> pd.DataFrame:
       city, city_full, zip_code, year,
       median_sale_price, per_capita_income, lat, lon
     """
-    df = df.copy()
-    df["zip_code"] = df["zip_code"].astype("Int64")
-    df["zip_code_str"] = (
-        df["zip_code"].astype(str)
-        .str.replace("<NA>", "", regex=False)
-        .str.zfill(5)
-    )
+    # Shallow copy: only the derived columns are new, the rest stay shared
+    # (zero-copy when df is memory-mapped)
+    df = df.copy(deep=False)
+    df["zip_code"] = pd.to_numeric(df["zip_code"], errors="coerce")
+    df["zip_code_str"] = df["zip_code"]
     df["city_clean"] = df["city"].astype(str).str.lower().str.strip()
-    df["year"] = df["year"].astype(int)
-    df["median_sale_price"] = pd.to_numeric(df["median_sale_price"], errors="coerce")
-    df["per_capita_income"] = pd.to_numeric(df["per_capita_income"], errors="coerce")
-    return df
+    return apply_schema(
+        df,
+        required=["city", "city_full", "zip_code", "year", "median_sale_price", "per_capita_income"],
+        name="house_ts_agg",
+    )
 
 def _load_all_data_databricks() -> pd.DataFrame:
     """
@@ -254,7 +266,13 @@ def _load_all_data_local() -> pd.DataFrame:
     if not Path(house_file_path).is_absolute():
         house_file_path = str(_DESIGN1_DIR / LOCAL_HOUSE_FILE)
 
-    if house_file_path.lower().endswith(".parquet"):
+    ipc_path = _DESIGN1_DIR / LOCAL_HOUSE_IPC
+    if ipc_exists(ipc_path):
+        house = read_ipc(path=ipc_path)
+    elif not Path(house_file_path).exists() and aggregate_exists("house_ts_agg"):
+        # Same table, produced by `python -m utils.build_data aggregates`
+        house = read_aggregate("house_ts_agg")
+    elif house_file_path.lower().endswith(".parquet"):
         house = pd.read_parquet(house_file_path)
     else:
         house = pd.read_csv(house_file_path)
@@ -270,11 +288,15 @@ def _load_all_data_local() -> pd.DataFrame:
 
     return _standardize_house_df(house)
 
-@st.cache_data(show_spinner="📊 Loading housing data...", ttl=3600, max_entries=1)
 def load_all_data() -> pd.DataFrame:
     """
     Public data loading function used by app.py.
 
+    Cached as a shared resource: every session gets the same read-only
+    DataFrame instead of a deserialized copy per rerun. The cache is keyed
+    on the data-version fingerprint, so it is reloaded exactly when the
+    source files change.
+
     It chooses Databricks or local implementation based on
     USE_LOCAL_DATA flag above.
 
@@ -283,12 +305,34 @@ def load_all_data() -> pd.DataFrame:
     - When USE_LOCAL_DATA = True:
         data are loaded from local files
     """
+    return _load_all_data_cached(current_data_version())
+
+@st.cache_resource(show_spinner="📊 Loading housing data...", max_entries=1)
+def _load_all_data_cached(data_version: str) -> pd.DataFrame:
+    """load_all_data() for one data version (max_entries=1 drops the old one)."""
     if USE_LOCAL_DATA:
         df = _load_all_data_local()
     else:
         df = _load_all_data_databricks()
     return df
 
+def load_metro_data(city: str) -> pd.DataFrame:
+    """
+    Rows of a single metro, used by the ZIP drill-down.
+
+    Reads only that metro's partitions when LOCAL_HOUSE_PARTITIONS has been
+    built; otherwise filters the full table from load_all_data().
+    """
+    return _load_metro_data_cached(city, current_data_version())
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _load_metro_data_cached(city: str, data_version: str) -> pd.DataFrame:
+    partitions_dir = _DESIGN1_DIR / LOCAL_HOUSE_PARTITIONS
+    if USE_LOCAL_DATA and partitions_exist(partitions_dir):
+        return _standardize_house_df(read_partitions(metros=[city], path=partitions_dir))
+    df_all = load_all_data()
+    return df_all[df_all["city"] == city].reset_index(drop=True)
+
 # ============================================================
 # 6. Metric utilities: PTI, rankings, YoY
 # ============================================================
@@ -370,22 +414,200 @@ def compute_yoy(
     merged["yoy_pct"] = (merged["yoy_change"] / merged[f"{value_col}_prev"] * 100).round(1)
     return merged
 
-@st.cache_data(ttl=3600, max_entries=10)
-def get_metro_yoy(df_all_input: pd.DataFrame, current_year: int, metric_type_input: str) -> pd.DataFrame:
+def get_metro_yoy(current_year: int, metric_type_input: str, city: str = None) -> pd.DataFrame:
     """
-    Cached helper to compute metro-level year-over-year changes
-    for either PTI or median sale price.
+    Metro-level year-over-year changes for either PTI or median sale price,
+    looked up in the precomputed lag table of the metric cube.
 
     metric_type_input should be one of:
         - "Price-to-Income Ratio (PTI)"
         - "Median Sale Price"
+
+    Columns: city, city_full, <value>, <value>_prev, yoy_change, yoy_pct,
+    where <value> is PTI or median_sale_price. With city, only that metro's row.
     """
-    df_all_local = df_all_input.copy()
-    if metric_type_input == "Price-to-Income Ratio (PTI)":
-        df_processed = compute_pti(df_all_local)
-        value_col = "PTI"
-    else:
-        df_processed = df_all_local[df_all_local["median_sale_price"].notna()].copy()
-        value_col = "median_sale_price"
+    return metric_cube_slice("metro_yoy", metric_type_input, current_year, city=city)
+
+# ============================================================
+# 7. Precomputed metric cube
+# ============================================================
+
+PTI_METRIC = "Price-to-Income Ratio (PTI)"
+PRICE_METRIC = "Median Sale Price"
+METRICS = [PTI_METRIC, PRICE_METRIC]
+
+_ZIP_KEYS = ["city", "city_full", "city_clean", "zip_code_str", "year"]
+_METRO_KEYS = ["city", "city_full", "city_clean"]
+_YOY_COLUMNS = ["yoy_change", "yoy_pct"]
+RANK_COLUMNS = ["rank", "rank_total", "percentile"]
+
+# Query-layer table of each cube level
+CUBE_TABLES = {level: f"design1_{level}" for level in ("zip", "metro", "metro_yoy")}
+
+def _value_column(metric_type: str) -> str:
+    """Column of df_all holding the metric's value."""
+    return "PTI" if metric_type == PTI_METRIC else "median_sale_price"
+
+def _metric_rows(df_all: pd.DataFrame, metric_type: str):
+    """Valid rows for the metric and the column holding its value."""
+    if metric_type == PTI_METRIC:
+        return compute_pti(df_all), _value_column(metric_type)
+    return df_all[df_all["median_sale_price"].notna()], _value_column(metric_type)
+
+def add_yoy_columns(df: pd.DataFrame, group_cols: list, value_col: str) -> pd.DataFrame:
+    """
+    Add <value_col>_prev, yoy_change and yoy_pct for every row of every
+    year in one sort and shift per group (the previous row only counts if
+    it is the previous calendar year).
+    """
+    df = df.sort_values(group_cols + ["year"], kind="stable").reset_index(drop=True)
+    grouped = df.groupby(group_cols, observed=True, sort=False)
+    consecutive = grouped["year"].shift(1) == df["year"] - 1
+    df[f"{value_col}_prev"] = grouped[value_col].shift(1).where(consecutive)
+    df["yoy_change"] = df[value_col] - df[f"{value_col}_prev"]
+    df["yoy_pct"] = df["yoy_change"] / df[f"{value_col}_prev"] * 100
+    return df
+
+def add_rank_columns(df: pd.DataFrame, value_col: str, group_cols: list) -> pd.DataFrame:
+    """
+    Add rank, rank_total and percentile (as in compute_rankings) within
+    every group in one grouped rank pass. Ranks are computed in place.
+    """
+    grouped = df.groupby(group_cols, observed=True)[value_col]
+    df["rank"] = grouped.rank(ascending=False, method="min").astype(int)
+    df["rank_total"] = grouped.transform("size")
+    df["percentile"] = ((df["rank_total"] - df["rank"] + 1) / df["rank_total"] * 100).round(1)
+    return df
+
+def build_metric_cube(df_all: pd.DataFrame) -> dict:
+    """
+    Aggregate both metrics for every year at ZIP and metro level at once.
+
+    Returns a dict with one long table per level ("zip", "metro",
+    "metro_yoy"); each row carries its metric and year, and
+    metric_cube_slice() looks up the (metric, year) table the page used to
+    rebuild on every rerun:
+      - zip:       city, city_full, city_clean, zip_code_str, year,
+                   metric_value, lat, lon, metric_value_prev, yoy_change,
+                   yoy_pct, rank, rank_total, percentile (within the metro)
+      - metro:     city, city_full, city_clean, n, avg_metric_value, lat, lon,
+                   rank, rank_total, percentile (among all metros)
+      - metro_yoy: city, city_full, value, value_prev, yoy_change, yoy_pct
+                   (compute_yoy's columns under metric-independent names)
+    """
+    parts = {"zip": [], "metro": [], "metro_yoy": []}
+    for metric_type in METRICS:
+        df_metric, value_col = _metric_rows(df_all, metric_type)
+        df_zip = df_metric.groupby(_ZIP_KEYS, as_index=False, observed=True).agg(
+            metric_value=(value_col, "mean"),
+            lat=("lat", "mean"),
+            lon=("lon", "mean"),
+        )
+        df_zip = add_yoy_columns(df_zip, _ZIP_KEYS[:-1], "metric_value")
+        df_metro = df_zip.groupby(_METRO_KEYS + ["year"], as_index=False, observed=True).agg(
+            n=("zip_code_str", "count"),
+            avg_metric_value=("metric_value", "mean"),
+            lat=("lat", "mean"),
+            lon=("lon", "mean"),
+        )
+        add_rank_columns(df_zip, "metric_value", ["city", "year"])
+        add_rank_columns(df_metro, "avg_metric_value", ["year"])
+        parts["zip"].append(df_zip.assign(metric=metric_type))
+        parts["metro"].append(df_metro.assign(metric=metric_type))
+
+        # Metro YoY averages the rows (not the ZIP means), like compute_yoy
+        df_metro_yoy = df_metric.groupby(["city", "city_full", "year"], as_index=False, observed=True).agg(
+            {value_col: "mean"}
+        )
+        df_metro_yoy = add_yoy_columns(df_metro_yoy, ["city", "city_full"], value_col)
+        df_metro_yoy["yoy_pct"] = df_metro_yoy["yoy_pct"].round(1)
+        df_metro_yoy = df_metro_yoy.rename(columns={value_col: "value", f"{value_col}_prev": "value_prev"})
+        parts["metro_yoy"].append(df_metro_yoy.assign(metric=metric_type))
+    return {level: pd.concat(frames, ignore_index=True) for level, frames in parts.items()}
+
+def get_metric_cube() -> dict:
+    """
+    Metric cube of load_all_data(), built once per data version and shared
+    by all sessions. Slider moves and metric toggles then only look tables
+    up with metric_cube_slice().
+    """
+    return _get_metric_cube_cached(current_data_version())
+
+@st.cache_resource(show_spinner="📊 Precomputing metrics...", max_entries=1)
+def _get_metric_cube_cached(data_version: str) -> dict:
+    return build_metric_cube(load_all_data())
+
+def _register_cube_tables() -> None:
+    """Register the cube levels with the query layer (once per data version)."""
+    version = current_data_version()
+    for level, name in CUBE_TABLES.items():
+        register_table(
+            name,
+            lambda level=level: get_metric_cube()[level],
+            version,
+            index=[("metric", "year"), ("metric", "year", "city")],
+        )
+
+def metric_cube_slice(level: str, metric_type: str, year: int, city: str = None) -> pd.DataFrame:
+    """
+    Table of the cube for one level ("zip", "metro" or "metro_yoy"),
+    metric and year (and metro, if city is given).
+
+    Served by a hash-index lookup of the query layer; the result is a new
+    frame. Empty when the year has no valid rows for the metric.
+    """
+    _register_cube_tables()
+    where = {"metric": metric_type, "year": int(year)}
+    if city is not None:
+        where["city"] = city
+    table = query(CUBE_TABLES[level], where=where)
+
+    drop = ["metric"] if level == "zip" else ["metric", "year"]
+    table = table.drop(columns=drop)
+    if level == "metro_yoy":
+        value_col = _value_column(metric_type)
+        table = table.rename(columns={"value": value_col, "value_prev": f"{value_col}_prev"})
+    return table
 
-    return compute_yoy(df_processed, current_year, ["city", "city_full"], value_col)
+# ============================================================
+# 8. Sorted (city, zip, year) row index
+# ============================================================
+
+def _zip_keys(city, zip_code) -> np.ndarray:
+    """Composite "city<US>zip" search keys (unit separator never occurs in names)."""
+    return (pd.Series(city).astype(str) + "\x1f" + pd.Series(zip_code).astype(str)).to_numpy(dtype=str)
+
+def build_zip_index(df_all: pd.DataFrame) -> dict:
+    """
+    Row index of df_all ordered by (city, zip_code_str, year).
+
+    Returns {"keys": sorted composite keys, "order": row positions in df_all}
+    so that the rows of one ZIP form a contiguous run found by binary search.
+    """
+    keys = _zip_keys(df_all["city"].to_numpy(), df_all["zip_code_str"].to_numpy())
+    order = np.lexsort((df_all["year"].to_numpy(), keys))
+    return {"keys": keys[order], "order": order}
+
+def get_zip_index() -> dict:
+    """build_zip_index() of load_all_data(), built once per data version."""
+    return _get_zip_index_cached(current_data_version())
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _get_zip_index_cached(data_version: str) -> dict:
+    return build_zip_index(_load_all_data_cached(data_version))
+
+def zip_history(city: str, zip_code: str) -> pd.DataFrame:
+    """
+    All rows of one ZIP in one metro, ordered by year.
+
+    Two binary searches in the sorted index instead of a boolean scan of the
+    full table, so the cost depends on the ZIP's row count only. The index
+    and the table are fetched for one data version, so the positions always
+    refer to the table they were built from.
+    """
+    version = current_data_version()
+    index = _get_zip_index_cached(version)
+    key = _zip_keys([city], [zip_code])[0]
+    lo = np.searchsorted(index["keys"], key, side="left")
+    hi = np.searchsorted(index["keys"], key, side="right")
+    return _load_all_data_cached(version).take(index["order"][lo:hi])
@@ -1,6 +1,5 @@
 import os
 from pathlib import Path
-import numpy as np
 import pandas as pd
 import geopandas as gpd
 import streamlit as st
@@ -10,9 +9,18 @@ from config_data import (
     ZCTA_SHP_PATH,
     CBSA_ZIP_PATH,
     ZCTA_ZIP_PATH,
-    MANUAL_CBSA_NAME_MAP,
 )
-from config_data import compute_rankings
+from config_data import RANK_COLUMNS, compute_rankings
+from utils.data_version import current_data_version
+from utils.geometry import (
+    centroids_exist,
+    city_cbsa_exists,
+    read_centroids,
+    read_city_cbsa,
+    read_zcta_levels,
+    resolve_city_cbsa,
+    zcta_levels_exist,
+)
 
 # Get the absolute path to the design1 directory (where this module is located)
 _DESIGN1_DIR = Path(__file__).parent.resolve()
@@ -70,6 +78,44 @@ def load_zcta_shapes() -> gpd.GeoDataFrame:
     return gdf
 
 
+def load_metro_zcta_shapes(metro: str, detail: str) -> gpd.GeoDataFrame:
+    """
+    Load one detail level of a metro's prebuilt ZIP geometry pack.
+
+    Polygons are in EPSG:4326 with precomputed centroids (see
+    utils/geometry.py); only the metro's file is read and the national
+    shapefile is not touched. Callers check metro_zcta_shapes_exist() first.
+    """
+    return _load_metro_zcta_shapes_cached(metro, detail, current_data_version())
+
+
+@st.cache_resource(show_spinner="🗺️ Loading ZIP code boundaries...", max_entries=32)
+def _load_metro_zcta_shapes_cached(metro: str, detail: str, data_version: str) -> gpd.GeoDataFrame:
+    """load_metro_zcta_shapes() for one data version."""
+    return read_zcta_levels(metro, detail)
+
+
+def metro_zcta_shapes_exist(metro: str) -> bool:
+    """Return True if the ZIP geometry pack of metro has been built."""
+    return zcta_levels_exist(metro)
+
+
+def load_centroids():
+    """
+    Centroid table of every CBSA and ZCTA (see utils/geometry.py), or None
+    when it has not been built.
+    """
+    if not centroids_exist():
+        return None
+    return _load_centroids_cached(current_data_version())
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_centroids_cached(data_version: str) -> pd.DataFrame:
+    """load_centroids() for one data version."""
+    return read_centroids()
+
+
 @st.cache_resource(show_spinner="🏙️ Loading metro area boundaries...", max_entries=1)
 def load_cbsa_shapes() -> gpd.GeoDataFrame:
     """Load CBSA (Core-Based Statistical Area) boundaries."""
@@ -84,178 +130,75 @@ def load_cbsa_shapes() -> gpd.GeoDataFrame:
 
 
 # =========================
-# 2. City / CBSA matching utilities
+# 2. City → CBSA polygons
 # =========================
 
-def parse_city_state(city: str, city_full: str):
-    """
-    Parse a full city string like 'Seattle, WA'
-    into (city_name, state_abbrev).
-    """
-    raw = city_full or city or ""
-    raw = str(raw)
-    parts = [p.strip() for p in raw.split(",")]
-
-    if len(parts) >= 2:
-        city_part = parts[0]
-        state_part = parts[1]
-    else:
-        city_part = parts[0] if parts else ""
-        state_part = ""
-
-    city_base = city_part.strip()
-    state_abbrev = state_part.strip().upper()[:2] if state_part else ""
-    return city_base, state_abbrev
-
-
-def build_city_tokens(city_base: str):
-    """
-    Tokenize a city name to help with fuzzy matching.
-    Handles hyphens and similar separators.
+def load_city_cbsa() -> pd.DataFrame:
     """
-    city_base = (city_base or "").strip().lower()
-    if not city_base:
-        return []
-
-    tokens = [city_base]
-    for sep in ["-", "–", "—"]:
-        if sep in city_base:
-            tokens.extend([t.strip() for t in city_base.split(sep) if t.strip()])
+    Load the prebuilt city → CBSA GEOID table (see utils/geometry.py).
 
-    # Remove duplicates while preserving order
-    return list(dict.fromkeys(tokens))
-
-
-def resolve_manual_cbsa_name(city: str, city_full: str):
-    """
-    Handle special CBSA matching cases (DC, Boston, etc.)
+    Callers check city_cbsa_exists() first.
     """
-    key = (city_full or city or "").strip().lower()
-    if key in MANUAL_CBSA_NAME_MAP:
-        return MANUAL_CBSA_NAME_MAP[key]
+    return _load_city_cbsa_cached(current_data_version())
 
-    if "boston" in key:
-        return "Boston-Cambridge-Newton, MA-NH"
 
-    return None
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_city_cbsa_cached(data_version: str) -> pd.DataFrame:
+    """load_city_cbsa() for one data version."""
+    return read_city_cbsa()
 
 
-@st.cache_data(ttl=3600, max_entries=30)
+@st.cache_data(max_entries=30)
 def build_city_cbsa_polygons(
     df_city: pd.DataFrame,
     _cbsa_gdf: gpd.GeoDataFrame,
     metric_name: str,
+    data_version: str,
 ) -> gpd.GeoDataFrame:
     """
-    Given aggregated city-level metrics, match each city to a corresponding CBSA polygon.
+    Given aggregated city-level metrics, attach each city's CBSA polygon.
     Returns a GeoDataFrame suitable for metro-level choropleths.
+
+    Cities are resolved to CBSAs offline (python -m utils.build_data cbsa),
+    so this is a merge on the city code and the CBSA GEOID. Without the
+    table the same rules run here (utils.geometry.resolve_city_cbsa).
+    data_version (current_data_version()) keys the cache, so rebuilding the
+    CBSA table or the centroids is picked up without a restart.
     """
-    cbsa_gdf = _cbsa_gdf.copy()
-    if "name_lower" not in cbsa_gdf.columns:
-        cbsa_gdf["name_lower"] = cbsa_gdf["NAME"].astype(str).str.lower()
-
-    # Precompute centroids (EPSG 4326) for nearest-distance fallback
-    # Project to a projected CRS (e.g., Web Mercator) for accurate centroid calculation
-    cbsa_projected = cbsa_gdf.to_crs(epsg=3857) 
-    centroids = cbsa_projected.geometry.centroid.to_crs(epsg=4326) # Convert back to 4326 for lat/lon
-    cbsa_gdf["centroid_lat"] = centroids.y
-    cbsa_gdf["centroid_lon"] = centroids.x
-
-    cbsa_name_lower = cbsa_gdf["name_lower"]
-    cbsa_name_upper = cbsa_gdf["NAME"].astype(str).str.upper()
-
-    records = []
-
-    for _, row in df_city.iterrows():
-        city = str(row["city"])
-        city_full = str(row.get("city_full", city)).strip()
-        avg_value = row["avg_metric_value"]
-        lat0 = float(row.get("lat", np.nan))
-        lon0 = float(row.get("lon", np.nan))
-
-        if not city_full:
-            continue
-
-        candidates = cbsa_gdf.iloc[0:0]
-
-        # 1. Manual override
-        manual_name = resolve_manual_cbsa_name(city, city_full)
-        if manual_name:
-            manual_matches = cbsa_gdf[cbsa_gdf["NAME"] == manual_name]
-            if not manual_matches.empty:
-                best = manual_matches.iloc[0]
-                records.append(
-                    {
-                        "city": city,
-                        "city_full": city_full,
-                        "metro_name": city_full,
-                        "avg_metric_value": avg_value,
-                        "geometry": best.geometry,
-                    }
-                )
-                continue
-
-        # 2. Exact / contains match
-        city_full_lower = city_full.lower()
-        exact = cbsa_gdf[cbsa_name_lower == city_full_lower]
-        if exact.empty:
-            contains = cbsa_gdf[cbsa_name_lower.str.contains(city_full_lower, na=False)]
-        else:
-            contains = exact
-        candidates = contains
-
-        # 3. Fuzzy city-base + state matching
-        if candidates.empty:
-            city_base, state_abbrev = parse_city_state(city, city_full)
-            tokens = build_city_tokens(city_base)
-            if tokens:
-                base_mask = cbsa_name_lower.apply(
-                    lambda name: any(t in name for t in tokens)
-                )
-                if base_mask.any():
-                    if state_abbrev:
-                        state_mask = cbsa_name_upper.str.contains(state_abbrev, na=False)
-                        mask = base_mask & state_mask
-                        if mask.any():
-                            candidates = cbsa_gdf[mask]
-                    else:
-                        candidates = cbsa_gdf[base_mask]
-
-        if candidates.empty:
-            continue
-
-        # Multiple CBSA matches → pick the geographically closest one
-        if (
-            len(candidates) > 1
-            and np.isfinite(lat0)
-            and np.isfinite(lon0)
-        ):
-            cand = candidates.copy()
-            dlat = cand["centroid_lat"] - lat0
-            dlon = cand["centroid_lon"] - lon0
-            cand["dist2"] = dlat * dlat + dlon * dlon
-            cand = cand.sort_values("dist2")
-            best = cand.iloc[0]
-        else:
-            best = candidates.iloc[0]
-
-        records.append(
-            {
-                "city": city,
-                "city_full": city_full,
-                "metro_name": city_full,
-                "avg_metric_value": avg_value,
-                "geometry": best.geometry,
-            }
-        )
+    df_city = df_city.assign(
+        city=df_city["city"].astype(str),
+        city_full=df_city["city_full"].astype(str).str.strip(),
+    )
+    df_city = df_city[df_city["city_full"] != ""]
+
+    if city_cbsa_exists():
+        city_cbsa = load_city_cbsa()
+    else:
+        city_cbsa = resolve_city_cbsa(df_city, _cbsa_gdf, load_centroids())
+    city_cbsa = city_cbsa.dropna(subset=["cbsa_geoid"])[["city", "cbsa_geoid"]]
+    cbsa_shapes = _cbsa_gdf[["geometry"]].assign(cbsa_geoid=_cbsa_gdf["GEOID"].astype(str))
+
+    # Precomputed ranks (metric cube) are carried over as they are
+    rank_cols = [col for col in RANK_COLUMNS if col in df_city.columns]
+    merged = (
+        df_city[["city", "city_full", "avg_metric_value"] + rank_cols]
+        .merge(city_cbsa, on="city", how="inner")
+        .merge(cbsa_shapes, on="cbsa_geoid", how="inner")
+    )
 
-    if not records:
+    if merged.empty:
         return gpd.GeoDataFrame(
-            columns=["city", "city_full", "metro_name", "avg_metric_value", "geometry"]
+            columns=["city", "city_full", "metro_name", "cbsa_geoid", "avg_metric_value", "geometry"]
         )
 
-    gdf_out = gpd.GeoDataFrame(records, geometry="geometry", crs=cbsa_gdf.crs)
-    gdf_out = compute_rankings(gdf_out, "avg_metric_value", "city")
+    merged["metro_name"] = merged["city_full"]
+    gdf_out = gpd.GeoDataFrame(
+        merged[["city", "city_full", "metro_name", "cbsa_geoid", "avg_metric_value", "geometry"] + rank_cols],
+        geometry="geometry",
+        crs=_cbsa_gdf.crs,
+    )
+    if not set(RANK_COLUMNS).issubset(gdf_out.columns):
+        gdf_out = compute_rankings(gdf_out, "avg_metric_value", "city")
     return gdf_out
 
 
@@ -263,7 +206,7 @@ def build_city_cbsa_polygons(
 # 3. Metro → ZIP polygons
 # =========================
 
-def get_zip_polygons_for_metro(selected_city, zcta_shapes, df_zip_metric):
+def get_zip_polygons_for_metro(selected_city, zcta_shapes, df_zip_metric, detail=None):
     """
     Return ZIP-level polygons and metric values for a given metro.
 
@@ -271,10 +214,14 @@ def get_zip_polygons_for_metro(selected_city, zcta_shapes, df_zip_metric):
     ----------
     selected_city : str
         The metro/city selected at the top level.
-    zcta_shapes : GeoDataFrame
-        ZCTA geographic boundaries.
+    zcta_shapes : GeoDataFrame or None
+        ZCTA geographic boundaries. Ignored (and may be None) when detail is
+        given and the metro's ZIP geometry pack has been built.
     df_zip_metric : DataFrame
         Contains ['city', 'zip_code_str', 'metric_value', ...]
+    detail : str, optional
+        Detail level of the geometry pack (see
+        utils.geometry.detail_for_zoom)
 
     Returns
     -------
@@ -290,10 +237,43 @@ def get_zip_polygons_for_metro(selected_city, zcta_shapes, df_zip_metric):
     if zip_df_city.empty:
         return zip_df_city, gpd.GeoDataFrame()
 
-    zip_df_small = (
-        zip_df_city[["zip_code_str", "metric_value", "city_full"]]
-        .drop_duplicates()
-    )
+    small_cols = ["zip_code_str", "metric_value", "city_full"]
+    small_cols += [col for col in RANK_COLUMNS if col in zip_df_city.columns]
+    zip_df_small = zip_df_city[small_cols].drop_duplicates()
 
+    if detail is not None and metro_zcta_shapes_exist(selected_city):
+        zcta_shapes = load_metro_zcta_shapes(selected_city, detail)
     gdf_merge = zcta_shapes.merge(zip_df_small, on="zip_code_str", how="inner")
     return zip_df_city, gdf_merge
+
+
+# =========================
+# 4. GeoJSON cache
+# =========================
+
+def get_geojson(level: str, metro: str, detail: str, gdf: gpd.GeoDataFrame, id_col: str) -> dict:
+    """
+    GeoJSON FeatureCollection of gdf's polygons, cached per (level, metro, detail).
+
+    Features carry only their id (the id_col value) and geometry in
+    EPSG:4326. They are cached by id, so a year covering other ZIPs only
+    builds the features not seen before; the collection returned holds just
+    gdf's features. Chart builders attach locations, z and customdata on
+    every render. The feature dicts are shared and must not be modified.
+    """
+    features = _get_feature_cache(level, metro, detail, current_data_version())
+    ids = gdf[id_col].astype(str)
+    missing = ~ids.isin(list(features))
+    if missing.any():
+        new = gdf.loc[missing.to_numpy(), ["geometry"]].set_index(pd.Index(ids[missing], name="id"))
+        if new.crs and new.crs != "EPSG:4326":
+            new = new.to_crs(epsg=4326)
+        for feature in new.to_geo_dict(show_bbox=False)["features"]:
+            features[feature["id"]] = feature
+    return {"type": "FeatureCollection", "features": [features[i] for i in dict.fromkeys(ids)]}
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _get_feature_cache(level: str, metro: str, detail: str, data_version: str) -> dict:
+    """Features built so far for one (level, metro, detail) and data version, by id."""
+    return {}
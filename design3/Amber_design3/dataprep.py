@@ -8,43 +8,46 @@ import os
 import streamlit as st
 from typing import Optional
 
+from utils.affordability import (
+    AFFORDABILITY_BOUNDS,
+    AFFORDABILITY_COLORS,
+    AFFORDABILITY_LABELS,
+    AFFORDABLE_MAX,
+    classify_affordability,
+)
+from utils.aggregates import aggregate_exists, city_year_agg, read_aggregate
+from utils.data_store import get_house_view, store_available
+from utils.data_version import current_data_version
+from utils.download_cache import fetch
+from utils.query import query, register_table
+from utils.schema import apply_schema, categorical_to_str, csv_dtypes
+
 # --- Define Constants at the TOP LEVEL ---
 LOCAL_CSV_PATH = "House_reduced.csv"
 CSV_URL = "https://github.com/yyy1029/House-Browse/releases/download/v1.0/HouseTS.csv"
+# Expected SHA-256 of the CSV_URL file; the download is verified when set
+CSV_SHA256 = os.environ.get("HOUSETS_CSV_SHA256")
+# Columns taken from the shared HouseTS store (same projection as House_reduced.csv)
+HOUSE_COLUMNS = ["median_sale_price", "Per Capita Income", "year", "city_full", "city", "zipcode"]
 RATIO_COL = "price_to_income_ratio"
 RATIO_COL_ZIP = "price_to_income_ratio_zip"
-AFFORDABILITY_THRESHOLD = 3.0
-AFFORDABILITY_CATEGORIES = {
-    "Affordable": (None, 3.0), "Moderately Unaffordable": (3.0, 4.0), 
-    "Seriously Unaffordable": (4.0, 5.0), "Severely Unaffordable": (5.0, 8.9), 
-    "Impossibly Unaffordable": (8.9, None),
-}
-AFFORDABILITY_COLORS = {
-    "Affordable": "#4CAF50", "Moderately Unaffordable": "#FFC107", 
-    "Seriously Unaffordable": "#FF9800", "Severely Unaffordable": "#E57373", 
-    "Impossibly Unaffordable": "#B71C1C",
-}
-
-def classify_affordability(ratio: float) -> str:
-    """Classifies a price-to-income ratio."""
-    if pd.isna(ratio): return "N/A"
-    
-    sorted_categories = sorted(AFFORDABILITY_CATEGORIES.items(), 
-                               key=lambda item: item[1][1] if item[1][1] is not None else float('inf'))
-
-    for category, (lower, upper) in sorted_categories:
-        if category == "Affordable":
-            if ratio <= upper: return category
-        elif lower is not None and upper is None:
-            if ratio > lower: return category
-        elif lower is not None and upper is not None:
-            if lower < ratio <= upper: return category
-            
-    return "Uncategorized"
-
-@st.cache_data(ttl=3600*24)
+# Bands and colors are shared with the other pages (utils/affordability.py)
+AFFORDABILITY_THRESHOLD = AFFORDABLE_MAX
+AFFORDABILITY_CATEGORIES = AFFORDABILITY_BOUNDS
+# Query-layer name of the make_city_year_data() table
+CITY_YEAR_TABLE = "design3_city_year"
+
 def load_data() -> pd.DataFrame:
-    """Loads and standardizes data from design2 directory."""
+    """
+    Loads and standardizes data from design2 directory.
+    Cached as a shared resource (one read-only frame per process, not a copy per call),
+    reloaded when the data-version fingerprint changes.
+    """
+    return _load_data_cached(current_data_version())
+
+@st.cache_resource(max_entries=1)
+def _load_data_cached(data_version: str) -> pd.DataFrame:
+    """load_data() for one data version."""
     from pathlib import Path
     import logging
     
@@ -58,29 +61,40 @@ def load_data() -> pd.DataFrame:
     
     df = pd.DataFrame() 
     
-    # Try to load from design2 directory first
-    if design2_path.exists():
+    # Prefer a read-only projection of the process-wide shared store
+    if store_available():
+        try:
+            # Own copy: the columns are renamed and extended below
+            df = get_house_view(columns=HOUSE_COLUMNS).copy()
+            logger.info(f"Loaded data from shared HouseTS store: {len(df)} rows")
+        except Exception as e:
+            logger.error(f"Error loading shared HouseTS store: {str(e)}")
+            df = pd.DataFrame()
+
+    # Otherwise load from design2 directory
+    if df.empty and design2_path.exists():
         try:
-            df = pd.read_csv(design2_path, low_memory=False)
+            df = pd.read_csv(design2_path, dtype=csv_dtypes(HOUSE_COLUMNS))
             logger.info(f"Loaded data from design2/House_reduced.csv: {len(df)} rows")
         except Exception as e:
             logger.error(f"Error loading data from design2: {str(e)}")
             return pd.DataFrame()
-    else:
+    elif df.empty:
         # Fallback: try local file in design3 directory
         local_file_path = script_dir / LOCAL_CSV_PATH
         if local_file_path.exists():
             try:
-                df = pd.read_csv(local_file_path, low_memory=False)
+                df = pd.read_csv(local_file_path, dtype=csv_dtypes(HOUSE_COLUMNS))
                 logger.info(f"Loaded data from local file: {len(df)} rows")
             except Exception as e:
                 logger.error(f"Error loading local file: {str(e)}")
                 return pd.DataFrame()
         else:
-            # Last resort: try URL
+            # Last resort: download once into the shared cache, then read locally
             try:
-                df = pd.read_csv(CSV_URL, low_memory=False)
-                logger.warning(f"Local file not found. Loaded data from URL: {len(df)} rows")
+                cached_path = fetch(CSV_URL, sha256=CSV_SHA256)
+                df = pd.read_csv(cached_path, usecols=lambda c: c in HOUSE_COLUMNS, dtype=csv_dtypes(HOUSE_COLUMNS))
+                logger.warning(f"Local file not found. Loaded data from URL (cached at {cached_path}): {len(df)} rows")
             except Exception as e:
                 logger.error(f"CRITICAL: Failed to load data from design2/House_reduced.csv, local path, or URL: {e}")
                 return pd.DataFrame() 
@@ -102,13 +116,13 @@ def load_data() -> pd.DataFrame:
     )
     
     if "city_full" not in df.columns:
-        df["city_full"] = df["city_geojson_code"] + " Metro Area"
+        df["city_full"] = df["city_geojson_code"].astype(str) + " Metro Area"
 
     df['city_clean'] = df['city_geojson_code'] 
 
     df["monthly_income_pc"] = df["per_capita_income"] / 12.0
 
-    return df
+    return apply_schema(df, name="design3 HouseTS")
 
 
 def apply_income_filter(df: pd.DataFrame, annual_income: float) -> pd.DataFrame:
@@ -116,21 +130,42 @@ def apply_income_filter(df: pd.DataFrame, annual_income: float) -> pd.DataFrame:
     return df.copy() # NOTE: Returns copy of full data for map context
 
 
-@st.cache_data(ttl=3600*24)
-def make_city_view_data(df_full: pd.DataFrame, annual_income: float, year: int, budget_pct: float = 30):
-    """Aggregates data for the bar chart."""
-    df_year = df_full[df_full['year'] == year].copy()
+@st.cache_resource(max_entries=1)
+def load_city_year_table(data_version: str) -> Optional[pd.DataFrame]:
+    """Prebuilt metro x year medians (python -m utils.build_data aggregates), or None."""
+    if not aggregate_exists("city_year"):
+        return None
+    return read_aggregate("city_year")
+
 
-    # Aggregate by the GeoJSON code ('city_geojson_code')
-    city_agg = df_year.groupby("city_geojson_code", observed=True).agg(
-        median_sale_price=("median_sale_price", "median"), 
-        per_capita_income=("per_capita_income", "median"), 
-        city_full=("city_full", "first"), 
-    ).reset_index()
+def make_city_year_data(df_full: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bar chart data for every year at once: one row per (year, metro) with
+    the medians, price-to-income ratio and affordability rating.
+
+    Built in one grouped pass (or read from the prebuilt city_year table)
+    and cached per data version; the single-year view and the history
+    panels are slices / groupbys of it.
+    """
+    return _make_city_year_data_cached(df_full, current_data_version())
+
+@st.cache_data(max_entries=1)
+def _make_city_year_data_cached(_df_full: pd.DataFrame, data_version: str) -> pd.DataFrame:
+    """make_city_year_data() keyed on the data version instead of hashing _df_full."""
+    city_year = load_city_year_table(data_version)
+    if city_year is not None:
+        # Shared resource: work on a copy
+        city_agg = city_year.copy()
+    else:
+        # Aggregate by the GeoJSON code ('city_geojson_code')
+        city_agg = city_year_agg(_df_full, city_col="city_geojson_code", income_col="per_capita_income")
 
     city_agg[RATIO_COL] = city_agg["median_sale_price"] / (city_agg["per_capita_income"] * 2.54)
-    city_agg["affordability_rating"] = city_agg[RATIO_COL].apply(classify_affordability)
+    city_agg["affordability_rating"] = classify_affordability(city_agg[RATIO_COL], missing="N/A")
     city_agg["affordable"] = city_agg[RATIO_COL] <= AFFORDABILITY_THRESHOLD
+    # Bar length: distance to the threshold, positive when affordable
+    dist = (city_agg[RATIO_COL] - AFFORDABILITY_THRESHOLD).abs()
+    city_agg["gap_for_plot"] = np.where(city_agg["affordable"], dist, -dist)
 
     # Rename columns for display in charts/tables
     city_agg.rename(
@@ -141,7 +176,70 @@ def make_city_view_data(df_full: pd.DataFrame, annual_income: float, year: int,
         inplace=True,
     )
 
-    return city_agg
+    # Plain-string keys so plotly keeps the data order in the bar chart
+    return categorical_to_str(city_agg, ["city", "city_full"])
+
+
+def register_city_year_table(df_full: pd.DataFrame) -> str:
+    """
+    Register make_city_year_data() with the query layer (rebuilt only when
+    the data version changes) and return its table name.
+    """
+    register_table(
+        CITY_YEAR_TABLE,
+        lambda: make_city_year_data(df_full),
+        current_data_version(),
+        index=["year", "city", "city_full"],
+        sort_index=["Median Sale Price", "Per Capita Income", RATIO_COL],
+    )
+    return CITY_YEAR_TABLE
+
+
+def make_city_view_data(
+    df_full: pd.DataFrame,
+    annual_income: float,
+    year: int,
+    budget_pct: float = 30,
+    max_price: Optional[float] = None,
+):
+    """
+    Aggregates data for the bar chart: the rows of make_city_year_data()
+    for one year, optionally only metros with Median Sale Price < max_price.
+    """
+    where = {"year": year}
+    if max_price is not None:
+        where["Median Sale Price"] = ("<", max_price)
+    return query(register_city_year_table(df_full), where=where).drop(columns="year")
+
+
+def median_ratio_history(df_full: pd.DataFrame) -> pd.DataFrame:
+    """Median metro price-to-income ratio per year (columns: year, median_ratio)."""
+    city_year = make_city_year_data(df_full)
+    return (
+        city_year.groupby("year", as_index=False)[RATIO_COL]
+        .median()
+        .rename(columns={RATIO_COL: "median_ratio"})
+    )
+
+
+def category_share_history(df_full: pd.DataFrame) -> pd.DataFrame:
+    """
+    Percentage of metros in each affordability band per year.
+
+    Long format with columns year, category (band label with its PTI range)
+    and percentage; every band appears for every year.
+    """
+    city_year = make_city_year_data(df_full)
+    bands = classify_affordability(city_year[RATIO_COL]).cat.rename_categories(AFFORDABILITY_LABELS)
+    shares = (
+        pd.crosstab(city_year["year"], bands, normalize="index", dropna=False)
+        .reindex(index=sorted(city_year["year"].unique()), columns=list(AFFORDABILITY_LABELS.values()))
+        .fillna(0.0)
+        * 100
+    )
+    shares.index.name = "year"
+    shares.columns.name = "category"
+    return shares.stack().reset_index(name="percentage")
 
 
 
@@ -118,41 +118,51 @@ import pandas as pd
 import numpy as np
 import os
 import json
+from pathlib import Path
 import pgeocode
-from dataprep import RATIO_COL, RATIO_COL_ZIP, AFFORDABILITY_CATEGORIES 
+from dataprep import RATIO_COL, RATIO_COL_ZIP
+from utils.affordability import classify_affordability
+from utils.data_version import current_data_version
+from utils.geometry import detail_for_zoom, read_zcta_levels, zcta_levels_exist
+from utils.house_store import partitions_exist, read_partitions
 
+# HouseTS columns read from a metro's partitions for the ZIP map
+ZIP_PARTITION_COLUMNS = ["zipcode", "year", "median_sale_price", "Per Capita Income", "city_full", "city"]
 
-# Helper function (copied from dataprep.py)
-def classify_affordability_zip(ratio: float) -> str:
-    """Classifies a price-to-income ratio using imported constants."""
-    if pd.isna(ratio): return "N/A"
-    
-    sorted_categories = sorted(AFFORDABILITY_CATEGORIES.items(), 
-                               key=lambda item: item[1][1] if item[1][1] is not None else float('inf'))
-
-    for category, (lower, upper) in sorted_categories:
-        if category == "Affordable":
-            if ratio <= upper: return category
-        elif lower is not None and upper is not None:
-            if lower < ratio <= upper: return category
-        elif lower is not None and upper is not None:
-            if lower < ratio <= upper: return category
-            
-    return "Uncategorized"
+# Zoom the ZIP map opens at (also picks the geometry pack's detail level)
+ZIP_MAP_ZOOM = 8
+# Full-resolution per-metro ZCTA boundaries, used when no pack is built
+CITY_GEOJSON_DIR = Path(__file__).parent / "city_geojson"
 
 
-@st.cache_data(ttl=3600)
 def load_city_zip_data(city_geojson_code: str, df_full: pd.DataFrame, max_pci: float) -> pd.DataFrame:
+    """Rows of a single city, cached per data version (see _load_city_zip_data_cached)."""
+    return _load_city_zip_data_cached(city_geojson_code, df_full, max_pci, current_data_version())
+
+
+@st.cache_data(max_entries=32)
+def _load_city_zip_data_cached(
+    city_geojson_code: str, _df_full: pd.DataFrame, max_pci: float, data_version: str
+) -> pd.DataFrame:
     # ------------------------------------------------------------------------
     # NOTE: max_pci argument kept for compatibility but no longer used for filtering
     # All zip codes are now shown regardless of income
     # ------------------------------------------------------------------------
     """
-    Filters the pre-loaded full DataFrame (df_full) to a single city 
-    using the GeoJSON code (e.g., ATL). All ZIP codes are included.
+    Rows of a single city (GeoJSON code, e.g. ATL). All ZIP codes are included.
+
+    Reads only that metro's partitions when the partitioned dataset has been
+    built; otherwise filters the pre-loaded full DataFrame (_df_full is not
+    hashed; data_version identifies its contents).
     """
-    # 1. Filter by City (GeoJSON Code) only - no income filtering
-    df_city_zip = df_full[df_full["city_geojson_code"] == city_geojson_code].copy()
+    if partitions_exist():
+        df_city_zip = read_partitions(metros=[city_geojson_code], columns=ZIP_PARTITION_COLUMNS)
+        df_city_zip = df_city_zip.rename(
+            columns={"Per Capita Income": "per_capita_income", "city": "city_geojson_code"}
+        )
+    else:
+        # 1. Filter by City (GeoJSON Code) only - no income filtering
+        df_city_zip = _df_full[_df_full["city_geojson_code"] == city_geojson_code].copy()
 
 
     # Ensure the required columns exist for subsequent steps
@@ -168,7 +178,7 @@ def load_city_zip_data(city_geojson_code: str, df_full: pd.DataFrame, max_pci: f
     return df_city_zip
 
 
-@st.cache_data(ttl=3600*24)
+@st.cache_data(max_entries=32)
 def get_zip_coordinates(df_zip_data: pd.DataFrame) -> pd.DataFrame:
     """
     Enriches ZIP-level data with coordinates and unconditionally calculates the ratio AND rating.
@@ -199,9 +209,108 @@ def get_zip_coordinates(df_zip_data: pd.DataFrame) -> pd.DataFrame:
     denom = out[income_col].replace(0, np.nan)
     
     out[RATIO_COL] = out[price_col] / denom # Generates 'price_to_income_ratio'
-    out["affordability_rating"] = out[RATIO_COL].apply(classify_affordability_zip) # Generates rating
+    out["affordability_rating"] = classify_affordability(out[RATIO_COL], missing="N/A") # Generates rating
     
     # Ensure zip_code_int exists for Plotly location lookup
     out["zip_code_int"] = out["zip_code_str"].astype(int)
     
     return out
+
+
+def load_zip_geojson(city_geojson_code: str, zoom: float = ZIP_MAP_ZOOM):
+    """
+    ZIP polygons of one metro as a GeoJSON FeatureCollection.
+
+    Feature ids are the zero-padded ZCTA codes. The polygons come from the
+    metro's prebuilt geometry pack at the detail level for zoom (see
+    utils/geometry.py) and otherwise from city_geojson/<METRO>.geojson.
+    Returns None if neither exists.
+    """
+    return _load_zip_geojson_cached(city_geojson_code, detail_for_zoom(zoom), current_data_version())
+
+
+@st.cache_resource(max_entries=32)
+def _load_zip_geojson_cached(city_geojson_code: str, detail: str, data_version: str):
+    if zcta_levels_exist(city_geojson_code):
+        pack = read_zcta_levels(city_geojson_code, detail)
+        return pack[["zip_code_str", "geometry"]].set_index("zip_code_str").to_geo_dict(show_bbox=False)
+
+    geojson_path = CITY_GEOJSON_DIR / f"{city_geojson_code}.geojson"
+    if not geojson_path.exists():
+        return None
+    with open(geojson_path, "r") as f:
+        zip_geojson = json.load(f)
+    for feature in zip_geojson["features"]:
+        feature["id"] = str(feature["properties"]["ZCTA5CE10"]).zfill(5)
+    return zip_geojson
+
+
+def load_zip_price_index(city_geojson_code: str, year: int, df_full: pd.DataFrame) -> dict:
+    """
+    ZIPs of one metro and year, pre-sorted by median sale price.
+
+    Returns {"rows": DataFrame, "prices": sorted float64 prices (NaN last)}.
+    rows is None when the metro has no ZIP data for the year, and empty when
+    no ZIP could be geocoded. Built once per (metro, year, data version) and
+    shared; the income threshold is applied with zip_price_scale().
+    """
+    return _load_zip_price_index_cached(city_geojson_code, int(year), df_full, current_data_version())
+
+
+@st.cache_resource(max_entries=32)
+def _load_zip_price_index_cached(
+    city_geojson_code: str, year: int, _df_full: pd.DataFrame, data_version: str
+) -> dict:
+    df_zip = load_city_zip_data(city_geojson_code, df_full=_df_full, max_pci=0)
+    if "year" in df_zip.columns:
+        df_zip = df_zip[df_zip["year"] == year]
+    if df_zip.empty:
+        return {"rows": None, "prices": np.array([])}
+
+    rows = get_zip_coordinates(df_zip)
+    if rows.empty or "median_sale_price" not in rows.columns:
+        return {"rows": pd.DataFrame(), "prices": np.array([])}
+
+    rows = rows.sort_values("median_sale_price", kind="stable", na_position="last").reset_index(drop=True)
+    rows["zip_str_padded"] = rows["zip_code_int"].astype(str).str.zfill(5)
+    return {"rows": rows, "prices": rows["median_sale_price"].to_numpy(dtype="float64")}
+
+
+def zip_price_scale(price_index: dict, max_affordable_price: float) -> dict:
+    """
+    Split the ZIPs of a price index at the affordable price and map each
+    price onto the 0-1 color scale (0-0.5 affordable, 0.5-1 unaffordable).
+
+    One binary search finds the split; both halves are rescaled with array
+    arithmetic. Returns color_value (aligned with price_index["rows"]),
+    n_affordable, n_unaffordable, min_price and max_price.
+    """
+    prices = price_index["prices"]
+    n_valid = int(np.count_nonzero(~np.isnan(prices)))
+    split = int(np.searchsorted(prices[:n_valid], max_affordable_price, side="left"))
+    color_value = np.full(len(prices), np.nan)
+    if n_valid == 0:
+        return {
+            "color_value": color_value, "n_affordable": 0, "n_unaffordable": 0,
+            "min_price": np.nan, "max_price": np.nan,
+        }
+
+    min_price, max_price = prices[0], prices[n_valid - 1]
+    if split > 0:
+        affordable_range = max_affordable_price - min_price
+        color_value[:split] = (
+            0.5 * (prices[:split] - min_price) / affordable_range if affordable_range > 0 else 0.25
+        )
+    if split < n_valid:
+        unaffordable_range = max_price - max_affordable_price
+        color_value[split:n_valid] = (
+            0.5 + 0.5 * (prices[split:n_valid] - max_affordable_price) / unaffordable_range
+            if unaffordable_range > 0 else 0.75
+        )
+    return {
+        "color_value": np.clip(color_value, 0, 1),
+        "n_affordable": split,
+        "n_unaffordable": n_valid - split,
+        "min_price": min_price,
+        "max_price": max_price,
+    }
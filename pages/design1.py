@@ -47,6 +47,7 @@ try:
     import pandas as pd
     import numpy as np
     import geopandas as gpd
+    from utils.geometry import detail_for_zoom
 
     # Clear any cached modules to avoid conflicts with other pages that have modules with same names
     # Force clear all conflicting modules from cache before importing
@@ -68,16 +69,20 @@ try:
     get_dynamic_css = config_data.get_dynamic_css
     get_colorscale = config_data.get_colorscale
     load_all_data = config_data.load_all_data
+    load_metro_data = config_data.load_metro_data
     compute_pti = config_data.compute_pti
-    compute_rankings = config_data.compute_rankings
     get_metro_yoy = config_data.get_metro_yoy
+    metric_cube_slice = config_data.metric_cube_slice
+    zip_history = config_data.zip_history
     US_BOUNDS = config_data.US_BOUNDS
     US_CENTER_LAT = config_data.US_CENTER_LAT
     US_CENTER_LON = config_data.US_CENTER_LON
     US_ZOOM_LEVEL = config_data.US_ZOOM_LEVEL
+    ZIP_ZOOM_LEVEL = config_data.ZIP_ZOOM_LEVEL
     
     load_cbsa_shapes = geo_utils.load_cbsa_shapes
     load_zcta_shapes = geo_utils.load_zcta_shapes
+    metro_zcta_shapes_exist = geo_utils.metro_zcta_shapes_exist
     get_zip_polygons_for_metro = geo_utils.get_zip_polygons_for_metro
     
     create_city_choropleth = charts_module.create_city_choropleth
@@ -241,12 +246,8 @@ try:
     with control_col3:
         if st.session_state[f"{design1_prefix}view_mode"] == "city":
             st.markdown("**🔍 Quick Metro Search**")
-            df_filtered_sidebar = df_all[df_all["year"] == selected_year].copy()
-            if not df_filtered_sidebar.empty:
-                df_city_sidebar = (
-                    df_filtered_sidebar.groupby(["city", "city_full"], as_index=False, observed=True)
-                    .agg(avg_median_sale_price=("median_sale_price", "mean"))
-                )
+            df_city_sidebar = metric_cube_slice("metro", "Median Sale Price", selected_year)
+            if not df_city_sidebar.empty:
                 metro_list = (
                     df_city_sidebar.drop_duplicates(subset=["city_full"])
                     .sort_values("city_full")["city_full"]
@@ -282,67 +283,24 @@ try:
     # =========================================================================
     # 8. Build metric data for selected_year
     # =========================================================================
-    df_year = df_all[df_all["year"] == selected_year].copy()
-    if df_year.empty:
-        st.warning(f"### ⚠️ No Data Available for {selected_year}")
-        st.info("Please try selecting a different year from the control panel above.")
-        st.stop()
-
-    if metric_type == "Price-to-Income Ratio (PTI)":
-        df_year = compute_pti(df_year)
-        value_source_col = "PTI"
-        if df_year.empty:
+    # Both metrics for every year are aggregated once per data version;
+    # a slider move or metric toggle only looks the tables up
+    df_zip_metric = metric_cube_slice("zip", metric_type, selected_year)
+    df_city = metric_cube_slice("metro", metric_type, selected_year)
+    if df_zip_metric.empty:
+        if not (df_all["year"] == selected_year).any():
+            st.warning(f"### ⚠️ No Data Available for {selected_year}")
+            st.info("Please try selecting a different year from the control panel above.")
+        elif metric_type == "Price-to-Income Ratio (PTI)":
             st.warning(f"⚠️ PTI values out of range for {selected_year}.")
-            st.stop()
-
-        df_zip_metric = (
-            df_year.groupby(
-                ["city", "city_full", "city_clean", "zip_code_str", "year"], as_index=False, observed=True
-            ).agg(
-                metric_value=("PTI", "mean"),
-                lat=("lat", "mean"),
-                lon=("lon", "mean"),
-            )
-        )
-
-        df_city = (
-            df_zip_metric.groupby(["city", "city_full", "city_clean"], as_index=False, observed=True).agg(
-                n=("zip_code_str", "count"),
-                avg_metric_value=("metric_value", "mean"),
-                lat=("lat", "mean"),
-                lon=("lon", "mean"),
-            )
-        )
-    else:
-        df_year = df_year[df_year["median_sale_price"].notna()].copy()
-        value_source_col = "median_sale_price"
-        if df_year.empty:
+        else:
             st.warning(f"⚠️ No valid price data for {selected_year}.")
-            st.stop()
-
-        df_zip_metric = (
-            df_year.groupby(
-                ["city", "city_full", "city_clean", "zip_code_str", "year"], as_index=False, observed=True
-            ).agg(
-                metric_value=("median_sale_price", "mean"),
-                lat=("lat", "mean"),
-                lon=("lon", "mean"),
-            )
-        )
-
-        df_city = (
-            df_zip_metric.groupby(["city", "city_full", "city_clean"], as_index=False, observed=True).agg(
-                n=("zip_code_str", "count"),
-                avg_metric_value=("metric_value", "mean"),
-                lat=("lat", "mean"),
-                lon=("lon", "mean"),
-            )
-        )
+        st.stop()
 
-    df_city_map = df_city.copy().reset_index(drop=True)
-    df_city_map = compute_rankings(df_city_map, "avg_metric_value", "city")
+    # rank / rank_total / percentile are precomputed in the metric cube
+    df_city_map = df_city
 
-    metro_yoy = get_metro_yoy(df_all, selected_year, metric_type)
+    metro_yoy = get_metro_yoy(selected_year, metric_type)
 
     current_metro_name = None
     if st.session_state[f"{design1_prefix}selected_city"]:
@@ -509,6 +467,9 @@ try:
             st.info("Please use the 'Quick Metro Search' in the control panel above to select a metro area, or click on a metro on the map.")
             st.stop()
 
+        # Only this metro's rows (read from its partitions when available)
+        df_metro = load_metro_data(selected_city)
+
         st.markdown(f"### 🗺️ `USA` → `{current_metro_name or selected_city}` → `ZIP Codes`")
         
         if st.button("⬅️ Back to All Metros", use_container_width=False):
@@ -526,11 +487,15 @@ try:
         )
 
         try:
-            with st.spinner("🗺️ Loading ZIP code boundaries..."):
-                zcta_shapes = load_zcta_shapes()
+            # Prebuilt geometry pack when available, else the national shapefile
+            zip_detail = detail_for_zoom(ZIP_ZOOM_LEVEL)
+            zcta_shapes = None
+            if not metro_zcta_shapes_exist(selected_city):
+                with st.spinner("🗺️ Loading ZIP code boundaries..."):
+                    zcta_shapes = load_zcta_shapes()
             with st.spinner("📊 Processing ZIP code data..."):
                 zip_df_city, gdf_merge = get_zip_polygons_for_metro(
-                    selected_city, zcta_shapes, df_zip_metric
+                    selected_city, zcta_shapes, df_zip_metric, detail=zip_detail,
                 )
         except Exception as e:
             st.error(f"""
@@ -574,8 +539,6 @@ try:
                     - Data filtering removed all records
                 """)
             else:
-                zip_df_city = compute_rankings(zip_df_city, "metric_value", "zip_code_str")
-
                 # Get currently selected ZIP
                 current_selected_zip = st.session_state.get(f"{design1_prefix}selected_zip")
                 
@@ -599,7 +562,8 @@ try:
                     city_coords = None
                     with st.spinner("📊 Generating ZIP code map..."):
                         fig_zip, gdf_zip = create_zip_choropleth(
-                            gdf_merge, map_style, city_coords, zip_df_city, metric_type, is_dark_mode
+                            gdf_merge, map_style, city_coords, zip_df_city, metric_type, is_dark_mode,
+                            metro=selected_city, detail=zip_detail,
                         )
                     
                     if fig_zip is not None and gdf_zip is not None:
@@ -654,38 +618,17 @@ try:
                                 unsafe_allow_html=True
                             )
 
+                            # Previous-year value and YoY come precomputed with the ZIP metric table
                             if metric_type == "Price-to-Income Ratio (PTI)":
-                                zip_prev_raw = df_all[
-                                    (df_all["city"] == selected_city)
-                                    & (df_all["zip_code_str"] == active_zip)
-                                    & (df_all["year"] == selected_year - 1)
-                                ].copy()
-                                zip_prev_raw = compute_pti(zip_prev_raw) if not zip_prev_raw.empty else pd.DataFrame()
-                                if not zip_prev_raw.empty:
-                                    prev_val = zip_prev_raw["PTI"].mean()
-                                    yoy_change = ((metric_val - prev_val) / prev_val * 100)
-                                    main_value = f"{metric_val:.2f}x"
-                                    delta_text = f"{yoy_change:+.1f}% YoY"
-                                    # Note: Tooltip for YoY is shown via help parameter in st.metric
-                                else:
-                                    main_value = f"{metric_val:.2f}x"
-                                    delta_text = "No prior year"
+                                main_value = f"{metric_val:.2f}x"
                             else:
-                                zip_prev = df_all[
-                                    (df_all["city"] == selected_city)
-                                    & (df_all["zip_code_str"] == active_zip)
-                                    & (df_all["year"] == selected_year - 1)
-                                    & df_all["median_sale_price"].notna()
-                                ]
-                                if not zip_prev.empty:
-                                    prev_val = zip_prev["median_sale_price"].mean()
-                                    yoy_change = ((metric_val - prev_val) / prev_val * 100)
-                                    main_value = f"${metric_val:,.0f}"
-                                    delta_text = f"{yoy_change:+.1f}% YoY"
-                                    # Note: Tooltip for YoY is shown via help parameter in st.metric
-                                else:
-                                    main_value = f"${metric_val:,.0f}"
-                                    delta_text = "No prior year"
+                                main_value = f"${metric_val:,.0f}"
+                            if pd.notna(row_now["metric_value_prev"].iloc[0]):
+                                yoy_change = float(row_now["yoy_pct"].iloc[0])
+                                delta_text = f"{yoy_change:+.1f}% YoY"
+                                # Note: Tooltip for YoY is shown via help parameter in st.metric
+                            else:
+                                delta_text = "No prior year"
 
                             rank_percentile = 100 - percentile
                             if pct_diff > 5:
@@ -734,11 +677,7 @@ try:
 
                             st.markdown("#### 📈 Historical Trend Over Time")
                             if metric_type == "Price-to-Income Ratio (PTI)":
-                                zip_hist_raw = df_all[
-                                    (df_all["city"] == selected_city)
-                                    & (df_all["zip_code_str"] == active_zip)
-                                ].copy()
-                                zip_hist_raw = compute_pti(zip_hist_raw)
+                                zip_hist_raw = compute_pti(zip_history(selected_city, active_zip))
                                 if not zip_hist_raw.empty:
                                     zip_hist = (
                                         zip_hist_raw.groupby("year", as_index=False, observed=True)
@@ -760,12 +699,9 @@ try:
                                 else:
                                     st.caption("No historical data for this ZIP.")
                             else:
+                                zip_rows = zip_history(selected_city, active_zip)
                                 zip_hist = (
-                                    df_all[
-                                        (df_all["city"] == selected_city)
-                                        & (df_all["zip_code_str"] == active_zip)
-                                        & df_all["median_sale_price"].notna()
-                                    ]
+                                    zip_rows[zip_rows["median_sale_price"].notna()]
                                     .groupby("year", as_index=False, observed=True)
                                     .agg(price=("median_sale_price", "mean"))
                                     .sort_values("year")
@@ -860,11 +796,7 @@ try:
                         )
 
                 with col_m5:
-                    metro_row = (
-                        metro_yoy[metro_yoy["city"] == selected_city]
-                        if not metro_yoy.empty
-                        else pd.DataFrame()
-                    )
+                    metro_row = get_metro_yoy(selected_year, metric_type, city=selected_city)
                     if not metro_row.empty and "yoy_pct" in metro_row.columns:
                         yoy_val = metro_row["yoy_pct"].iloc[0]
                         if not pd.isna(yoy_val):
@@ -882,7 +814,7 @@ try:
                 valid_zips_for_chart = zip_df_city["zip_code_str"].unique()
                 
                 if metric_type == "Price-to-Income Ratio (PTI)":
-                    metro_hist_raw = df_all[df_all["city"] == selected_city].copy()
+                    metro_hist_raw = df_metro.copy()
                     metro_hist_raw = compute_pti(metro_hist_raw)
                     if not metro_hist_raw.empty:
                         metro_zip_year = (
@@ -915,10 +847,7 @@ try:
                     else:
                         st.caption("No historical data available for this metro.")
                 else:
-                    metro_hist_raw = df_all[
-                        (df_all["city"] == selected_city)
-                        & df_all["median_sale_price"].notna()
-                    ].copy()
+                    metro_hist_raw = df_metro[df_metro["median_sale_price"].notna()].copy()
                     if not metro_hist_raw.empty:
                         metro_zip_year = (
                             metro_hist_raw.groupby(
@@ -6,6 +6,12 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from utils.path_utils import setup_design_path, add_to_path
+from utils.data_store import get_house_view, store_available
+from utils.schema import apply_schema, categorical_to_str, csv_dtypes
+from utils.affordability import classify_affordability
+from utils.aggregates import aggregate_exists, metro_ratio_agg, read_aggregate
+from utils.data_version import current_data_version
+from utils.downsample import LINE_PIXELS_PER_POINT, downsample_groups, points_for_width
 
 # Setup design2 path
 design2_path, _ = setup_design_path("design2")
@@ -124,21 +130,32 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-@st.cache_data(show_spinner="Loading required data...", ttl=3600, max_entries=1) 
-def load_data():
+# Approximate width of the plot area (chart column minus the legend margin),
+# used to size the monthly series before they are sent to the browser
+PLOT_WIDTH_PX = 800
+
+
+def _ratio_agg_from_rows(monthly: bool = False):
+    """Aggregate the monthly rows at request time (no prebuilt ratio_agg table)."""
     # Load House_reduced.csv from design2 directory using absolute path
     csv_path = design2_path / "House_reduced.csv"
     
     try:
-        df = pd.read_csv(csv_path)
+        if store_available():
+            # Own copy of a projection of the process-wide shared table
+            # (missing values are filled in place below)
+            columns = ["median_sale_price", "Per Capita Income", "year", "city_full"]
+            df = get_house_view(columns=columns + (["date"] if monthly else [])).copy()
+        else:
+            df = pd.read_csv(csv_path, dtype=csv_dtypes())
     except FileNotFoundError:
         st.error(f"❌ **File Not Found**: House_reduced.csv not found at {csv_path}")
         st.info("Please ensure House_reduced.csv exists in the design2 directory.")
-        return pd.DataFrame(), []
+        return pd.DataFrame()
     except Exception as e:
         st.error(f"❌ **Error loading data**: {str(e)}")
         st.info("Please check that House_reduced.csv is a valid CSV file.")
-        return pd.DataFrame(), []
+        return pd.DataFrame()
     
     # Check if file is a Git LFS pointer file
     if df.empty or len(df.columns) == 0 or "version https://git-lfs.github.com/spec/v1" in str(df.columns[0]):
@@ -149,7 +166,9 @@ def load_data():
         2. Pull the actual file: `git lfs pull` or `git lfs checkout House_reduced.csv`
         3. Or download the actual CSV file from the repository
         """)
-        return pd.DataFrame(), []
+        return pd.DataFrame()
+
+    df = apply_schema(df, name="House_reduced.csv")
     
     # Normalize column names - handle both formats
     # Check for different possible column name formats
@@ -180,7 +199,7 @@ def load_data():
     if price_col is None or income_col is None:
         st.error(f"Could not find required columns. Available columns: {list(df.columns)}")
         st.info("Expected columns: 'median_sale_price' (or 'Median Sale Price') and 'Per Capita Income' (or 'per_capita_income')")
-        return pd.DataFrame(), []
+        return pd.DataFrame()
     
     # Check for city_full column
     city_col = None
@@ -193,57 +212,44 @@ def load_data():
     
     if city_col is None:
         st.error(f"Could not find city column. Available columns: {list(df.columns)}")
-        return pd.DataFrame(), []
+        return pd.DataFrame()
     
-    # Filter out rows with invalid data
-    df = df[(df[price_col] > 0) & (df[income_col] > 0)].copy()
-    df = df.fillna(0)
+    if monthly and "date" not in df.columns:
+        st.error("Monthly resolution needs a `date` column; the loaded data is annual only.")
+        return pd.DataFrame()
 
-    # Price to Income Data Preparation
-    df["Price_Income_Ratio"] = df[price_col] / (2.54 * df[income_col])
-    
-    # Group by city and year, then aggregate
-    ratio_agg = (
-        df.groupby([city_col, "year"], as_index=False, observed=True)
-        .agg({
-            "Price_Income_Ratio": "median",
-            price_col: "median",
-            income_col: "median"
-        })
-    )
-    
-    # Rename columns for consistency
-    ratio_agg = ratio_agg.rename(columns={
-        city_col: "city_full",
-        price_col: "median_sale_price",
-        income_col: "Per Capita Income"
-    })
-
-    ratio_agg["Affordability"] = ""
+    # Only fill numeric columns (categorical columns from the snapshot reject 0)
+    numeric_cols = df.select_dtypes("number").columns
+    df[numeric_cols] = df[numeric_cols].fillna(0)
 
-    ratio_agg.loc[ratio_agg["Price_Income_Ratio"] <= 3.0,
-                "Affordability"] = "Affordable"
+    # Price to Income ratio, median by city and year
+    return metro_ratio_agg(
+        df, city_col=city_col, price_col=price_col, income_col=income_col, monthly=monthly
+    )
 
-    ratio_agg.loc[(ratio_agg["Price_Income_Ratio"] > 3.0) &
-                (ratio_agg["Price_Income_Ratio"] <= 4.0),
-                "Affordability"] = "Moderately Unaffordable"
 
-    ratio_agg.loc[(ratio_agg["Price_Income_Ratio"] > 4.0) &
-                (ratio_agg["Price_Income_Ratio"] <= 5.0),
-                "Affordability"] = "Seriously Unaffordable"
+@st.cache_data(show_spinner="Loading required data...", max_entries=2)
+def load_data(data_version: str, monthly: bool = False):
+    # Cached until the data-version fingerprint changes
+    # Prebuilt table from `python -m utils.build_data aggregates` when available
+    table = "ratio_monthly_agg" if monthly else "ratio_agg"
+    if aggregate_exists(table):
+        ratio_agg = read_aggregate(table)
+    else:
+        ratio_agg = _ratio_agg_from_rows(monthly=monthly)
+    if ratio_agg.empty:
+        return pd.DataFrame(), []
 
-    ratio_agg.loc[(ratio_agg["Price_Income_Ratio"] > 5.0) &
-                (ratio_agg["Price_Income_Ratio"] < 9.0),
-                "Affordability"] = "Severely Unaffordable"
+    # Plain-string city names so plotly keeps the data order
+    ratio_agg = categorical_to_str(ratio_agg, ["city_full"])
 
-    ratio_agg.loc[ratio_agg["Price_Income_Ratio"] >= 9.0,
-                "Affordability"] = "Impossibly Unaffordable"
+    ratio_agg["Affordability"] = classify_affordability(ratio_agg["Price_Income_Ratio"], missing="")
 
-    city_order = sorted(df["city_full"].unique())
+    city_order = sorted(ratio_agg["city_full"].unique())
     
     return ratio_agg, city_order
 
-data = load_data()
+data = load_data(current_data_version())
 ratio_agg = data[0]
 city_order = data[1]
 
@@ -263,6 +269,7 @@ with st.expander("How to Use This Tool", expanded=True, icon="💡"):
                 - 🎯 Pick any metropolitan area from the list above — the chart updates instantly.
                 - 📊 Compare how affordable house prices are across metropolitan area and over time.
                 - 🔍 Hover over any point to see detailed numbers for that year.
+                - 🗓️ Switch to **Monthly** resolution for finer trend detail.
 
                 Enjoy exploring! 🚀
                 """)
@@ -290,6 +297,12 @@ with col1:
             unsafe_allow_html=True,
         )
         st.button("Reset to Default", on_click=reset_cities)
+        resolution = st.radio(
+            "Resolution",
+            options=["Annual", "Monthly"],
+            horizontal=True,
+            key="resolution",
+        )
         selected_cities = st.multiselect(
             "Metro Areas",
             options=city_order,
@@ -307,7 +320,30 @@ else:
         # Price to Income Ratio Visualization
         # ===================================
 
-        price_income = ratio_agg[ratio_agg["city_full"].isin(selected_cities)].copy()
+        monthly = resolution == "Monthly"
+        if monthly:
+            monthly_agg = load_data(current_data_version(), monthly=True)[0]
+            if monthly_agg.empty:
+                with col2:
+                    st.warning("⚠️ **Monthly data unavailable**: showing annual medians instead.")
+                monthly = False
+
+        if monthly:
+            x_col, x_label, x_hover = "month", "Month", "Month: %{x|%b %Y}"
+            # Keep only as many points per metro as the plot width can show
+            # (the monthly lines have no markers: one point per pixel column).
+            # The current ~144 months per metro are well under that and are
+            # shipped whole; LTTB only thins longer series.
+            price_income = downsample_groups(
+                monthly_agg[monthly_agg["city_full"].isin(selected_cities)],
+                by="city_full",
+                x="month",
+                y="Price_Income_Ratio",
+                n_out=points_for_width(PLOT_WIDTH_PX, LINE_PIXELS_PER_POINT),
+            )
+        else:
+            x_col, x_label, x_hover = "year", "Year", "Year: %{x}"
+            price_income = ratio_agg[ratio_agg["city_full"].isin(selected_cities)].copy()
 
         customdata = price_income[
             ["Per Capita Income", "median_sale_price", "Affordability"]
@@ -321,11 +357,11 @@ else:
 
         px_fig = px.line(
             price_income,
-            x="year",
+            x=x_col,
             y="Price_Income_Ratio",
             color="city_full",
             color_discrete_map=color_map,
-            markers=True,
+            markers=not monthly,
         )
 
         # attach customdata to metro traces
@@ -397,12 +433,12 @@ else:
             hovertemplate=(
                 "<b>%{fullData.name}</b><br>"
                 "%{customdata[2]}<br>"
-                "Year: %{x}<br>"
+                f"{x_hover}<br>"
                 "Ratio: %{y:.2f}<br>"
                 "Median Income: $%{customdata[0]:,.0f}<br>"
                 "Median Sale Price: $%{customdata[1]:,.0f}<extra></extra>"
             ),
-            selector=dict(mode="lines+markers"),  # only metro lines
+            selector=dict(legendgroup="metros"),  # only metro lines
         )
 
         price_income_fig.update_layout(
@@ -411,7 +447,7 @@ else:
                 "font": {"size": 28},
             },
             yaxis_title="Price-to-Income(PTI) Ratio",
-            xaxis_title="Year",
+            xaxis_title=x_label,
             hovermode="closest",
             template="plotly_white",
             legend=dict(
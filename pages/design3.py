@@ -17,8 +17,6 @@ try:
     import numpy as np
     import warnings
     import plotly.express as px
-    import json
-    import time
     import os
 
     # Suppress FutureWarning from plotly.express about observed parameter in groupby
@@ -27,10 +25,13 @@ try:
     warnings.filterwarnings("ignore", category=DeprecationWarning, message=".*choropleth_mapbox.*")
 
     # Import design3 modules
-    from zip_module import load_city_zip_data, get_zip_coordinates
+    from zip_module import ZIP_MAP_ZOOM, load_zip_geojson, load_zip_price_index, zip_price_scale
     from dataprep import (
         load_data,
         make_city_view_data,
+        register_city_year_table,
+        median_ratio_history,
+        category_share_history,
         RATIO_COL,
         AFFORDABILITY_THRESHOLD,
         apply_income_filter,
@@ -39,6 +40,7 @@ try:
         classify_affordability,
         make_zip_view_data,
     )
+    from utils.query import query
     from ui_components import income_control_panel, persona_income_slider, render_affordability_summary_card
 
     # Hide navigation bar on design pages
@@ -64,7 +66,7 @@ try:
 
     # ---------- Function Definitions ----------
     def year_selector(df: pd.DataFrame, key: str):
-        years = sorted(df["year"].unique())
+        years = sorted(int(y) for y in df["year"].unique())
         if not years:
             return None
             
@@ -83,54 +85,10 @@ try:
             help="Choose the year for comparison."
         )
 
-    @st.cache_data(ttl=3600, max_entries=1)
     def get_data_cached():
+        # load_data() is cached process-wide; caching it again here would copy it per session
         return load_data()
 
-    @st.cache_data(ttl=3600, max_entries=1)
-    def calculate_median_ratio_history(dataframe):
-        years = sorted(dataframe["year"].unique())
-        history_data = []
-        for yr in years:
-            city_data_yr = make_city_view_data(dataframe, annual_income=0, year=yr, budget_pct=30)
-            if not city_data_yr.empty and RATIO_COL in city_data_yr.columns:
-                median_ratio = city_data_yr[RATIO_COL].median()
-                history_data.append({"year": yr, "median_ratio": median_ratio})
-        return pd.DataFrame(history_data)
-
-    @st.cache_data(ttl=3600, max_entries=1)
-    def calculate_category_proportions_history(dataframe):
-        years = sorted(dataframe["year"].unique())
-        history_data = []
-        
-        def classify_strict(ratio):
-            if ratio < 3.0: return "Affordable (<3.0)"
-            elif ratio <= 4.0: return "Moderately Unaffordable (3.1-4.0)"
-            elif ratio <= 5.0: return "Seriously Unaffordable (4.1-5.0)"
-            elif ratio <= 9.0: return "Severely Unaffordable (5.1-9.0)" 
-            else: return "Impossibly Unaffordable (>9.0)"
-
-        category_order = [
-            "Affordable (<3.0)", 
-            "Moderately Unaffordable (3.1-4.0)", 
-            "Seriously Unaffordable (4.1-5.0)", 
-            "Severely Unaffordable (5.1-9.0)", 
-            "Impossibly Unaffordable (>9.0)"
-        ]
-
-        for yr in years:
-            city_data_yr = make_city_view_data(dataframe, annual_income=0, year=yr, budget_pct=30)
-            if not city_data_yr.empty and RATIO_COL in city_data_yr.columns:
-                city_data_yr["cat"] = city_data_yr[RATIO_COL].apply(classify_strict)
-                counts = city_data_yr["cat"].value_counts(normalize=True) * 100
-                for cat in category_order:
-                    history_data.append({
-                        "year": yr,
-                        "category": cat,
-                        "percentage": counts.get(cat, 0.0)
-                    })
-        return pd.DataFrame(history_data)
-
     # ---------- Load data first (before showing intro) ----------
     try:
         with st.spinner("Loading housing data..."):
@@ -245,8 +203,9 @@ try:
     df_filtered_by_income = apply_income_filter(df, final_income)
 
     # Calculate historical data (but it's not displayed yet)
-    df_history = calculate_median_ratio_history(df)
-    df_prop_history = calculate_category_proportions_history(df)
+    # All years come from one grouped (year, metro) table cached per data version
+    df_history = median_ratio_history(df)
+    df_prop_history = category_share_history(df)
 
     # --- Divider ---
     st.markdown("""
@@ -304,29 +263,22 @@ try:
         with st.container(border=True):
             st.markdown("#### Affordable Metro Areas based on Income")
 
+            # =====================================================================
+            # FILTER: only metro areas where Median Sale Price < max_affordable_price
+            # (from affordability summary)
+            # =====================================================================
+            # Get the current max affordable price (matches what's shown in summary card)
+            current_income_for_filter = st.session_state.get("income_manual_key", final_income)
+            max_affordable_for_filter = AFFORDABILITY_THRESHOLD * current_income_for_filter
+
             city_data = make_city_view_data(
                 df, 
                 annual_income=final_income,
                 year=selected_year, 
                 budget_pct=30,
+                max_price=max_affordable_for_filter,
             )
 
-            # =====================================================================
-            # FILTER ADDED: Filter bar chart by Max Affordable Price
-            # This section filters city_data to only show metro areas where
-            # Median Sale Price < max_affordable_price (from affordability summary)
-            # =====================================================================
-            # Get the current max affordable price (matches what's shown in summary card)
-            current_income_for_filter = st.session_state.get("income_manual_key", final_income)
-            max_affordable_for_filter = AFFORDABILITY_THRESHOLD * current_income_for_filter
-            
-            # Filter city_data to only include metro areas with Median Sale Price < max_affordable_price
-            if "Median Sale Price" in city_data.columns:
-                city_data = city_data[city_data["Median Sale Price"] < max_affordable_for_filter].copy()
-            # =====================================================================
-            # END OF FILTER ADDITION
-            # =====================================================================
-
             if city_data.empty:
                 st.warning(f"⚠️ **No Data Available for {selected_year}**")
                 st.info("""
@@ -336,11 +288,6 @@ try:
                 - Try selecting a different year or adjusting the income filter
                 """)
             else:
-                city_data["affordability_rating"] = city_data[RATIO_COL].apply(classify_affordability)
-                gap = city_data[RATIO_COL] - AFFORDABILITY_THRESHOLD
-                dist = gap.abs()
-                city_data["gap_for_plot"] = np.where(city_data["affordable"], dist, -dist)
-
                 unique_city_pairs = city_data[["city", "city_full"]].drop_duplicates().sort_values("city_full")
                 full_to_clean_city_map = pd.Series(
                     unique_city_pairs["city"].values,
@@ -363,22 +310,25 @@ try:
                     key="sort_bar_chart",
                 )
                 
-                plot_data = city_data[city_data["city"].isin(selected_clean_metros)].copy()
-                
-                if plot_data.empty:
+                # Sort logic: (column, ascending) per option
+                sort_by, sort_ascending = {
+                    "PTI (Price to Income Ratio)": (RATIO_COL, True),
+                    "Median Sale Price": ("Median Sale Price", False),
+                    "Household Income": ("Per Capita Income", False),
+                }.get(sort_option, ("city_full", True))
+                bar_where = {
+                    "year": selected_year,
+                    "Median Sale Price": ("<", max_affordable_for_filter),
+                    "city": ("in", selected_clean_metros),
+                }
+                sorted_data = query(
+                    register_city_year_table(df), where=bar_where, sort_by=sort_by, ascending=sort_ascending
+                )
+
+                if sorted_data.empty:
                     st.warning("No cities match your current filter selection.")
-                    sorted_data = pd.DataFrame()
                     filtered_color_map = {}
                 else:
-                    # Sort logic
-                    if sort_option == "PTI (Price to Income Ratio)":
-                        sorted_data = plot_data.sort_values(RATIO_COL, ascending=True)
-                    elif sort_option == "Median Sale Price":
-                        sorted_data = plot_data.sort_values("Median Sale Price", ascending=False)
-                    elif sort_option == "Household Income":
-                        sorted_data = plot_data.sort_values("Per Capita Income", ascending=False)
-                    else: 
-                        sorted_data = plot_data.sort_values("city_full") 
 
                     # Color logic - use only categories that exist in data
                     sorted_data["afford_label"] = sorted_data["affordability_rating"].astype(str)
@@ -482,13 +432,19 @@ try:
                 key="map_metro_select"
             )
 
-            city_clicked_df = df[df['city_full'] == selected_map_metro_full]
+            city_clicked_df = query(
+                register_city_year_table(df),
+                where={"city_full": selected_map_metro_full},
+                columns=["city"],
+                limit=1,
+            )
             
             if city_clicked_df.empty:
                 st.warning("Selected metro area does not exist in the filtered data.")
                 city_clicked = None
             else:
-                geojson_code = city_clicked_df["city_geojson_code"].iloc[0]
+                # 'city' holds the GeoJSON code in the city-year table
+                geojson_code = city_clicked_df["city"].iloc[0]
                 city_clicked = geojson_code
 
    
@@ -511,76 +467,36 @@ try:
                         f'</div>', 
                         unsafe_allow_html=True
                     )
-                    time.sleep(0.5) 
 
-                # Load Map Data
-                df_zip = load_city_zip_data(city_clicked, df_full=df, max_pci=final_income)
-                
-                if "year" in df_zip.columns:
-                    df_zip = df_zip[df_zip["year"] == selected_year].copy() 
+                # Load Map Data: the metro's ZIPs for the year, pre-sorted by price
+                price_index = load_zip_price_index(city_clicked, selected_year, df_full=df)
+                df_zip = price_index["rows"]
 
-                if df_zip.empty:
+                if df_zip is None:
                     if should_trigger_spinner: loading_message_placeholder.empty()
                     st.error("No ZIP-level data available for this city/year.")
                 else:
-                    df_zip_map = get_zip_coordinates(df_zip) 
                     price_col = "median_sale_price"
-                    income_col = "per_capita_income"
 
-                    if df_zip_map.empty or price_col not in df_zip_map.columns:
+                    if df_zip.empty:
                         if should_trigger_spinner: loading_message_placeholder.empty()
                         st.error("Map data processing failed.")
                     else:
-                        if RATIO_COL not in df_zip_map.columns:
-                            denom_zip = df_zip_map[income_col].replace(0, np.nan)
-                            df_zip_map[RATIO_COL] = df_zip_map[price_col] / denom_zip
-                        
-                        df_zip_map["affordability_rating"] = df_zip_map[RATIO_COL].apply(classify_affordability)
-                        
-                        # Map Prices to Color
-                        min_price = df_zip_map[price_col].min()
-                        max_price = df_zip_map[price_col].max()
-                        
-                        affordable_mask = df_zip_map[price_col] < max_affordable_price
-                        unaffordable_mask = df_zip_map[price_col] >= max_affordable_price
-                        
-                        df_zip_map["color_value"] = np.nan
-                        
-                        if affordable_mask.any():
-                            affordable_prices = df_zip_map.loc[affordable_mask, price_col]
-                            if affordable_prices.min() < max_affordable_price:
-                                affordable_range = max_affordable_price - min_price
-                                if affordable_range > 0:
-                                    df_zip_map.loc[affordable_mask, "color_value"] = (
-                                        0.5 * (affordable_prices - min_price) / affordable_range
-                                    )
-                                else:
-                                    df_zip_map.loc[affordable_mask, "color_value"] = 0.25
-                        
-                        if unaffordable_mask.any():
-                            unaffordable_prices = df_zip_map.loc[unaffordable_mask, price_col]
-                            if unaffordable_prices.max() >= max_affordable_price:
-                                unaffordable_range = max_price - max_affordable_price
-                                if unaffordable_range > 0:
-                                    df_zip_map.loc[unaffordable_mask, "color_value"] = (
-                                        0.5 + 0.5 * (unaffordable_prices - max_affordable_price) / unaffordable_range
-                                    )
-                                else:
-                                    df_zip_map.loc[unaffordable_mask, "color_value"] = 0.75
-                        
-                        df_zip_map["color_value"] = df_zip_map["color_value"].clip(0, 1)
-
-                        geojson_path = design3_path / "city_geojson" / f"{city_clicked}.geojson"
-
-                        if not geojson_path.exists():
+                        # Map Prices to Color: one binary search for the affordable
+                        # split, vectorized rescale of both halves
+                        scale = zip_price_scale(price_index, max_affordable_price)
+                        df_zip_map = df_zip.assign(color_value=scale["color_value"])
+                        min_price = scale["min_price"]
+                        max_price = scale["max_price"]
+                        has_affordable = scale["n_affordable"] > 0
+                        has_unaffordable = scale["n_unaffordable"] > 0
+
+                        zip_geojson = load_zip_geojson(city_clicked)
+
+                        if zip_geojson is None:
                             if should_trigger_spinner: loading_message_placeholder.empty()
-                            st.error(f"GeoJSON file not found for {city_clicked}. Expected path: {geojson_path}")
+                            st.error(f"ZIP boundaries not found for {city_clicked}. Expected a geometry pack or city_geojson/{city_clicked}.geojson")
                         else:
-                            with open(geojson_path, "r") as f:
-                                zip_geojson = json.load(f)
-
-                            df_zip_map["zip_str_padded"] = df_zip_map["zip_code_int"].astype(str).str.zfill(5)
-
                             custom_colorscale = [
                                 [0.0, "rgb(0, 100, 0)"],      # Dark green (very affordable)
                                 [0.3, "rgb(34, 139, 34)"],   # Medium green
@@ -594,7 +510,7 @@ try:
                                 df_zip_map,
                                 geojson=zip_geojson,
                                 locations="zip_str_padded", 
-                                featureidkey="properties.ZCTA5CE10",
+                                featureidkey="id",
                                 color="color_value", 
                                 color_continuous_scale=custom_colorscale,
                                 range_color=[0, 1],
@@ -609,7 +525,7 @@ try:
                                     "lat": df_zip_map["lat"].mean(),
                                     "lon": df_zip_map["lon"].mean(),
                                 },
-                                zoom=8,
+                                zoom=ZIP_MAP_ZOOM,
                                 height=454,
                             )
 
@@ -618,12 +534,12 @@ try:
                             tick_labels = []
                             for tv in tick_vals:
                                 if tv <= 0.5:
-                                    if affordable_mask.any() and min_price < max_affordable_price:
+                                    if has_affordable and min_price < max_affordable_price:
                                         price_val = min_price + (tv / 0.5) * (max_affordable_price - min_price)
                                     else:
                                         price_val = min_price
                                 else:
-                                    if unaffordable_mask.any() and max_price > max_affordable_price:
+                                    if has_unaffordable and max_price > max_affordable_price:
                                         price_val = max_affordable_price + ((tv - 0.5) / 0.5) * (max_price - max_affordable_price)
                                     else:
                                         price_val = max_affordable_price
@@ -661,7 +577,14 @@ try:
 
             if city_clicked is not None:
                 if not city_data.empty:
-                    city_row = city_data[city_data["city"] == city_clicked] 
+                    city_row = query(
+                        register_city_year_table(df),
+                        where={
+                            "year": selected_year,
+                            "Median Sale Price": ("<", max_affordable_for_filter),
+                            "city": city_clicked,
+                        },
+                    )
                     if not city_row.empty:
                         row = city_row.iloc[0]
                         st.markdown(f"#### Metro Area Snapshot: {row['city_full']} ({selected_year})")
@@ -691,15 +614,17 @@ try:
             ]
 
             for cat in categories_to_plot:
-                cat_data = sorted_data[sorted_data["affordability_rating"] == cat].copy()
+                cat_data = query(
+                    register_city_year_table(df),
+                    where={**bar_where, "affordability_rating": cat},
+                    sort_by=RATIO_COL,
+                )
                 
                 st.markdown(f"**{cat}**")
                 
                 if cat_data.empty:
                     st.info(f"No cities in the current selection fall into the '{cat}' category.")
                 else:
-                    cat_data = cat_data.sort_values(RATIO_COL, ascending=True)
-                    
                     fig_cat = px.bar(
                         cat_data,
                         x="city",
@@ -26,6 +26,10 @@ for path in paths_to_remove:
 if sys.path[0] != str(story_path):
     sys.path.insert(0, str(story_path))
 
+# Project root is needed for the shared utils package (after story path)
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
 # Store original working directory but don't change it
 # Use absolute paths instead to avoid issues with os.chdir
 original_cwd = os.getcwd()
@@ -74,6 +78,11 @@ try:
     yearly_metro_summary = data_utils.yearly_metro_summary
     affordability_counts_by_year = data_utils.affordability_counts_by_year
     latest_year = data_utils.latest_year
+    load_precomputed_summaries = data_utils.load_precomputed_summaries
+    load_story_bundle = data_utils.load_story_bundle
+    metro_pti_series = data_utils.metro_pti_series
+    register_summary_table = data_utils.register_summary_table
+    metros_by_pti = data_utils.metros_by_pti
     AFFORDABILITY_ORDER = data_utils.AFFORDABILITY_ORDER
     AFFORDABILITY_COLORS = data_utils.AFFORDABILITY_COLORS
     
@@ -116,14 +125,30 @@ try:
 
     # ---- load & prep data ----
     try:
-        raw = load_raw_data()
-        if raw.empty:
-            st.error("❌ **Data Loading Error**: The data file is empty. Please check that `story/data/HouseTS_reduced.csv` exists and contains data.")
-            st.stop()
-        df = add_derived_columns(raw)
-        comp = composite_series(df)
-        summary = yearly_metro_summary(df)
-        counts = affordability_counts_by_year(summary)
+        # The prebuilt bundle (python -m utils.build_data story) holds every
+        # chart input, so the ZIP-level rows are only read without it
+        bundle = load_story_bundle()
+        if bundle is not None:
+            comp = bundle["composite"]
+            summary = bundle["summary"]
+            counts = bundle["counts"]
+            df_metro_pti = bundle["metro_pti"]
+        else:
+            raw = load_raw_data()
+            if raw.empty:
+                st.error("❌ **Data Loading Error**: The data file is empty. Please check that `story/data/HouseTS_reduced.csv` exists and contains data.")
+                st.stop()
+            df = add_derived_columns(raw)
+            # Prebuilt tables (python -m utils.build_data aggregates) skip the groupbys
+            precomputed = load_precomputed_summaries()
+            if precomputed is not None:
+                comp, summary = precomputed
+            else:
+                comp = composite_series(df)
+                summary = yearly_metro_summary(df)
+            counts = affordability_counts_by_year(summary)
+            df_metro_pti = metro_pti_series(df)
+        register_summary_table(summary)
         year_latest = latest_year(summary)
     except FileNotFoundError as e:
         st.error(f"""
@@ -217,27 +242,13 @@ try:
         # Chart in a bordered container
         with st.container(border=True):
             st.plotly_chart(
-                metro_pti_lines(df, focus_year=focus_year),
+                metro_pti_lines(df_metro_pti, focus_year=focus_year),
                 width='stretch',
             )
 
-        # --- compute top/bottom 7 metros for that year using `summary` ---
-        summary_year = (
-            summary[summary["year"] == focus_year]
-            .dropna(subset=["price_to_income"])
-        )
-
-        top7 = (
-            summary_year.sort_values("price_to_income", ascending=False)
-            .head(7)["city_full"]
-            .tolist()
-        )
-
-        bottom7 = (
-            summary_year.sort_values("price_to_income", ascending=True)
-            .head(7)["city_full"]
-            .tolist()
-        )
+        # --- top/bottom 7 metros for that year from the `summary` table ---
+        top7 = metros_by_pti(focus_year, n=7, least_affordable=True)
+        bottom7 = metros_by_pti(focus_year, n=7, least_affordable=False)
 
         # --- list in a card-style container ---
         with st.container(border=True):
@@ -32,22 +32,16 @@ def composite_price_income_index_chart(comp: pd.DataFrame) -> go.Figure:
 
 # ---------- CHAPTER 2: METRO DIVERGENCE ----------
 
-def metro_pti_lines(df: pd.DataFrame, focus_year: int) -> go.Figure:
+def metro_pti_lines(df_metro: pd.DataFrame, focus_year: int) -> go.Figure:
     """
     Plot metro-level PTI trends over time, with the top/bottom 7 metros
     (by PTI in the focus_year) highlighted.
 
-    df can be ZIP-level; we aggregate to metro-by-date first.
+    df_metro is the metro-by-date series (data_utils.metro_pti_series or
+    the story bundle's metro_pti table).
     """
 
-    # 1) Aggregate ZIPs → metro-level series
-    df_metro = (
-        df.groupby(["city_full", "year", "date"], as_index=False, observed=True)["price_to_income"]
-        .mean()
-        .dropna(subset=["price_to_income"])
-    )
-
-    # 2) Compute snapshot for the focus year (metro-level PTI)
+    # 1) Compute snapshot for the focus year (metro-level PTI)
     snapshot = (
         df_metro[df_metro["year"] == focus_year]
         .groupby("city_full", as_index=False, observed=True)["price_to_income"]
@@ -65,8 +59,7 @@ def metro_pti_lines(df: pd.DataFrame, focus_year: int) -> go.Figure:
             return "Bottom 7 (Most Affordable)"
         return "Other"
 
-    df_plot = df_metro.copy()
-    df_plot["group"] = df_plot["city_full"].apply(label_group)
+    df_plot = df_metro.assign(group=df_metro["city_full"].apply(label_group))
 
     color_map = {
         "Top 7 (Least Affordable)": "#B71C1C",
@@ -109,7 +102,7 @@ def affordability_bands_with_us_ratio(counts: pd.DataFrame,
         .rename(columns={"composite_pti": "us_pti"})
     )
     
-    us_pti["band"] = us_pti["us_pti"].apply(classify_affordability)
+    us_pti["band"] = classify_affordability(us_pti["us_pti"])
 
     # Figure with secondary y-axis
     fig = make_subplots(specs=[[{"secondary_y": True}]])
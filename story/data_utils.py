@@ -3,43 +3,56 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
-# Demographia categories
-AFFORDABILITY_ORDER = [
-    "Affordable",
-    "Moderately Unaffordable",
-    "Seriously Unaffordable",
-    "Severely Unaffordable",
-    "Impossibly Unaffordable",
+# Bands are shared with the other pages; the story page and charts import them from here
+from utils.affordability import (
+    AFFORDABILITY_COLORS,
+    AFFORDABILITY_ORDER,
+    classify_affordability,
+)
+from utils.aggregates import (
+    add_story_ratios,
+    aggregate_exists,
+    read_aggregate,
+    story_band_counts,
+    story_composite_agg,
+    story_metro_pti_agg,
+    story_summary_agg,
+)
+from utils.query import query, register_table
+from utils.story_bundle import read_story_bundle, story_bundle_exists
+from utils.data_store import get_house_view, store_available
+from utils.data_version import current_data_version
+from utils.schema import apply_schema, categorical_to_str, csv_dtypes
+
+# Query-layer name of the metro x year summary
+SUMMARY_TABLE = "story_summary"
+
+# Columns the story page takes from the shared HouseTS store
+HOUSE_COLUMNS = [
+    "date",
+    "median_sale_price",
+    "Median Rent",
+    "Per Capita Income",
+    "city_full",
+    "year",
 ]
 
-AFFORDABILITY_COLORS = {
-    "Affordable": "#4CAF50",                # green
-    "Moderately Unaffordable": "#FFC107",   # amber
-    "Seriously Unaffordable": "#FF9800",    # orange
-    "Severely Unaffordable": "#E57373",     # light red
-    "Impossibly Unaffordable": "#B71C1C",   # dark red
-}
 
-
-def classify_affordability(pti: float):
-    """Demographia thresholds based on price-to-income."""
-    if pd.isna(pti):
-        return None
-    if pti <= 3.0:
-        return "Affordable"
-    elif pti <= 4.0:
-        return "Moderately Unaffordable"
-    elif pti <= 5.0:
-        return "Seriously Unaffordable"
-    elif pti <= 8.9:
-        return "Severely Unaffordable"
-    else:
-        return "Impossibly Unaffordable"
-
-
-@st.cache_data(show_spinner="Loading HouseTS_reduced.csv …")
 def load_raw_data(path: str = None) -> pd.DataFrame:
-    """Read the raw HouseTS CSV."""
+    """
+    Return the raw HouseTS rows.
+
+    Without an explicit path this is a read-only projection of the shared
+    data store; otherwise (or if the store has no source) the CSV is read.
+    """
+    if path is None and store_available():
+        return get_house_view(columns=HOUSE_COLUMNS)
+    return _load_csv_data(path, current_data_version())
+
+
+@st.cache_data(show_spinner="Loading HouseTS_reduced.csv …", max_entries=1)
+def _load_csv_data(path: str = None, data_version: str = "") -> pd.DataFrame:
+    """Read the raw HouseTS CSV (cached until the data version changes)."""
     import os
     from pathlib import Path
     
@@ -77,7 +90,8 @@ def load_raw_data(path: str = None) -> pd.DataFrame:
             f"Please ensure HouseTS_reduced.csv exists in story/data/ directory"
         )
     
-    return pd.read_csv(data_path)
+    df = pd.read_csv(data_path, dtype=csv_dtypes())
+    return apply_schema(df, name=data_path.name)
 
 
 def add_derived_columns(df_raw: pd.DataFrame) -> pd.DataFrame:
@@ -92,27 +106,16 @@ def add_derived_columns(df_raw: pd.DataFrame) -> pd.DataFrame:
     - city_full
     - year
     """
-    df = df_raw.copy()
+    # household income estimate and core ratios (on a copy of df_raw)
+    df = add_story_ratios(df_raw)
 
     # time
     df["date"] = pd.to_datetime(df["date"])
     # recompute year from date to be safe
     df["year"] = df["date"].dt.year
 
-    # safe denominators
-    income_pc = df["Per Capita Income"].replace(0, np.nan)
-    rent = df["Median Rent"].replace(0, np.nan)
-    
-    AVERAGE_HOUSEHOLD_SIZE = 2.54
-    df["median_household_income_est"] = income_pc * AVERAGE_HOUSEHOLD_SIZE
-
-    # core ratios
-    df["price_to_income"] = df["median_sale_price"] / df["median_household_income_est"]
-    df["rent_to_income"] = (rent * 12.0) / df["median_household_income_est"]
-    df["price_to_rent"] = df["median_sale_price"] / (rent * 12.0)
-
     # affordability category
-    df["affordability_rating"] = df["price_to_income"].apply(classify_affordability)
+    df["affordability_rating"] = classify_affordability(df["price_to_income"])
 
     return df
 
@@ -124,34 +127,8 @@ def composite_series(df: pd.DataFrame) -> pd.DataFrame:
       date, composite_price, composite_income,
       composite_pti, price_index, income_index, year
     """
-    grouped = (
-        df.groupby("date", as_index=False, observed=True)[
-            ["median_sale_price", "median_household_income_est", "price_to_income"]
-        ]
-        .mean()
-        .rename(
-            columns={
-                "median_sale_price": "composite_price",
-                "median_household_income_est": "composite_income",
-                "price_to_income": "composite_pti",
-            }
-        )
-    )
-
-    # normalize to first year's values
-    first_year = grouped["date"].dt.year.min()
-    base = grouped[grouped["date"].dt.year == first_year].iloc[0]
-    grouped["price_index"] = (
-        grouped["composite_price"] / base["composite_price"] * 100.0
-    )
-    grouped["income_index"] = (
-        grouped["composite_income"] / base["composite_income"] * 100.0
-    )
-
-    grouped["year"] = grouped["date"].dt.year
-    grouped["affordability_rating"] = grouped["composite_pti"].apply(
-        classify_affordability
-    )
+    grouped = story_composite_agg(df)
+    grouped["affordability_rating"] = classify_affordability(grouped["composite_pti"])
     return grouped
 
 
@@ -159,34 +136,86 @@ def yearly_metro_summary(df: pd.DataFrame) -> pd.DataFrame:
     """
     One row per (city_full, year) summarizing PTI, rent burden
     """
-    summary = (
-        df.groupby(["city_full", "year"], as_index=False, observed=True)
-        .agg(
-            price_to_income=("price_to_income", "mean"),
-            rent_to_income=("rent_to_income", "mean"),
-        )
-    )
+    summary = story_summary_agg(df)
 
-    summary["affordability_rating"] = summary["price_to_income"].apply(
-        classify_affordability
-    )
-    return summary
+    summary["affordability_rating"] = classify_affordability(summary["price_to_income"])
+    # Plain-string metro names so plotly keeps the data order
+    return categorical_to_str(summary, ["city_full"])
+
+
+def load_precomputed_summaries():
+    """
+    Return (composite, summary) from the prebuilt aggregate tables, or None
+    if `python -m utils.build_data aggregates` has not been run.
+    """
+    if not (aggregate_exists("story_composite") and aggregate_exists("story_summary")):
+        return None
+    comp = read_aggregate("story_composite")
+    comp["affordability_rating"] = classify_affordability(comp["composite_pti"])
+    summary = read_aggregate("story_summary")
+    summary["affordability_rating"] = classify_affordability(summary["price_to_income"])
+    return comp, categorical_to_str(summary, ["city_full"])
 
 
 def affordability_counts_by_year(summary: pd.DataFrame) -> pd.DataFrame:
     """Number of metros in each category per year."""
-    counts = (
-        summary.groupby(["year", "affordability_rating"])
-        .size()
-        .reset_index(name="n_metros")
+    return story_band_counts(summary)
+
+
+def metro_pti_series(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Metro-level PTI per month (input of charts.metro_pti_lines).
+
+    df is ZIP-level (see add_derived_columns).
+    """
+    return story_metro_pti_agg(df)
+
+
+def load_story_bundle():
+    """
+    Return the prebuilt Story tables (composite, summary, counts,
+    metro_pti), or None if `python -m utils.build_data story` has not been
+    run. Loaded once per process and data version; treat as read-only.
+    """
+    if not story_bundle_exists():
+        return None
+    return _load_story_bundle_cached(current_data_version())
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_story_bundle_cached(data_version: str):
+    return read_story_bundle()
+
+
+def register_summary_table(summary: pd.DataFrame) -> str:
+    """
+    Register the metro x year summary with the query layer (once per data
+    version) and return its table name.
+    """
+    register_table(
+        SUMMARY_TABLE,
+        summary,
+        current_data_version(),
+        index=["year", "city_full"],
+        sort_index=["price_to_income", "rent_to_income"],
     )
-    counts["affordability_rating"] = pd.Categorical(
-        counts["affordability_rating"],
-        categories=AFFORDABILITY_ORDER,
-        ordered=True,
+    return SUMMARY_TABLE
+
+
+def metros_by_pti(year: int, n: int = 7, least_affordable: bool = True) -> list:
+    """
+    Names of the n metros with the highest (least_affordable) or lowest
+    PTI in the given year. Requires register_summary_table().
+    """
+    top = query(
+        SUMMARY_TABLE,
+        where={"year": year, "price_to_income": (">", 0)},
+        columns=["city_full"],
+        sort_by="price_to_income",
+        ascending=not least_affordable,
+        limit=n,
     )
-    counts = counts.sort_values(["year", "affordability_rating"])
-    return counts
+    return top["city_full"].tolist()
 
 
 def latest_year(summary: pd.DataFrame) -> int:
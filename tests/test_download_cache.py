@@ -0,0 +1,129 @@
+"""
+utils.download_cache against a local HTTP server standing in for the host.
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from utils.download_cache import fetch
+
+PAYLOAD = bytes(range(256)) * 64  # 16 KiB
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve PAYLOAD, honouring `Range: bytes=N-` unless the server ignores it."""
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("Range"))
+        range_header = self.headers.get("Range")
+        if range_header and self.server.honour_range:
+            start = int(range_header.split("=", 1)[1].rstrip("-"))
+            if self.server.ignore_offset:
+                start = 0
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = PAYLOAD[start:]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.honour_range = True
+    httpd.ignore_offset = False
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/HouseTS.csv"
+
+
+def test_fresh_download(server, tmp_path):
+    dest = tmp_path / "HouseTS.csv"
+    assert fetch(_url(server), dest, sha256=PAYLOAD_SHA256, chunk_size=1000) == dest
+    assert dest.read_bytes() == PAYLOAD
+    assert not (tmp_path / "HouseTS.csv.tmp").exists()
+    assert server.requests == [None]
+
+    # A second call is served from the cache
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert len(server.requests) == 1
+
+
+def test_resume_partial_download(server, tmp_path):
+    dest = tmp_path / "HouseTS.csv"
+    (tmp_path / "HouseTS.csv.tmp").write_bytes(PAYLOAD[:5000])
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests == ["bytes=5000-"]
+
+
+def test_server_ignores_range(server, tmp_path):
+    server.honour_range = False
+    dest = tmp_path / "HouseTS.csv"
+    (tmp_path / "HouseTS.csv.tmp").write_bytes(PAYLOAD[:5000])
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert dest.read_bytes() == PAYLOAD
+
+
+def test_partial_response_at_wrong_offset_starts_over(server, tmp_path):
+    server.ignore_offset = True
+    dest = tmp_path / "HouseTS.csv"
+    (tmp_path / "HouseTS.csv.tmp").write_bytes(PAYLOAD[:5000])
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests == ["bytes=5000-", None]
+
+
+def test_complete_leftover_tmp(server, tmp_path):
+    dest = tmp_path / "HouseTS.csv"
+    (tmp_path / "HouseTS.csv.tmp").write_bytes(PAYLOAD)
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests == [f"bytes={len(PAYLOAD)}-"]
+
+
+def test_oversized_leftover_tmp_starts_over(server, tmp_path):
+    dest = tmp_path / "HouseTS.csv"
+    (tmp_path / "HouseTS.csv.tmp").write_bytes(PAYLOAD + b"stale")
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests == [f"bytes={len(PAYLOAD) + 5}-", None]
+
+
+def test_checksum_mismatch_removes_tmp(server, tmp_path):
+    dest = tmp_path / "HouseTS.csv"
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        fetch(_url(server), dest, sha256="0" * 64)
+    assert not dest.exists()
+    assert not (tmp_path / "HouseTS.csv.tmp").exists()
+
+    # The next attempt downloads from scratch
+    fetch(_url(server), dest, sha256=PAYLOAD_SHA256)
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests == [None, None]
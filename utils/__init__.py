@@ -15,6 +15,57 @@ from .error_handling import (
     show_data_loading_error,
     show_empty_data_error,
 )
+from .schema import (
+    HOUSE_TS_SCHEMA,
+    apply_schema,
+    csv_dtypes,
+    memory_mb,
+)
+from .house_store import (
+    build_snapshot,
+    read_house_ts,
+    snapshot_exists,
+    build_partitions,
+    partitions_exist,
+    read_partitions,
+    build_ipc,
+    ipc_exists,
+    read_ipc,
+)
+from .affordability import (
+    AFFORDABILITY_COLORS,
+    AFFORDABILITY_ORDER,
+    classify_affordability,
+)
+from .aggregates import (
+    build_aggregates,
+    aggregate_exists,
+    read_aggregate,
+)
+from .story_bundle import (
+    build_story_bundle,
+    story_bundle_exists,
+    read_story_bundle,
+)
+from .ingest import (
+    ingest_delta,
+    compact,
+)
+from .download_cache import fetch
+from .query import (
+    register_table,
+    query,
+    query_stats,
+)
+from .data_version import (
+    current_data_version,
+    data_version,
+)
+from .data_store import (
+    get_house_table,
+    get_house_view,
+    store_available,
+)
 
 __all__ = [
     # Path utilities
@@ -29,5 +80,48 @@ __all__ = [
     "show_missing_files_error",
     "show_data_loading_error",
     "show_empty_data_error",
+    # Declared column schema
+    "HOUSE_TS_SCHEMA",
+    "apply_schema",
+    "csv_dtypes",
+    "memory_mb",
+    # HouseTS columnar snapshot
+    "build_snapshot",
+    "read_house_ts",
+    "snapshot_exists",
+    "build_partitions",
+    "partitions_exist",
+    "read_partitions",
+    "build_ipc",
+    "ipc_exists",
+    "read_ipc",
+    # Affordability bands
+    "AFFORDABILITY_COLORS",
+    "AFFORDABILITY_ORDER",
+    "classify_affordability",
+    # Pre-aggregated page tables
+    "build_aggregates",
+    "aggregate_exists",
+    "read_aggregate",
+    # Story page bundle
+    "build_story_bundle",
+    "story_bundle_exists",
+    "read_story_bundle",
+    # Incremental ingest
+    "ingest_delta",
+    "compact",
+    # Download-once cache
+    "fetch",
+    # Query layer over the page tables
+    "register_table",
+    "query",
+    "query_stats",
+    # Cache invalidation
+    "current_data_version",
+    "data_version",
+    # Shared data store
+    "get_house_table",
+    "get_house_view",
+    "store_available",
 ]
 
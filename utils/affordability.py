@@ -0,0 +1,100 @@
+"""
+Demographia affordability bands shared by every page.
+
+Pages used to classify price-to-income ratios row by row with three
+differently-coded threshold sets (8.9 vs 9.0 upper bounds). The bands are
+defined once here and classify_affordability() assigns them with a single
+vectorized bin lookup:
+
+    Affordable                 PTI <= 3.0
+    Moderately Unaffordable    3.0 < PTI <= 4.0
+    Seriously Unaffordable     4.0 < PTI <= 5.0
+    Severely Unaffordable      5.0 < PTI < 9.0
+    Impossibly Unaffordable    PTI >= 9.0
+"""
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+AFFORDABILITY_ORDER = [
+    "Affordable",
+    "Moderately Unaffordable",
+    "Seriously Unaffordable",
+    "Severely Unaffordable",
+    "Impossibly Unaffordable",
+]
+
+AFFORDABILITY_COLORS = {
+    "Affordable": "#4CAF50",                # green
+    "Moderately Unaffordable": "#FFC107",   # amber
+    "Seriously Unaffordable": "#FF9800",    # orange
+    "Severely Unaffordable": "#E57373",     # light red
+    "Impossibly Unaffordable": "#B71C1C",   # dark red
+}
+
+# (lower, upper) PTI bounds of each band; None means unbounded
+AFFORDABILITY_BOUNDS = {
+    "Affordable": (None, 3.0),
+    "Moderately Unaffordable": (3.0, 4.0),
+    "Seriously Unaffordable": (4.0, 5.0),
+    "Severely Unaffordable": (5.0, 9.0),
+    "Impossibly Unaffordable": (9.0, None),
+}
+
+# Band names with their PTI range, as shown in legends
+AFFORDABILITY_LABELS = {
+    "Affordable": "Affordable (≤3.0)",
+    "Moderately Unaffordable": "Moderately Unaffordable (3.1-4.0)",
+    "Seriously Unaffordable": "Seriously Unaffordable (4.1-5.0)",
+    "Severely Unaffordable": "Severely Unaffordable (5.1-8.9)",
+    "Impossibly Unaffordable": "Impossibly Unaffordable (9.0+)",
+}
+
+# Highest PTI still rated "Affordable"
+AFFORDABLE_MAX = 3.0
+
+# Bin edges for np.searchsorted(side="left"): the first three bands are
+# closed on the right, the last one is closed on the left (PTI >= 9.0)
+_EDGES = np.array([3.0, 4.0, 5.0, np.nextafter(9.0, -np.inf)])
+
+ArrayLike = Union[pd.Series, np.ndarray, list]
+
+
+def band_codes(pti: ArrayLike) -> np.ndarray:
+    """
+    Return the band index (0-4, position in AFFORDABILITY_ORDER) of each
+    ratio, or -1 where the ratio is missing.
+    """
+    values = np.asarray(pti, dtype="float64")
+    codes = np.searchsorted(_EDGES, values, side="left").astype("int8")
+    codes[np.isnan(values)] = -1
+    return codes
+
+
+def classify_affordability(
+    pti: Union[ArrayLike, float], missing: Optional[str] = None
+) -> Union[pd.Series, pd.Categorical, str, None]:
+    """
+    Classify price-to-income ratios into Demographia bands.
+
+    Args:
+        pti: Series, array or scalar of ratios
+        missing: Label for missing ratios (None leaves them missing)
+
+    Returns:
+        For a Series, an ordered categorical Series with the same index; for
+        an array, a Categorical; for a scalar, the band name (or missing)
+    """
+    if np.ndim(pti) == 0:
+        code = band_codes([pti])[0]
+        return AFFORDABILITY_ORDER[code] if code >= 0 else missing
+
+    categories = AFFORDABILITY_ORDER + ([missing] if missing is not None else [])
+    codes = band_codes(pti)
+    if missing is not None:
+        codes[codes == -1] = len(AFFORDABILITY_ORDER)
+    bands = pd.Categorical.from_codes(codes, categories=categories, ordered=True)
+    if isinstance(pti, pd.Series):
+        return pd.Series(bands, index=pti.index, name=pti.name)
+    return bands
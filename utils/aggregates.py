@@ -0,0 +1,348 @@
+"""
+Offline monthly -> annual pre-aggregation of HouseTS.
+
+Every page summarizes the monthly ZIP rows the same few ways. This module
+holds those aggregations in one place and builds all of them from a single
+read of HouseTS (python -m utils.build_data aggregates), so pages can load
+small precomputed tables instead of grouping ~900k rows on first hit:
+
+    house_ts_agg       Design 1   ZIP x year means (+ lat/lon)
+    ratio_agg          Design 2   metro x year median price-to-income
+    ratio_monthly_agg  Design 2   metro x month median price-to-income
+    city_year          Design 3   metro code x year medians
+    story_summary      Story      metro x year mean PTI / rent-to-income
+    story_composite    Story      cross-metro averages per month
+
+Pages fall back to calling the same functions on the raw rows when the
+tables have not been built.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .affordability import AFFORDABILITY_ORDER
+from .house_store import DATA_DIR, read_house_ts
+from .schema import apply_schema
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES_DIR = DATA_DIR / "aggregates"
+MANIFEST_NAME = "manifest.json"
+
+# Household size used to turn per-capita income into household income
+AVERAGE_HOUSEHOLD_SIZE = 2.54
+
+# HouseTS columns read by the build
+SOURCE_COLUMNS = [
+    "date",
+    "year",
+    "city",
+    "city_full",
+    "zipcode",
+    "median_sale_price",
+    "Per Capita Income",
+    "Median Rent",
+]
+
+PathLike = Union[str, Path]
+
+
+# ============================================================
+# Aggregations (shared by the build and the page fallbacks)
+# ============================================================
+
+def zip_coordinates(zip_codes: pd.Series) -> pd.DataFrame:
+    """
+    Look up ZIP centroids with pgeocode.
+
+    Returns a DataFrame with zip_code_str, lat, lon. pgeocode is optional;
+    without it (or without network access for its first download) the
+    coordinates are left empty.
+    """
+    zips = pd.Series(pd.unique(zip_codes.astype(str).str.zfill(5)), name="zip_code_str")
+    out = pd.DataFrame({"zip_code_str": zips, "lat": np.nan, "lon": np.nan})
+    try:
+        import pgeocode
+
+        geo = pgeocode.Nominatim("us").query_postal_code(zips.tolist())
+        out["lat"] = geo["latitude"].to_numpy()
+        out["lon"] = geo["longitude"].to_numpy()
+    except Exception as e:
+        logger.warning(f"ZIP coordinates unavailable, lat/lon left empty: {e}")
+    return out
+
+
+def zip_year_agg(df: pd.DataFrame, with_coordinates: bool = True) -> pd.DataFrame:
+    """
+    Design 1 input: one row per (metro, ZIP, year).
+
+    Columns: city, city_full, zip_code, year, median_sale_price,
+    per_capita_income, lat, lon.
+    """
+    agg = (
+        df.groupby(["city", "city_full", "zipcode", "year"], as_index=False, observed=True)
+        .agg(
+            median_sale_price=("median_sale_price", "mean"),
+            per_capita_income=("Per Capita Income", "mean"),
+        )
+        .rename(columns={"zipcode": "zip_code"})
+    )
+    if with_coordinates:
+        coords = zip_coordinates(agg["zip_code"])
+        keys = agg["zip_code"].astype(str).str.zfill(5)
+        coords = coords.set_index("zip_code_str")
+        agg["lat"] = keys.map(coords["lat"]).to_numpy()
+        agg["lon"] = keys.map(coords["lon"]).to_numpy()
+    else:
+        agg["lat"] = np.nan
+        agg["lon"] = np.nan
+    return agg
+
+
+def metro_ratio_agg(
+    df: pd.DataFrame,
+    city_col: str = "city_full",
+    price_col: str = "median_sale_price",
+    income_col: str = "Per Capita Income",
+    monthly: bool = False,
+) -> pd.DataFrame:
+    """
+    Design 2 input: median price-to-income ratio per (metro, year), or per
+    (metro, month) with monthly=True.
+
+    Rows without a positive price and income are dropped first. Columns:
+    city_full, year, [month,] Price_Income_Ratio, median_sale_price,
+    Per Capita Income. month is the first day of the month of `date`.
+    """
+    df = df[(df[price_col] > 0) & (df[income_col] > 0)]
+    ratio = df[price_col] / (AVERAGE_HOUSEHOLD_SIZE * df[income_col])
+    df = df.assign(Price_Income_Ratio=ratio)
+    keys = [city_col, "year"]
+    if monthly:
+        df = df.assign(month=df["date"].dt.to_period("M").dt.to_timestamp())
+        keys.append("month")
+    agg = (
+        df.groupby(keys, as_index=False, observed=True)
+        .agg({
+            "Price_Income_Ratio": "median",
+            price_col: "median",
+            income_col: "median",
+        })
+    )
+    return agg.rename(columns={
+        city_col: "city_full",
+        price_col: "median_sale_price",
+        income_col: "Per Capita Income",
+    })
+
+
+def city_year_agg(
+    df: pd.DataFrame,
+    city_col: str = "city",
+    income_col: str = "Per Capita Income",
+) -> pd.DataFrame:
+    """
+    Design 3 input: medians per (metro code, year).
+
+    Columns: city_geojson_code, year, median_sale_price, per_capita_income,
+    city_full.
+    """
+    agg = (
+        df.groupby([city_col, "year"], observed=True)
+        .agg(
+            median_sale_price=("median_sale_price", "median"),
+            per_capita_income=(income_col, "median"),
+            city_full=("city_full", "first"),
+        )
+        .reset_index()
+    )
+    return agg.rename(columns={city_col: "city_geojson_code"})
+
+
+def add_story_ratios(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add household income and the PTI / rent ratios used by the Story page.
+
+    Adds: median_household_income_est, price_to_income, rent_to_income,
+    price_to_rent.
+    """
+    df = df.copy()
+    income_pc = df["Per Capita Income"].replace(0, np.nan)
+    rent = df["Median Rent"].replace(0, np.nan)
+
+    df["median_household_income_est"] = income_pc * AVERAGE_HOUSEHOLD_SIZE
+    df["price_to_income"] = df["median_sale_price"] / df["median_household_income_est"]
+    df["rent_to_income"] = (rent * 12.0) / df["median_household_income_est"]
+    df["price_to_rent"] = df["median_sale_price"] / (rent * 12.0)
+    return df
+
+
+def story_summary_agg(df: pd.DataFrame) -> pd.DataFrame:
+    """Story input: mean PTI and rent-to-income per (metro, year)."""
+    return (
+        df.groupby(["city_full", "year"], as_index=False, observed=True)
+        .agg(
+            price_to_income=("price_to_income", "mean"),
+            rent_to_income=("rent_to_income", "mean"),
+        )
+    )
+
+
+def story_composite_agg(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Story input: simple average across metros per month.
+
+    Columns: date, composite_price, composite_income, composite_pti,
+    price_index, income_index (first year = 100), year.
+    """
+    grouped = (
+        df.groupby("date", as_index=False, observed=True)[
+            ["median_sale_price", "median_household_income_est", "price_to_income"]
+        ]
+        .mean()
+        .rename(
+            columns={
+                "median_sale_price": "composite_price",
+                "median_household_income_est": "composite_income",
+                "price_to_income": "composite_pti",
+            }
+        )
+    )
+
+    return add_composite_indices(grouped)
+
+
+def story_metro_pti_agg(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Story input: mean PTI per (metro, month), the series of the metro
+    divergence chart.
+
+    Columns: city_full (str), year, date, price_to_income.
+    """
+    return (
+        df.groupby(["city_full", "year", "date"], as_index=False, observed=True)["price_to_income"]
+        .mean()
+        .dropna(subset=["price_to_income"])
+        .astype({"city_full": str})
+    )
+
+
+def story_band_counts(summary: pd.DataFrame) -> pd.DataFrame:
+    """Story input: number of metros in each affordability_rating per year."""
+    counts = (
+        summary.groupby(["year", "affordability_rating"], observed=True)
+        .size()
+        .reset_index(name="n_metros")
+    )
+    counts["affordability_rating"] = pd.Categorical(
+        counts["affordability_rating"],
+        categories=AFFORDABILITY_ORDER,
+        ordered=True,
+    )
+    return counts.sort_values(["year", "affordability_rating"])
+
+
+def add_composite_indices(grouped: pd.DataFrame) -> pd.DataFrame:
+    """(Re)compute price_index / income_index relative to the first year, and year."""
+    grouped = grouped.sort_values("date").reset_index(drop=True)
+    # normalize to first year's values
+    first_year = grouped["date"].dt.year.min()
+    base = grouped[grouped["date"].dt.year == first_year].iloc[0]
+    grouped["price_index"] = grouped["composite_price"] / base["composite_price"] * 100.0
+    grouped["income_index"] = grouped["composite_income"] / base["composite_income"] * 100.0
+    grouped["year"] = grouped["date"].dt.year
+    return grouped
+
+
+# ============================================================
+# Build & load
+# ============================================================
+
+def read_source_rows(source_path: Optional[PathLike] = None) -> pd.DataFrame:
+    """
+    Read the SOURCE_COLUMNS of the raw HouseTS rows for an offline build.
+
+    source_path is a CSV or Parquet file; None reads through read_house_ts
+    (IPC store, snapshot or raw CSV).
+    """
+    if source_path is None:
+        return read_house_ts(columns=SOURCE_COLUMNS)
+    source_path = Path(source_path)
+    if source_path.suffix == ".parquet":
+        df = pd.read_parquet(source_path, columns=SOURCE_COLUMNS)
+    else:
+        df = pd.read_csv(source_path, usecols=SOURCE_COLUMNS)
+    return apply_schema(df, required=SOURCE_COLUMNS, name=str(source_path))
+
+
+def build_aggregates(
+    source_path: Optional[PathLike] = None,
+    out_dir: PathLike = AGGREGATES_DIR,
+    with_coordinates: bool = True,
+) -> Dict[str, Path]:
+    """
+    Build every page's aggregate table from one read of HouseTS.
+
+    Args:
+        source_path: CSV or Parquet file with the raw HouseTS rows (None
+            reads through read_house_ts: IPC store, snapshot or raw CSV)
+        out_dir: Output directory for the Parquet tables and manifest
+        with_coordinates: Look up ZIP lat/lon for the Design 1 table
+
+    Returns:
+        Mapping of table name to written file
+    """
+    out_dir = Path(out_dir)
+    df = read_source_rows(source_path)
+
+    story_rows = add_story_ratios(df)
+    tables = {
+        "house_ts_agg": zip_year_agg(df, with_coordinates=with_coordinates),
+        "ratio_agg": metro_ratio_agg(df),
+        "ratio_monthly_agg": metro_ratio_agg(df, monthly=True),
+        "city_year": city_year_agg(df),
+        "story_summary": story_summary_agg(story_rows),
+        "story_composite": story_composite_agg(story_rows),
+    }
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = {}
+    for name, table in tables.items():
+        path = out_dir / f"{name}.parquet"
+        tmp_path = path.with_suffix(".parquet.tmp")
+        table.to_parquet(tmp_path, index=False)
+        tmp_path.replace(path)
+        written[name] = path
+
+    manifest = {
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": str(source_path) if source_path is not None else "HouseTS",
+        "source_rows": int(len(df)),
+        "tables": {
+            name: {"file": path.name, "rows": int(len(tables[name]))}
+            for name, path in written.items()
+        },
+    }
+    (out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    return written
+
+
+def aggregate_exists(name: str, out_dir: Optional[PathLike] = None) -> bool:
+    """Return True if the named aggregate table has been built."""
+    return (Path(out_dir or AGGREGATES_DIR) / f"{name}.parquet").exists()
+
+
+def read_aggregate(name: str, out_dir: Optional[PathLike] = None) -> pd.DataFrame:
+    """Load a prebuilt aggregate table with the declared schema applied."""
+    path = Path(out_dir or AGGREGATES_DIR) / f"{name}.parquet"
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Aggregate table not found: {path}. "
+            "Run `python -m utils.build_data aggregates` first."
+        )
+    return apply_schema(pd.read_parquet(path), name=name)
@@ -0,0 +1,275 @@
+"""
+Command-line entry point for the offline data build steps.
+
+Run from the project root:
+    python -m utils.build_data snapshot [--csv PATH] [--out PATH]
+    python -m utils.build_data partitions [--source PATH] [--out DIR] [--metro-col COL]
+    python -m utils.build_data ipc [--source PATH] [--out PATH]
+    python -m utils.build_data aggregates [--source PATH] [--out DIR] [--no-coords]
+    python -m utils.build_data story [--source PATH] [--out PATH]
+    python -m utils.build_data geometry [--zcta PATH] [--source PATH] [--out DIR]
+    python -m utils.build_data cbsa [--cbsa PATH] [--source PATH] [--out PATH]
+    python -m utils.build_data centroids [--zcta PATH] [--cbsa PATH] [--out PATH]
+    python -m utils.build_data ingest DELTA [--no-compact] [--no-coords]
+    python -m utils.build_data compact
+    python -m utils.build_data reduced [--csv PATH] [--out PATH] [--chunksize N] [--annual]
+    python -m utils.build_data download URL [--out PATH] [--sha256 HEX]
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from .aggregates import AGGREGATES_DIR, build_aggregates
+from .download_cache import fetch
+from .story_bundle import STORY_BUNDLE_PATH, build_story_bundle
+from .geometry import (
+    CENTROIDS_PATH,
+    CITY_CBSA_PATH,
+    ZCTA_LEVELS_DIR,
+    build_centroids,
+    build_city_cbsa,
+    build_zcta_levels,
+)
+from .reduced import CHUNK_SIZE, REDUCED_CSV_PATH, build_reduced
+from .ingest import compact, ingest_delta, start_background_compaction
+from .house_store import (
+    IPC_PATH,
+    PARTITIONED_DIR,
+    RAW_CSV_PATH,
+    ROW_GROUP_SIZE,
+    SNAPSHOT_PATH,
+    build_ipc,
+    build_partitions,
+    build_snapshot,
+)
+
+
+def _cmd_snapshot(args: argparse.Namespace) -> int:
+    """Build the typed Parquet snapshot of HouseTS."""
+    out = build_snapshot(args.csv, args.out, row_group_size=args.row_group_size)
+    size_mb = out.stat().st_size / 1e6
+    print(f"Wrote {out} ({size_mb:.1f} MB)")
+    return 0
+
+
+def _cmd_partitions(args: argparse.Namespace) -> int:
+    """Write the hive-partitioned (metro/year) dataset."""
+    out = build_partitions(args.source, args.out, metro_col=args.metro_col)
+    n_files = sum(1 for _ in out.rglob("*.parquet"))
+    print(f"Wrote {out} ({n_files} partition files)")
+    return 0
+
+
+def _cmd_ipc(args: argparse.Namespace) -> int:
+    """Write the memory-mappable Arrow IPC store."""
+    out = build_ipc(args.source, args.out)
+    size_mb = out.stat().st_size / 1e6
+    print(f"Wrote {out} ({size_mb:.1f} MB, uncompressed)")
+    return 0
+
+
+def _cmd_aggregates(args: argparse.Namespace) -> int:
+    """Build every page's pre-aggregated input tables."""
+    written = build_aggregates(args.source, args.out, with_coordinates=not args.no_coords)
+    for name, path in written.items():
+        print(f"Wrote {path} ({name})")
+    return 0
+
+
+def _cmd_story(args: argparse.Namespace) -> int:
+    """Build the Story page bundle."""
+    out = build_story_bundle(args.source, args.out)
+    size_kb = out.stat().st_size / 1e3
+    print(f"Wrote {out} ({size_kb:.0f} kB)")
+    return 0
+
+
+def _cmd_geometry(args: argparse.Namespace) -> int:
+    """Write the ZIP geometry pack of every metro."""
+    written = build_zcta_levels(args.zcta, args.source, args.out)
+    print(f"Wrote {len(written)} metro packs to {args.out}")
+    return 0
+
+
+def _cmd_cbsa(args: argparse.Namespace) -> int:
+    """Resolve every metro to its CBSA and report the unmatched ones."""
+    table = build_city_cbsa(args.cbsa, args.source, args.out)
+    unmatched = table[table["method"] == "unmatched"]
+    print(f"Wrote {args.out} ({len(table) - len(unmatched)} of {len(table)} metros matched)")
+    for rec in unmatched.to_dict("records"):
+        print(f"  unmatched: {rec['city']} ({rec['city_full']})")
+    return 0
+
+
+def _cmd_centroids(args: argparse.Namespace) -> int:
+    """Write the centroid / label point table of every CBSA and ZCTA."""
+    table = build_centroids(args.zcta, args.cbsa, args.out)
+    print(f"Wrote {args.out} ({len(table)} points)")
+    return 0
+
+
+def _cmd_ingest(args: argparse.Namespace) -> int:
+    """Upsert a delta file of new months and refresh the affected tables."""
+    summary = ingest_delta(
+        args.delta, args.partitions, args.aggregates, with_coordinates=not args.no_coords
+    )
+    print(
+        f"Ingested {summary['rows']} rows into {len(summary['partitions'])} partitions "
+        f"(years {summary['years']}); updated tables: {summary['tables']}"
+    )
+    if not args.no_compact:
+        proc = start_background_compaction()
+        print(f"Started background compaction (pid {proc.pid})")
+    return 0
+
+
+def _cmd_compact(args: argparse.Namespace) -> int:
+    """Rewrite the national snapshot / IPC store from the partitions."""
+    written = compact(args.partitions)
+    if not written:
+        print("Nothing to compact (no snapshot or IPC store built)")
+    for path in written:
+        print(f"Wrote {path}")
+    return 0
+
+
+def _cmd_reduced(args: argparse.Namespace) -> int:
+    """Stream HouseTS into design2/House_reduced.csv in bounded memory."""
+    counts = build_reduced(args.csv, args.out, chunksize=args.chunksize, annual=args.annual)
+    print(f"Wrote {args.out} ({counts['rows_written']} rows from {counts['rows_read']})")
+    return 0
+
+
+def _cmd_download(args: argparse.Namespace) -> int:
+    """Download a file once into the shared cache (resumable, verified)."""
+    path = fetch(args.url, dest=args.out, sha256=args.sha256)
+    print(f"Cached {args.url} at {path}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Create the argument parser with one sub-command per build step."""
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.build_data",
+        description="Offline build steps for the House & Browse datasets.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_snap = sub.add_parser("snapshot", help="Convert HouseTS.csv into a typed Parquet snapshot")
+    p_snap.add_argument("--csv", type=Path, default=RAW_CSV_PATH, help="Raw HouseTS CSV")
+    p_snap.add_argument("--out", type=Path, default=SNAPSHOT_PATH, help="Output Parquet file")
+    p_snap.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE, help="Rows per row group")
+    p_snap.set_defaults(func=_cmd_snapshot)
+
+    p_part = sub.add_parser("partitions", help="Write a metro=XXX/year=YYYY partitioned dataset")
+    p_part.add_argument(
+        "--source", type=Path, default=None,
+        help="CSV/Parquet table to partition (default: HouseTS snapshot or raw CSV)",
+    )
+    p_part.add_argument("--out", type=Path, default=PARTITIONED_DIR, help="Output dataset directory")
+    p_part.add_argument("--metro-col", default="city", help="Column holding the metro key")
+    p_part.set_defaults(func=_cmd_partitions)
+
+    p_ipc = sub.add_parser("ipc", help="Write an uncompressed Arrow IPC file for memory-mapped reads")
+    p_ipc.add_argument(
+        "--source", type=Path, default=None,
+        help="CSV/Parquet table to convert (default: HouseTS snapshot or raw CSV)",
+    )
+    p_ipc.add_argument("--out", type=Path, default=IPC_PATH, help="Output .arrow file")
+    p_ipc.set_defaults(func=_cmd_ipc)
+
+    p_agg = sub.add_parser("aggregates", help="Pre-aggregate monthly rows into every page's input tables")
+    p_agg.add_argument(
+        "--source", type=Path, default=None,
+        help="CSV/Parquet with raw HouseTS rows (default: IPC store, snapshot or raw CSV)",
+    )
+    p_agg.add_argument("--out", type=Path, default=AGGREGATES_DIR, help="Output directory")
+    p_agg.add_argument("--no-coords", action="store_true", help="Skip the pgeocode ZIP lat/lon lookup")
+    p_agg.set_defaults(func=_cmd_aggregates)
+
+    p_story = sub.add_parser("story", help="Write every Story chart input into one bundle file")
+    p_story.add_argument(
+        "--source", type=Path, default=None,
+        help="CSV/Parquet with raw HouseTS rows (default: IPC store, snapshot or raw CSV)",
+    )
+    p_story.add_argument("--out", type=Path, default=STORY_BUNDLE_PATH, help="Output bundle (.zip)")
+    p_story.set_defaults(func=_cmd_story)
+
+    p_geo = sub.add_parser("geometry", help="Write one simplified, multi-resolution ZIP geometry pack per metro")
+    p_geo.add_argument(
+        "--zcta", type=Path, default=None,
+        help="National ZCTA boundaries or a directory of <METRO>.geojson files (default: design1/data ZCTA shapefile, else design3 city_geojson)",
+    )
+    p_geo.add_argument(
+        "--source", type=Path, default=None,
+        help="CSV/Parquet with raw HouseTS rows for the metro ZIP codes (default: IPC store, snapshot or raw CSV)",
+    )
+    p_geo.add_argument("--out", type=Path, default=ZCTA_LEVELS_DIR, help="Output directory")
+    p_geo.set_defaults(func=_cmd_geometry)
+
+    p_cbsa = sub.add_parser("cbsa", help="Resolve every metro to its CBSA (GEOID + match method)")
+    p_cbsa.add_argument(
+        "--cbsa", type=Path, default=None,
+        help="National CBSA boundaries (default: design1/data CBSA shapefile)",
+    )
+    p_cbsa.add_argument(
+        "--source", type=Path, default=None,
+        help="CSV/Parquet with raw HouseTS rows (default: IPC store, snapshot or raw CSV)",
+    )
+    p_cbsa.add_argument("--out", type=Path, default=CITY_CBSA_PATH, help="Output CSV")
+    p_cbsa.set_defaults(func=_cmd_cbsa)
+
+    p_cen = sub.add_parser("centroids", help="Persist the centroid and label point of every CBSA and ZCTA")
+    p_cen.add_argument(
+        "--zcta", type=Path, default=None,
+        help="ZCTA boundaries or a directory of <METRO>.geojson files (default: as for geometry)",
+    )
+    p_cen.add_argument(
+        "--cbsa", type=Path, default=None,
+        help="CBSA boundaries (default: design1/data CBSA shapefile)",
+    )
+    p_cen.add_argument("--out", type=Path, default=CENTROIDS_PATH, help="Output Parquet file")
+    p_cen.set_defaults(func=_cmd_centroids)
+
+    p_ing = sub.add_parser("ingest", help="Add new (zipcode, date) rows without a full rebuild")
+    p_ing.add_argument("delta", type=Path, help="CSV/Parquet file of new HouseTS rows")
+    p_ing.add_argument("--partitions", type=Path, default=PARTITIONED_DIR, help="Partitioned dataset")
+    p_ing.add_argument("--aggregates", type=Path, default=AGGREGATES_DIR, help="Aggregate tables directory")
+    p_ing.add_argument("--no-coords", action="store_true", help="Skip the pgeocode lookup for new ZIPs")
+    p_ing.add_argument("--no-compact", action="store_true", help="Do not start the background compaction")
+    p_ing.set_defaults(func=_cmd_ingest)
+
+    p_cmp = sub.add_parser("compact", help="Rewrite the snapshot / IPC store from the partitions")
+    p_cmp.add_argument("--partitions", type=Path, default=PARTITIONED_DIR, help="Partitioned dataset")
+    p_cmp.set_defaults(func=_cmd_compact)
+
+    p_red = sub.add_parser("reduced", help="Stream HouseTS.csv into design2/House_reduced.csv")
+    p_red.add_argument("--csv", type=Path, default=RAW_CSV_PATH, help="Raw HouseTS CSV")
+    p_red.add_argument("--out", type=Path, default=REDUCED_CSV_PATH, help="Output CSV")
+    p_red.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="Rows parsed per chunk")
+    p_red.add_argument(
+        "--annual", action="store_true",
+        help="Aggregate months to one row per metro/ZIP/year instead of copying every month",
+    )
+    p_red.set_defaults(func=_cmd_reduced)
+
+    p_dl = sub.add_parser("download", help="Download a remote file once into data/downloads")
+    p_dl.add_argument("url", help="File to download")
+    p_dl.add_argument("--out", type=Path, default=None, help="Cache location (default: data/downloads/<name>)")
+    p_dl.add_argument("--sha256", default=None, help="Expected SHA-256 hex digest")
+    p_dl.set_defaults(func=_cmd_download)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    # Surface the loaders' progress messages (rows read, memory saved)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Process-wide shared HouseTS data store.
+
+Design 2, Design 3 and the Story page all work from the same HouseTS rows.
+Instead of each page parsing and caching its own DataFrame, the store loads
+one canonical typed table per server process (st.cache_resource) and hands
+out read-only projections of it. When the Arrow IPC store has been built
+the table is memory-mapped, so several `streamlit run` processes on one host
+share the same physical pages instead of each holding a parsed copy.
+"""
+from typing import Iterable, Optional, Sequence
+
+import pandas as pd
+import streamlit as st
+
+from .data_version import current_data_version
+from .house_store import RAW_CSV_PATH, ipc_exists, read_house_ts, snapshot_exists
+
+# Union of the HouseTS columns used by any page
+STORE_COLUMNS = [
+    "date",
+    "year",
+    "city",
+    "city_full",
+    "zipcode",
+    "median_sale_price",
+    "Per Capita Income",
+    "Median Rent",
+]
+
+
+def _is_lfs_pointer(path) -> bool:
+    """Return True if the file is a Git LFS pointer instead of real data."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.readline().startswith("version https://git-lfs.github.com/spec/v1")
+
+
+def store_available() -> bool:
+    """Return True if the shared store has a usable source (IPC, snapshot or raw CSV)."""
+    if ipc_exists() or snapshot_exists():
+        return True
+    return RAW_CSV_PATH.exists() and not _is_lfs_pointer(RAW_CSV_PATH)
+
+
+@st.cache_resource(show_spinner="📊 Loading housing data...", max_entries=1)
+def get_house_table(data_version: str) -> pd.DataFrame:
+    """
+    Load the canonical HouseTS table once per process and data version.
+
+    The returned DataFrame is shared by every session and page; treat it as
+    read-only and use get_house_view() to obtain projections. A new
+    data_version replaces the cached table (max_entries=1).
+    """
+    return read_house_ts(columns=STORE_COLUMNS)
+
+
+def get_house_view(
+    columns: Optional[Sequence[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    cities: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    Return a read-only projection of the shared HouseTS table.
+
+    Args:
+        columns: Columns to include (None keeps all store columns)
+        years: Only keep rows for these years
+        cities: Only keep rows for these city codes (e.g. 'ATL')
+
+    Returns:
+        Projection of the shared table. Without filters it is the shared
+        table itself, and on pandas < 3 (no Copy-on-Write) a projection may
+        share memory with it; callers that modify the result must .copy()
+        it first.
+    """
+    df = get_house_table(current_data_version())
+
+    mask = None
+    if years is not None:
+        mask = df["year"].isin([int(y) for y in years])
+    if cities is not None:
+        city_mask = df["city"].isin([str(c) for c in cities])
+        mask = city_mask if mask is None else mask & city_mask
+    if mask is not None:
+        df = df[mask]
+
+    if columns is not None:
+        df = df[list(columns)]
+    return df
@@ -0,0 +1,100 @@
+"""
+Data-version fingerprint for cache invalidation.
+
+Cached loaders used to expire on fixed TTLs, re-parsing unchanged data every
+hour and picking up new files up to an hour late. Instead they now take a
+`data_version` argument computed from the size and modification time of
+every data source; a cache entry lives exactly until one of the sources is
+rebuilt, replaced or ingested into.
+"""
+import hashlib
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+from .house_store import DATA_DIR, RAW_CSV_PATH
+from .path_utils import get_project_root
+
+PathLike = Union[str, Path]
+
+# Every file or directory the pages load data from. Directories are
+# fingerprinted recursively (snapshot, IPC store, partitions, aggregates).
+DATA_SOURCES: Tuple[Path, ...] = (
+    DATA_DIR,
+    RAW_CSV_PATH,
+    get_project_root() / "design2" / "House_reduced.csv",
+    get_project_root() / "design3" / "Amber_design3" / "House_reduced.csv",
+    get_project_root() / "design1" / "data",
+    get_project_root() / "story" / "data",
+)
+
+# Files under the sources that are not data: work files and directories of
+# a build in progress, the compaction log and the download cache's lock / checksum
+# sidecars. Changes to them must not invalidate the caches.
+IGNORED_SUFFIXES = (".tmp", ".log", ".lock", ".sha256")
+
+# Reruns within this many seconds reuse the last fingerprint instead of
+# stat-ing every file again
+_RECHECK_SECONDS = 2.0
+_last_check: Optional[Tuple[float, str]] = None
+
+
+def _stat_token(path: Path) -> str:
+    """size:mtime_ns of one file."""
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def fingerprint(path: PathLike) -> str:
+    """
+    Return a token that changes whenever the file (or any file below the
+    directory) changes. Missing paths have a fixed token.
+    """
+    path = Path(path)
+    if not path.exists():
+        return f"{path}=missing"
+    if path.is_file():
+        try:
+            return f"{path}={_stat_token(path)}"
+        except FileNotFoundError:
+            return f"{path}=missing"
+    entries = []
+    for f in sorted(path.rglob("*")):
+        rel = f.relative_to(path)
+        # Also skips everything inside a work directory such as
+        # house_ts_partitioned.tmp/ while a build is writing it
+        if any(part.endswith(IGNORED_SUFFIXES) for part in rel.parts):
+            continue
+        # Builds replace and delete files while pages are running
+        try:
+            if f.is_file():
+                entries.append(f"{rel}={_stat_token(f)}")
+        except FileNotFoundError:
+            continue
+    return f"{path}=[{','.join(entries)}]"
+
+
+def data_version(paths: Optional[Iterable[PathLike]] = None) -> str:
+    """
+    Return a short hash of the fingerprints of the given sources.
+
+    Args:
+        paths: Files/directories to include (None uses DATA_SOURCES)
+    """
+    paths = DATA_SOURCES if paths is None else paths
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(fingerprint(path).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def current_data_version() -> str:
+    """data_version() of DATA_SOURCES, re-checked at most every couple of seconds."""
+    global _last_check
+    now = time.monotonic()
+    if _last_check is not None and now - _last_check[0] < _RECHECK_SECONDS:
+        return _last_check[1]
+    version = data_version()
+    _last_check = (now, version)
+    return version
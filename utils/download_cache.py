@@ -0,0 +1,197 @@
+"""
+Download-once cache for remote data files.
+
+`pd.read_csv(URL)` re-downloads the whole file on every cache miss in every
+process. fetch() instead streams the file once into a shared on-disk cache:
+
+  - chunked streaming into a `.tmp` file (bounded memory),
+  - resume of an interrupted download with an HTTP Range request,
+  - SHA-256 verification (when a checksum is known) before the file is
+    atomically renamed into place,
+  - an exclusive file lock so concurrent processes download it only once.
+
+Only the standard library is used, so it can be exercised against a local
+HTTP server (e.g. `python -m http.server`) standing in for the real host.
+"""
+import hashlib
+import logging
+import os
+import re
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from .house_store import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, downloads are still atomic
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_DIR = DATA_DIR / "downloads"
+CHUNK_SIZE = 1 << 20  # 1 MiB
+TIMEOUT_SECONDS = 60
+
+PathLike = Union[str, Path]
+
+
+@contextmanager
+def _file_lock(lock_path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on lock_path for the duration of the block."""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _sha256_file(path: Path, chunk_size: int = CHUNK_SIZE) -> "hashlib._Hash":
+    """Return a running SHA-256 object fed with the file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest
+
+
+def _checksum_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".sha256")
+
+
+def _is_cached(dest: Path, sha256: Optional[str]) -> bool:
+    """True if dest exists and matches the expected checksum (if any)."""
+    if not dest.exists():
+        return False
+    if sha256 is None:
+        return True
+    sidecar = _checksum_path(dest)
+    # The sidecar is written after verification, so a full re-hash is only
+    # needed for files that were placed in the cache by hand
+    if sidecar.exists() and sidecar.read_text().strip() == sha256.lower():
+        return True
+    return _sha256_file(dest).hexdigest() == sha256.lower()
+
+
+def _content_range(value: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Parse a Content-Range header ("bytes 10-99/100" or "bytes */100") into (start, total)."""
+    match = re.match(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)", value or "")
+    if match is None:
+        return None, None
+    start, total = match.groups()
+    return (
+        int(start) if start is not None else None,
+        int(total) if total != "*" else None,
+    )
+
+
+def _download(url: str, part: Path, chunk_size: int, timeout: float) -> "hashlib._Hash":
+    """Stream url into part, resuming from its current size if possible."""
+    offset = part.stat().st_size if part.exists() else 0
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if not (offset and e.code == 416):
+            raise
+        # Nothing left after offset: the process died after a complete
+        # download but before the rename, unless the remote file changed
+        _, total = _content_range(e.headers.get("Content-Range"))
+        e.close()
+        if total == offset:
+            logger.info(f"Download of {url} was already complete")
+            return _sha256_file(part, chunk_size)
+        logger.info(f"Cannot resume download of {url}; starting over")
+        part.unlink()
+        return _download(url, part, chunk_size, timeout)
+
+    with response:
+        if offset and response.status == 206:
+            start, _ = _content_range(response.headers.get("Content-Range"))
+            if start != offset:
+                restart = True
+            else:
+                logger.info(f"Resuming download of {url} at byte {offset}")
+                restart = False
+                digest = _sha256_file(part, chunk_size)
+                mode = "ab"
+        else:
+            # Server ignored the Range header (or nothing to resume): start over
+            restart = False
+            digest = hashlib.sha256()
+            mode = "wb"
+
+        if not restart:
+            expected = response.headers.get("Content-Length")
+            written = 0
+            with open(part, mode) as f:
+                for block in iter(lambda: response.read(chunk_size), b""):
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
+
+    if restart:
+        # The partial response does not continue the bytes we have
+        logger.info(f"Server resumed {url} at the wrong offset; starting over")
+        part.unlink()
+        return _download(url, part, chunk_size, timeout)
+    if expected is not None and written != int(expected):
+        raise IOError(f"Incomplete download of {url}: got {written} of {expected} bytes")
+    return digest
+
+
+def fetch(
+    url: str,
+    dest: Optional[PathLike] = None,
+    sha256: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    timeout: float = TIMEOUT_SECONDS,
+) -> Path:
+    """
+    Return a local copy of url, downloading it at most once.
+
+    Args:
+        url: File to download
+        dest: Cache location (defaults to DOWNLOAD_DIR / <file name>)
+        sha256: Expected hex digest; the download is rejected on mismatch
+        chunk_size: Bytes read per chunk
+        timeout: Socket timeout in seconds
+
+    Returns:
+        Path of the verified local file
+
+    Raises:
+        ValueError: If the downloaded file does not match sha256
+    """
+    if dest is None:
+        dest = DOWNLOAD_DIR / (Path(urlparse(url).path).name or "download")
+    dest = Path(dest)
+    if _is_cached(dest, sha256):
+        return dest
+
+    with _file_lock(dest.with_name(dest.name + ".lock")):
+        # Another process may have finished the download while we waited
+        if _is_cached(dest, sha256):
+            return dest
+
+        part = dest.with_name(dest.name + ".tmp")
+        digest = _download(url, part, chunk_size, timeout).hexdigest()
+        if sha256 is not None and digest != sha256.lower():
+            part.unlink()
+            raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+
+        _checksum_path(dest).write_text(digest)
+        os.replace(part, dest)
+        logger.info(f"Downloaded {url} to {dest}")
+    return dest
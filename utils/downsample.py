@@ -0,0 +1,105 @@
+"""
+Shape-preserving downsampling of line-chart series.
+
+Monthly series for 30 metros are too many points to ship to the browser
+for a chart a few hundred pixels wide. lttb_indices() implements
+Largest-Triangle-Three-Buckets (Steinarsson, 2013): it keeps the first and
+last points and, from each of the n_out - 2 equal-width buckets in between,
+the point forming the largest triangle with the previously kept point and
+the average of the next bucket. Peaks and troughs survive, flat stretches
+are thinned out, and every kept point is an original row (so hover data
+stays exact).
+"""
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Horizontal pixels per kept point; closer markers are indistinguishable
+PIXELS_PER_POINT = 6
+# A line drawn without markers still shows detail down to one pixel column
+LINE_PIXELS_PER_POINT = 1
+
+
+def points_for_width(width_px: int, pixels_per_point: int = PIXELS_PER_POINT) -> int:
+    """Number of points per series worth drawing on a plot width_px wide."""
+    return max(3, int(width_px) // pixels_per_point)
+
+
+def _as_float(values: Union[pd.Series, np.ndarray, Sequence]) -> np.ndarray:
+    """Values as float64; datetimes become their integer timestamps."""
+    arr = np.asarray(values)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        arr = arr.astype("datetime64[ns]").astype("int64")
+    return arr.astype("float64")
+
+
+def lttb_indices(x: Sequence, y: Sequence, n_out: int) -> np.ndarray:
+    """
+    Positions of the points kept by LTTB.
+
+    Args:
+        x: Ascending x values (numbers or datetimes)
+        y: y values without NaN
+        n_out: Number of points to keep
+
+    Returns:
+        Ascending positional indices into x / y (all of them if the series
+        already has n_out points or fewer)
+    """
+    x = _as_float(x)
+    y = _as_float(y)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets spanning positions 1 .. n - 2; the end points are kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i == n_out - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        # Twice the triangle area (a, candidate, next-bucket average)
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def downsample_groups(df: pd.DataFrame, by: str, x: str, y: str, n_out: int) -> pd.DataFrame:
+    """
+    Apply LTTB to every series of a long-format table.
+
+    Args:
+        df: One row per (by, x) point
+        by: Column identifying the series (e.g. metro)
+        x: Column with the x values
+        y: Column with the y values; rows where it is missing are dropped
+        n_out: Points kept per series
+
+    Returns:
+        The kept rows, sorted by (by, x); series of n_out points or fewer are
+        kept whole
+    """
+    df = df.dropna(subset=[y]).sort_values([by, x], kind="stable")
+    groups = df.groupby(by, sort=False, observed=True).indices
+    if all(len(rows) <= n_out for rows in groups.values()):
+        return df
+    x_values = df[x].to_numpy()
+    y_values = df[y].to_numpy()
+    positions = [
+        rows if len(rows) <= n_out else rows[lttb_indices(x_values[rows], y_values[rows], n_out)]
+        for rows in groups.values()
+    ]
+    return df.iloc[np.sort(np.concatenate(positions))]
@@ -0,0 +1,768 @@
+"""
+Per-metro ZIP (ZCTA) geometry packs for the map pages.
+
+The ZIP maps used to start from a national or per-metro boundary file at
+full resolution (Design 1 merged the 500k ZCTA shapefile, Design 3 parsed
+city_geojson/<METRO>.geojson) and ship every vertex to the browser,
+although at the zoom the map opens with most of them fall within a single
+pixel. build_zcta_levels() prepares everything offline: for every metro it
+writes one compact GeoParquet pack (EPSG:4326) keyed by ZCTA code, with the
+polygon centroid and several detail levels of the geometry:
+
+    data/geometry/
+        manifest.json        per metro: ZCTAs, vertices and GeoJSON kB per level
+        zcta/<METRO>.parquet zip_code_str, detail, center_lat, center_lon, geometry
+
+Each level is simplified for one map zoom (DETAIL_ZOOMS): the tolerance is
+the ground size of one pixel at that zoom. The polygons of a metro are
+simplified together as a coverage (shapely.coverage_simplify), so
+neighbouring ZIPs keep exactly the same shared edges and no slivers or gaps
+open between them. Coordinates are then rounded to about a meter.
+detail_for_zoom() picks the coarsest level that is still accurate to a
+pixel at the zoom a map is drawn at.
+
+Build it with:
+    python -m utils.build_data geometry
+"""
+import json
+import logging
+import math
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from .house_store import DATA_DIR, read_house_ts
+from .path_utils import get_project_root
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY_DIR = DATA_DIR / "geometry"
+ZCTA_LEVELS_DIR = GEOMETRY_DIR / "zcta"
+MANIFEST_NAME = "manifest.json"
+
+# National 2018 500k ZCTA boundaries shipped with Design 1 (.shp or zipped)
+_DESIGN1_DATA_DIR = get_project_root() / "design1" / "data"
+ZCTA_SOURCE_PATHS = [
+    _DESIGN1_DATA_DIR / "cb_2018_us_zcta510_500k.shp",
+    _DESIGN1_DATA_DIR / "zcta_shapes.zip",
+]
+# Design 3's per-metro ZCTA GeoJSON files (<METRO>.geojson), used when the
+# national shapefile is not available
+CITY_GEOJSON_DIR = get_project_root() / "design3" / "Amber_design3" / "city_geojson"
+ZCTA_KEY_COLUMNS = ["ZCTA5CE10", "GEOID10", "ZCTA5CE20", "GEOID20"]
+
+# Detail level -> map zoom it is simplified for (coarsest first)
+DETAIL_ZOOMS = {"low": 7, "medium": 9, "high": 11}
+FULL_DETAIL = "full"
+DETAIL_LEVELS = list(DETAIL_ZOOMS) + [FULL_DETAIL]
+
+# Columns of a metro's pack file
+PACK_COLUMNS = ["zip_code_str", "detail", "center_lat", "center_lon", "geometry"]
+
+WGS84 = "EPSG:4326"
+# Equal-area CONUS projection (meters) the simplification runs in
+PROJECTED_CRS = "EPSG:5070"
+
+# Ground size of a 256 px tile pixel at zoom 0, at the metros' typical latitude
+_METERS_PER_PIXEL_Z0 = 156543.03 * math.cos(math.radians(38))
+
+# shapely.coverage_simplify needs shapely >= 2.1 built against GEOS >= 3.12
+HAS_COVERAGE_SIMPLIFY = hasattr(shapely, "coverage_simplify") and shapely.geos_version >= (3, 12, 0)
+
+# Simplified levels keep 5 decimals of a degree (about 1 m)
+COORDINATE_DECIMALS = 5
+
+PathLike = Union[str, Path]
+
+
+def tolerance_for_zoom(zoom: float) -> float:
+    """Simplification tolerance (meters) for a map drawn at zoom: one pixel."""
+    return _METERS_PER_PIXEL_Z0 / 2 ** zoom
+
+
+def detail_for_zoom(zoom: float) -> str:
+    """
+    Coarsest detail level that is accurate to a pixel at zoom.
+
+    A level simplified for zoom z is also good enough for any zoom below z;
+    above the finest level the unsimplified polygons are used.
+    """
+    for level, level_zoom in DETAIL_ZOOMS.items():
+        if zoom <= level_zoom:
+            return level
+    return FULL_DETAIL
+
+
+def _simplify_coverage(geoms: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplify adjacent polygons so that shared edges stay shared.
+
+    Without coverage_simplify (see HAS_COVERAGE_SIMPLIFY) every polygon is
+    simplified on its own, which keeps each one valid but can open thin gaps
+    between neighbours.
+    """
+    if HAS_COVERAGE_SIMPLIFY:
+        return shapely.coverage_simplify(geoms, tolerance)
+    return shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+
+def coverage_levels(gdf: gpd.GeoDataFrame, key: str) -> gpd.GeoDataFrame:
+    """
+    Simplify a set of adjacent polygons to every detail level.
+
+    Args:
+        gdf: Polygons forming a coverage (no overlaps), any CRS
+        key: Column identifying each polygon
+
+    Returns:
+        GeoDataFrame in EPSG:4326 with columns key, detail, geometry; one row
+        per polygon and level (DETAIL_LEVELS order)
+    """
+    projected = gdf[[key, "geometry"]].to_crs(PROJECTED_CRS).reset_index(drop=True)
+    geoms = projected.geometry.values
+
+    frames = []
+    for level in DETAIL_LEVELS:
+        if level == FULL_DETAIL:
+            simplified = gpd.GeoSeries(geoms, crs=PROJECTED_CRS).to_crs(WGS84).values
+        else:
+            zoom = DETAIL_ZOOMS[level]
+            simplified = _simplify_coverage(geoms, tolerance_for_zoom(zoom))
+            simplified = gpd.GeoSeries(simplified, crs=PROJECTED_CRS).to_crs(WGS84).values
+            # Shared vertices round to the same point, so edges stay shared
+            simplified = shapely.transform(simplified, lambda xy: np.round(xy, COORDINATE_DECIMALS))
+        frames.append(gpd.GeoDataFrame(
+            {key: projected[key].to_numpy(), "detail": level},
+            geometry=gpd.GeoSeries(simplified, crs=WGS84),
+        ))
+    return pd.concat(frames, ignore_index=True)
+
+
+def default_zcta_source() -> Path:
+    """Design 1's national ZCTA shapefile, else Design 3's per-metro GeoJSON."""
+    found = [p for p in ZCTA_SOURCE_PATHS if p.exists()]
+    if found:
+        return found[0]
+    if CITY_GEOJSON_DIR.is_dir():
+        return CITY_GEOJSON_DIR
+    raise FileNotFoundError(
+        "ZCTA boundaries not found. Expected "
+        + ", ".join(f"'{p}'" for p in ZCTA_SOURCE_PATHS)
+        + f" or the directory '{CITY_GEOJSON_DIR}'."
+    )
+
+
+def _zip_code_column(gdf: gpd.GeoDataFrame, path: Path) -> pd.Series:
+    """Zero-padded ZCTA code of every row of a boundary file."""
+    key = next((col for col in ZCTA_KEY_COLUMNS if col in gdf.columns), None)
+    if key is None:
+        raise RuntimeError(f"{path}: no ZCTA code column (expected one of {ZCTA_KEY_COLUMNS}).")
+    return gdf[key].astype(str).str.zfill(5)
+
+
+def read_zcta_source(path: Optional[PathLike] = None) -> gpd.GeoDataFrame:
+    """
+    Read national ZCTA boundaries with a zero-padded zip_code_str column.
+
+    Args:
+        path: Any file geopandas reads (shapefile, zipped shapefile, GeoJSON,
+            GeoParquet); None uses Design 1's shapefile
+    """
+    path = Path(path or default_zcta_source())
+    if path.suffix == ".parquet":
+        gdf = gpd.read_parquet(path)
+    else:
+        gdf = gpd.read_file(f"zip://{path}" if path.suffix == ".zip" else path)
+    gdf["zip_code_str"] = _zip_code_column(gdf, path)
+    return gdf[["zip_code_str", "geometry"]]
+
+
+def read_metro_geojson_dir(path: PathLike = CITY_GEOJSON_DIR) -> gpd.GeoDataFrame:
+    """
+    Read a directory of per-metro ZCTA files (<METRO>.geojson).
+
+    Returns:
+        GeoDataFrame with columns city (the file name), zip_code_str, geometry
+    """
+    frames = []
+    for file in sorted(Path(path).glob("*.geojson")):
+        gdf = gpd.read_file(file)
+        frames.append(gpd.GeoDataFrame(
+            {"city": file.stem, "zip_code_str": _zip_code_column(gdf, file)},
+            geometry=gdf.geometry,
+        ))
+    if not frames:
+        raise FileNotFoundError(f"No <METRO>.geojson files in {path}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def metro_zip_codes(source_path: Optional[PathLike] = None) -> pd.DataFrame:
+    """
+    Distinct (city, zip_code_str) pairs of HouseTS.
+
+    Args:
+        source_path: CSV or Parquet file with the raw HouseTS rows (None
+            reads through read_house_ts)
+    """
+    if source_path is None:
+        df = read_house_ts(columns=["city", "zipcode"])
+    elif Path(source_path).suffix == ".parquet":
+        df = pd.read_parquet(source_path, columns=["city", "zipcode"])
+    else:
+        df = pd.read_csv(source_path, usecols=["city", "zipcode"], dtype={"zipcode": str})
+    return pd.DataFrame({
+        "city": df["city"].astype(str),
+        "zip_code_str": df["zipcode"].astype(str).str.zfill(5),
+    }).drop_duplicates(ignore_index=True)
+
+
+def polygon_centers(geometry: gpd.GeoSeries) -> pd.DataFrame:
+    """
+    Centroid of every polygon, computed in an equal-area projection.
+
+    Returns:
+        DataFrame with columns center_lat, center_lon (same index as geometry)
+    """
+    centroids = geometry.to_crs(PROJECTED_CRS).centroid.to_crs(WGS84)
+    return pd.DataFrame({"center_lat": centroids.y, "center_lon": centroids.x}, index=geometry.index)
+
+
+def polygon_points(geometry: gpd.GeoSeries) -> pd.DataFrame:
+    """
+    Centroid and representative point of every polygon.
+
+    The representative point is guaranteed to lie inside the polygon (the
+    centroid of a C-shaped area need not), so it suits labels and markers.
+
+    Returns:
+        DataFrame with columns center_lat, center_lon, label_lat, label_lon
+        (same index as geometry)
+    """
+    points = polygon_centers(geometry)
+    labels = geometry.to_crs(PROJECTED_CRS).representative_point().to_crs(WGS84)
+    points["label_lat"] = labels.y
+    points["label_lon"] = labels.x
+    return points
+
+
+def metro_zctas(
+    zcta_path: Optional[PathLike] = None,
+    source_path: Optional[PathLike] = None,
+) -> gpd.GeoDataFrame:
+    """
+    ZCTA polygons of every metro.
+
+    Args:
+        zcta_path: National ZCTA boundaries, or a directory of per-metro
+            <METRO>.geojson files (None: default_zcta_source())
+        source_path: CSV or Parquet file with the raw HouseTS rows; gives the
+            metro of every ZIP code unless zcta_path is a per-metro directory
+
+    Returns:
+        GeoDataFrame with columns city, zip_code_str, geometry
+    """
+    zcta_path = Path(zcta_path or default_zcta_source())
+    if zcta_path.is_dir():
+        return read_metro_geojson_dir(zcta_path)
+
+    zcta = read_zcta_source(zcta_path)
+    membership = metro_zip_codes(source_path)
+    shapes = zcta.merge(membership, on="zip_code_str", how="inner")
+    missing = membership.loc[~membership["zip_code_str"].isin(zcta["zip_code_str"])]
+    for metro, n in missing.groupby("city")["zip_code_str"].size().items():
+        logger.warning(f"{metro}: {n} ZIP codes have no ZCTA polygon")
+    return shapes[["city", "zip_code_str", "geometry"]]
+
+
+def zcta_levels_path(metro: str, out_dir: Optional[PathLike] = None) -> Path:
+    """Location of a metro's ZIP geometry pack."""
+    return Path(out_dir or ZCTA_LEVELS_DIR) / f"{metro}.parquet"
+
+
+def _level_stats(levels: gpd.GeoDataFrame) -> Dict[str, Dict[str, float]]:
+    """Vertices and serialized GeoJSON size per detail level."""
+    stats = {}
+    for level, part in levels.groupby("detail", sort=False):
+        stats[level] = {
+            "vertices": int(shapely.get_num_coordinates(part.geometry.values).sum()),
+            "geojson_kb": round(len(part.to_json()) / 1e3, 1),
+        }
+    return stats
+
+
+def build_zcta_levels(
+    zcta_path: Optional[PathLike] = None,
+    source_path: Optional[PathLike] = None,
+    out_dir: PathLike = ZCTA_LEVELS_DIR,
+) -> Dict[str, Path]:
+    """
+    Write the ZIP geometry pack of every HouseTS metro.
+
+    Args:
+        zcta_path: National ZCTA boundaries or a directory of per-metro
+            <METRO>.geojson files (None: Design 1's shapefile, else Design 3's
+            city_geojson directory)
+        source_path: CSV or Parquet file with the raw HouseTS rows, used
+            for the metro -> ZIP membership (None reads through read_house_ts)
+        out_dir: Output directory; the manifest goes into its parent
+
+    Returns:
+        Mapping of metro code to the written file
+    """
+    out_dir = Path(out_dir)
+    zcta_path = Path(zcta_path or default_zcta_source())
+    shapes_by_metro = metro_zctas(zcta_path, source_path)
+    if not HAS_COVERAGE_SIMPLIFY:
+        logger.warning(
+            f"shapely {shapely.__version__} (GEOS {'.'.join(map(str, shapely.geos_version))}) "
+            "has no coverage_simplify; simplifying ZIPs one by one, thin gaps may open "
+            "between neighbours. Install shapely >= 2.1 for seam-free levels."
+        )
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written, metros = {}, {}
+    for metro, shapes in shapes_by_metro.groupby("city", sort=True):
+        shapes = shapes.drop_duplicates("zip_code_str")
+        centers = polygon_centers(shapes.geometry)
+        centers["zip_code_str"] = shapes["zip_code_str"]
+        levels = coverage_levels(shapes, "zip_code_str").merge(centers, on="zip_code_str", how="left")
+        levels = levels[PACK_COLUMNS]
+
+        path = zcta_levels_path(metro, out_dir)
+        tmp_path = path.with_name(path.name + ".tmp")
+        levels.to_parquet(tmp_path, index=False)
+        tmp_path.replace(path)
+        written[metro] = path
+
+        stats = _level_stats(levels)
+        metros[metro] = {"zctas": int(len(shapes)), "levels": stats}
+        logger.info(
+            f"{metro}: {len(shapes)} ZCTAs, GeoJSON "
+            + ", ".join(f"{level} {s['geojson_kb']:.0f} kB" for level, s in stats.items())
+        )
+
+    manifest = {
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": str(zcta_path),
+        "crs": WGS84,
+        "columns": PACK_COLUMNS,
+        "detail_zooms": DETAIL_ZOOMS,
+        "metros": metros,
+    }
+    (out_dir.parent / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    return written
+
+
+def zcta_levels_exist(metro: str, out_dir: Optional[PathLike] = None) -> bool:
+    """Return True if the ZIP geometry pack of metro has been built."""
+    return zcta_levels_path(metro, out_dir).exists()
+
+
+def read_zcta_levels(
+    metro: str,
+    detail: str = FULL_DETAIL,
+    out_dir: Optional[PathLike] = None,
+) -> gpd.GeoDataFrame:
+    """
+    Load one detail level of a metro's ZIP geometry pack.
+
+    Returns:
+        GeoDataFrame (EPSG:4326) with columns zip_code_str, center_lat,
+        center_lon, geometry
+    """
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level {detail!r} (expected one of {DETAIL_LEVELS})")
+    path = zcta_levels_path(metro, out_dir)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"ZIP geometry pack not found: {path}. "
+            "Run `python -m utils.build_data geometry` first."
+        )
+    gdf = gpd.read_parquet(path, filters=[("detail", "==", detail)])
+    return gdf.drop(columns="detail").reset_index(drop=True)
+
+
+# ============================================================
+# City -> CBSA resolution
+# ============================================================
+
+# City -> CBSA GEOID table written by build_city_cbsa()
+CITY_CBSA_PATH = GEOMETRY_DIR / "city_cbsa.csv"
+CITY_CBSA_COLUMNS = ["city", "city_full", "cbsa_geoid", "cbsa_name", "method"]
+
+# National 2018 500k CBSA boundaries shipped with Design 1 (.shp or zipped)
+CBSA_SOURCE_PATHS = [
+    _DESIGN1_DATA_DIR / "cb_2018_us_cbsa_500k.shp",
+    _DESIGN1_DATA_DIR / "cbsa_shapes.zip",
+]
+
+# Manual mapping for special metros → CBSA.NAME (keys are lowercase)
+MANUAL_CBSA_NAME_MAP = {
+    "dc_metro": "Washington-Arlington-Alexandria, DC-VA-MD-WV",
+}
+
+# How a city was matched, in the order the rules are tried
+MATCH_METHODS = ["manual", "exact", "contains", "fuzzy", "unmatched"]
+
+
+def read_cbsa_source(path: Optional[PathLike] = None) -> gpd.GeoDataFrame:
+    """
+    Read national CBSA boundaries (GEOID, NAME, geometry).
+
+    Args:
+        path: Any file geopandas reads; None uses Design 1's shapefile
+    """
+    if path is None:
+        found = [p for p in CBSA_SOURCE_PATHS if p.exists()]
+        if not found:
+            raise FileNotFoundError(
+                "CBSA shapefile not found. Expected at either "
+                + " or ".join(f"'{p}'" for p in CBSA_SOURCE_PATHS)
+            )
+        path = found[0]
+    path = Path(path)
+    if path.suffix == ".parquet":
+        gdf = gpd.read_parquet(path)
+    else:
+        gdf = gpd.read_file(f"zip://{path}" if path.suffix == ".zip" else path)
+    missing = {"GEOID", "NAME"} - set(gdf.columns)
+    if missing:
+        raise RuntimeError(f"{path}: CBSA boundaries are missing the columns {sorted(missing)}.")
+    return gdf[["GEOID", "NAME", "geometry"]]
+
+
+def parse_city_state(city: str, city_full: str):
+    """
+    Parse a full city string like 'Seattle, WA'
+    into (city_name, state_abbrev).
+    """
+    raw = city_full or city or ""
+    raw = str(raw)
+    parts = [p.strip() for p in raw.split(",")]
+
+    if len(parts) >= 2:
+        city_part = parts[0]
+        state_part = parts[1]
+    else:
+        city_part = parts[0] if parts else ""
+        state_part = ""
+
+    city_base = city_part.strip()
+    state_abbrev = state_part.strip().upper()[:2] if state_part else ""
+    return city_base, state_abbrev
+
+
+def build_city_tokens(city_base: str):
+    """
+    Tokenize a city name to help with fuzzy matching.
+    Handles hyphens and similar separators.
+    """
+    city_base = (city_base or "").strip().lower()
+    if not city_base:
+        return []
+
+    tokens = [city_base]
+    for sep in ["-", "–", "—"]:
+        if sep in city_base:
+            tokens.extend([t.strip() for t in city_base.split(sep) if t.strip()])
+
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(tokens))
+
+
+def resolve_manual_cbsa_name(city: str, city_full: str):
+    """
+    Handle special CBSA matching cases (DC, Boston, etc.)
+    """
+    key = (city_full or city or "").strip().lower()
+    if key in MANUAL_CBSA_NAME_MAP:
+        return MANUAL_CBSA_NAME_MAP[key]
+
+    if "boston" in key:
+        return "Boston-Cambridge-Newton, MA-NH"
+
+    return None
+
+
+def _match_cbsa(city: str, city_full: str, cbsa: gpd.GeoDataFrame):
+    """(candidate rows, method) for one city; candidates are empty if unmatched."""
+    names = cbsa["NAME"].astype(str)
+    names_lower = names.str.lower()
+
+    manual_name = resolve_manual_cbsa_name(city, city_full)
+    if manual_name:
+        manual = cbsa[names == manual_name]
+        if not manual.empty:
+            return manual.iloc[:1], "manual"
+
+    city_full_lower = city_full.lower()
+    exact = cbsa[names_lower == city_full_lower]
+    if not exact.empty:
+        return exact, "exact"
+    contains = cbsa[names_lower.str.contains(city_full_lower, regex=False, na=False)]
+    if not contains.empty:
+        return contains, "contains"
+
+    city_base, state_abbrev = parse_city_state(city, city_full)
+    tokens = build_city_tokens(city_base)
+    if tokens:
+        base_mask = names_lower.apply(lambda name: any(t in name for t in tokens))
+        if state_abbrev:
+            base_mask &= names.str.upper().str.contains(state_abbrev, regex=False, na=False)
+        if base_mask.any():
+            return cbsa[base_mask], "fuzzy"
+    return cbsa.iloc[0:0], "unmatched"
+
+
+def resolve_city_cbsa(
+    cities: pd.DataFrame,
+    cbsa: gpd.GeoDataFrame,
+    centroids: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Match every metro to one CBSA.
+
+    Rules, in order: manual override, exact name, name containing city_full,
+    city-name tokens plus state. When a rule yields several CBSAs, the one
+    whose centroid is closest to the metro's (lat, lon) wins.
+
+    Args:
+        cities: Columns city, city_full and optionally lat, lon
+        cbsa: CBSA boundaries (GEOID, NAME, geometry)
+        centroids: Centroid table (read_centroids()); CBSAs missing from it
+            are computed
+
+    Returns:
+        DataFrame with CITY_CBSA_COLUMNS; cbsa_geoid / cbsa_name are empty
+        and method is "unmatched" for cities no rule matched
+    """
+    centers = attach_centers(cbsa, centroids, "cbsa", "GEOID")[["center_lat", "center_lon"]]
+    records = []
+    for rec in cities.to_dict("records"):
+        city = str(rec["city"])
+        city_full = str(rec.get("city_full") or city).strip()
+        candidates, method = _match_cbsa(city, city_full, cbsa)
+
+        lat0 = float(rec.get("lat", np.nan))
+        lon0 = float(rec.get("lon", np.nan))
+        if len(candidates) > 1 and np.isfinite(lat0) and np.isfinite(lon0):
+            cand_centers = centers.loc[candidates.index]
+            dist2 = (cand_centers["center_lat"] - lat0) ** 2 + (cand_centers["center_lon"] - lon0) ** 2
+            best = candidates.loc[dist2.idxmin()]
+        elif not candidates.empty:
+            best = candidates.iloc[0]
+        else:
+            best = None
+
+        records.append({
+            "city": city,
+            "city_full": city_full,
+            "cbsa_geoid": None if best is None else str(best["GEOID"]),
+            "cbsa_name": None if best is None else str(best["NAME"]),
+            "method": method,
+        })
+    return pd.DataFrame(records, columns=CITY_CBSA_COLUMNS)
+
+
+def metro_locations(source_path: Optional[PathLike] = None) -> pd.DataFrame:
+    """
+    Metros of HouseTS with the mean location of their ZIP codes.
+
+    Locations come from the ZIP geometry packs when built, else from the
+    pgeocode lookup (left empty when it is unavailable).
+
+    Returns:
+        DataFrame with columns city, city_full, lat, lon
+    """
+    if source_path is None:
+        df = read_house_ts(columns=["city", "city_full", "zipcode"])
+    elif Path(source_path).suffix == ".parquet":
+        df = pd.read_parquet(source_path, columns=["city", "city_full", "zipcode"])
+    else:
+        df = pd.read_csv(source_path, usecols=["city", "city_full", "zipcode"], dtype={"zipcode": str})
+    zips = pd.DataFrame({
+        "city": df["city"].astype(str),
+        "city_full": df["city_full"].astype(str),
+        "zip_code_str": df["zipcode"].astype(str).str.zfill(5),
+    }).drop_duplicates(ignore_index=True)
+
+    packed = [metro for metro in zips["city"].unique() if zcta_levels_exist(metro)]
+    if packed:
+        coords = pd.concat(
+            [read_zcta_levels(metro, FULL_DETAIL)[["zip_code_str", "center_lat", "center_lon"]] for metro in packed],
+            ignore_index=True,
+        ).drop_duplicates("zip_code_str")
+        coords = coords.rename(columns={"center_lat": "lat", "center_lon": "lon"})
+    else:
+        from .aggregates import zip_coordinates
+
+        coords = zip_coordinates(zips["zip_code_str"])
+    zips = zips.merge(coords, on="zip_code_str", how="left")
+    return zips.groupby(["city", "city_full"], as_index=False, observed=True)[["lat", "lon"]].mean()
+
+
+def build_city_cbsa(
+    cbsa_path: Optional[PathLike] = None,
+    source_path: Optional[PathLike] = None,
+    out_path: PathLike = CITY_CBSA_PATH,
+) -> pd.DataFrame:
+    """
+    Resolve every HouseTS metro to its CBSA and write the lookup table.
+
+    Unmatched metros are kept (method "unmatched") and logged, so they can
+    be fixed in MANUAL_CBSA_NAME_MAP before the app ever runs.
+
+    Args:
+        cbsa_path: National CBSA boundaries (None: Design 1's shapefile)
+        source_path: CSV or Parquet file with the raw HouseTS rows (None
+            reads through read_house_ts)
+        out_path: Output CSV
+
+    Returns:
+        The written table
+    """
+    out_path = Path(out_path)
+    centroids = read_centroids() if centroids_exist() else None
+    table = resolve_city_cbsa(metro_locations(source_path), read_cbsa_source(cbsa_path), centroids)
+    for rec in table[table["method"] == "unmatched"].to_dict("records"):
+        logger.warning(f"{rec['city']} ({rec['city_full']}): no matching CBSA")
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    table.to_csv(tmp_path, index=False)
+    tmp_path.replace(out_path)
+    logger.info(f"Wrote {out_path}: " + ", ".join(
+        f"{method} {n}" for method, n in table["method"].value_counts().reindex(MATCH_METHODS).dropna().astype(int).items()
+    ))
+    return table
+
+
+def city_cbsa_exists(path: Optional[PathLike] = None) -> bool:
+    """Return True if the city -> CBSA table has been built."""
+    return Path(path or CITY_CBSA_PATH).exists()
+
+
+def read_city_cbsa(path: Optional[PathLike] = None) -> pd.DataFrame:
+    """Load the city -> CBSA table (CITY_CBSA_COLUMNS, GEOIDs as strings)."""
+    path = Path(path or CITY_CBSA_PATH)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"City -> CBSA table not found: {path}. "
+            "Run `python -m utils.build_data cbsa` first."
+        )
+    return pd.read_csv(path, dtype={"city": str, "city_full": str, "cbsa_geoid": str, "cbsa_name": str})
+
+
+# ============================================================
+# Centroid / representative-point table
+# ============================================================
+
+# Centroid and label point of every CBSA and ZCTA, written by build_centroids()
+CENTROIDS_PATH = GEOMETRY_DIR / "centroids.parquet"
+CENTROID_COLUMNS = ["level", "geoid", "center_lat", "center_lon", "label_lat", "label_lon"]
+
+
+def build_centroids(
+    zcta_path: Optional[PathLike] = None,
+    cbsa_path: Optional[PathLike] = None,
+    out_path: PathLike = CENTROIDS_PATH,
+) -> pd.DataFrame:
+    """
+    Compute the centroid and representative point of every CBSA and ZCTA.
+
+    Points are computed once in an equal-area projection and stored in
+    EPSG:4326, so the maps look them up by id instead of reprojecting the
+    polygons on every render.
+
+    Args:
+        zcta_path: ZCTA boundaries or a directory of <METRO>.geojson files
+            (None: default_zcta_source())
+        cbsa_path: CBSA boundaries (None: Design 1's shapefile; skipped
+            with a warning when it is missing)
+        out_path: Output Parquet file
+
+    Returns:
+        The written table (CENTROID_COLUMNS)
+    """
+    out_path = Path(out_path)
+    zcta_path = Path(zcta_path or default_zcta_source())
+    zcta = read_metro_geojson_dir(zcta_path) if zcta_path.is_dir() else read_zcta_source(zcta_path)
+    zcta = zcta.drop_duplicates("zip_code_str").reset_index(drop=True)
+    parts = [polygon_points(zcta.geometry).assign(level="zcta", geoid=zcta["zip_code_str"])]
+
+    try:
+        cbsa = read_cbsa_source(cbsa_path).reset_index(drop=True)
+        parts.append(polygon_points(cbsa.geometry).assign(level="cbsa", geoid=cbsa["GEOID"].astype(str)))
+    except FileNotFoundError as e:
+        logger.warning(f"CBSA centroids skipped: {e}")
+
+    table = pd.concat(parts, ignore_index=True)[CENTROID_COLUMNS]
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    table.to_parquet(tmp_path, index=False)
+    tmp_path.replace(out_path)
+    logger.info(f"Wrote {out_path}: " + ", ".join(
+        f"{n} {level.upper()}s" for level, n in table["level"].value_counts(sort=False).items()
+    ))
+    return table
+
+
+def centroids_exist(path: Optional[PathLike] = None) -> bool:
+    """Return True if the centroid table has been built."""
+    return Path(path or CENTROIDS_PATH).exists()
+
+
+def read_centroids(path: Optional[PathLike] = None) -> pd.DataFrame:
+    """
+    Load the centroid table indexed by (level, geoid).
+
+    Returns:
+        DataFrame with columns center_lat, center_lon, label_lat, label_lon
+    """
+    path = Path(path or CENTROIDS_PATH)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Centroid table not found: {path}. "
+            "Run `python -m utils.build_data centroids` first."
+        )
+    return pd.read_parquet(path).set_index(["level", "geoid"]).sort_index()
+
+
+def attach_centers(
+    gdf: gpd.GeoDataFrame,
+    centroids: Optional[pd.DataFrame],
+    level: str,
+    id_col: str,
+) -> gpd.GeoDataFrame:
+    """
+    Add the centroid and label point of every row, looked up by id.
+
+    Rows whose id is not in the table (or every row, without a table) are
+    computed from their geometry.
+
+    Args:
+        gdf: Polygons with an id column
+        centroids: Table from read_centroids(), or None
+        level: "cbsa" or "zcta"
+        id_col: Column of gdf holding the GEOID / ZCTA code
+
+    Returns:
+        Copy of gdf with center_lat, center_lon, label_lat, label_lon
+    """
+    point_cols = CENTROID_COLUMNS[2:]
+    ids = gdf[id_col].astype(str)
+    if centroids is not None and level in centroids.index.get_level_values("level"):
+        points = centroids.xs(level, level="level").reindex(ids.to_numpy())
+        points.index = gdf.index
+    else:
+        points = pd.DataFrame(np.nan, index=gdf.index, columns=point_cols)
+
+    missing = points["center_lat"].isna() & gdf.geometry.notna()
+    if missing.any():
+        points.loc[missing, point_cols] = polygon_points(gdf.geometry[missing])[point_cols]
+    return gdf.drop(columns=point_cols, errors="ignore").assign(**{col: points[col] for col in point_cols})
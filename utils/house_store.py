@@ -0,0 +1,395 @@
+"""
+Columnar snapshot of the HouseTS dataset.
+
+The raw `HouseTS.csv` is ~285 MB with ~39 columns, but every page only needs
+a handful of them. This module converts the CSV once into a typed Parquet
+snapshot and reads it back with column projection and year/city filters
+pushed down into the Parquet scan, so only the requested columns and row
+groups are ever decoded.
+
+For per-metro drill-downs the same rows can also be written as a
+hive-partitioned dataset (`metro=XXX/year=YYYY/`), from which only the
+directories of the requested metros/years are opened.
+
+Finally, an uncompressed Arrow IPC file can be memory-mapped read-only:
+every Streamlit process on the host then maps the same OS page cache
+instead of holding its own parsed copy of the data.
+"""
+import shutil
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from .path_utils import get_project_root
+from .schema import apply_schema, csv_dtypes
+
+# Raw source file (Git LFS) and build output locations
+RAW_CSV_PATH = get_project_root() / "design2" / "HouseTS.csv"
+DATA_DIR = get_project_root() / "data"
+SNAPSHOT_PATH = DATA_DIR / "house_ts.parquet"
+PARTITIONED_DIR = DATA_DIR / "house_ts_partitioned"
+IPC_PATH = DATA_DIR / "house_ts.arrow"
+
+# Rows per Parquet row group. Rows are sorted by (city, year) before writing,
+# so each row group covers a narrow city/year range and its min/max
+# statistics let the scanner skip groups that cannot match a filter.
+ROW_GROUP_SIZE = 50_000
+
+# Columns the snapshot is sorted by (and which filters are pushed down on)
+SORT_COLUMNS = ["city", "year"]
+
+# Directory layout of the partitioned dataset: metro=<city code>/year=<year>/
+_PARTITION_SCHEMA = pa.schema([("metro", pa.string()), ("year", pa.int16())])
+
+PathLike = Union[str, Path]
+
+
+def _read_raw_csv(csv_path: PathLike) -> pd.DataFrame:
+    """Read the raw HouseTS CSV and apply the declared schema."""
+    df = pd.read_csv(csv_path, dtype=csv_dtypes())
+
+    if df.empty or "version https://git-lfs.github.com/spec/v1" in str(df.columns[0]):
+        raise ValueError(
+            f"{csv_path} is empty or a Git LFS pointer file. "
+            "Run `git lfs pull` to fetch the actual data first."
+        )
+
+    return apply_schema(df, required=SORT_COLUMNS, name=str(csv_path))
+
+
+def build_snapshot(
+    csv_path: PathLike = RAW_CSV_PATH,
+    out_path: PathLike = SNAPSHOT_PATH,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> Path:
+    """
+    Convert the raw HouseTS CSV into a typed Parquet snapshot.
+
+    Args:
+        csv_path: Path to the raw HouseTS CSV
+        out_path: Destination Parquet file
+        row_group_size: Number of rows per Parquet row group
+
+    Returns:
+        Path of the written snapshot
+    """
+    return write_snapshot(_read_raw_csv(csv_path), out_path, row_group_size)
+
+
+def write_snapshot(
+    df: pd.DataFrame,
+    out_path: PathLike = SNAPSHOT_PATH,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> Path:
+    """Sort typed HouseTS rows by (city, year) and write them as the snapshot."""
+    out_path = Path(out_path)
+    df = df.sort_values(SORT_COLUMNS, kind="stable").reset_index(drop=True)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    df.to_parquet(tmp_path, index=False, row_group_size=row_group_size)
+    # Atomic replace so readers never see a half-written file
+    tmp_path.replace(out_path)
+    return out_path
+
+
+def snapshot_exists(path: Optional[PathLike] = None) -> bool:
+    """Return True if the Parquet snapshot has been built."""
+    return Path(path or SNAPSHOT_PATH).exists()
+
+
+def _build_filter(
+    years: Optional[Iterable[int]], cities: Optional[Iterable[str]]
+) -> Optional[ds.Expression]:
+    """Build a pyarrow filter expression for the given years/cities."""
+    expr = None
+    if years is not None:
+        expr = ds.field("year").isin([int(y) for y in years])
+    if cities is not None:
+        city_expr = ds.field("city").isin([str(c) for c in cities])
+        expr = city_expr if expr is None else expr & city_expr
+    return expr
+
+
+def _read_csv_fallback(
+    csv_path: Path,
+    columns: Optional[Sequence[str]],
+    years: Optional[Iterable[int]],
+    cities: Optional[Iterable[str]],
+) -> pd.DataFrame:
+    """Same contract as read_house_ts, served from the raw CSV."""
+    usecols: Optional[List[str]] = None
+    if columns is not None:
+        usecols = list(dict.fromkeys(list(columns) + [
+            c for c, wanted in (("year", years), ("city", cities)) if wanted is not None
+        ]))
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=csv_dtypes(usecols))
+    df = apply_schema(df, name=str(csv_path))
+
+    if years is not None:
+        df = df[df["year"].isin([int(y) for y in years])]
+    if cities is not None:
+        df = df[df["city"].isin([str(c) for c in cities])]
+    if columns is not None:
+        df = df[list(columns)]
+    return df.reset_index(drop=True)
+
+
+def read_house_ts(
+    columns: Optional[Sequence[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    cities: Optional[Iterable[str]] = None,
+    path: Optional[PathLike] = None,
+    csv_path: PathLike = RAW_CSV_PATH,
+) -> pd.DataFrame:
+    """
+    Read HouseTS rows with projection and predicate pushdown.
+
+    Sources are tried in order: the memory-mapped Arrow IPC store (unless an
+    explicit snapshot path is given), the Parquet snapshot, and finally the
+    raw CSV (only the requested columns) so callers keep working before any
+    build step has been run.
+
+    Args:
+        columns: Columns to read (None reads all columns)
+        years: Only return rows for these years
+        cities: Only return rows for these city codes (e.g. 'ATL')
+        path: Snapshot path (defaults to SNAPSHOT_PATH)
+        csv_path: Raw CSV used when the snapshot is missing
+
+    Returns:
+        DataFrame with the requested columns and rows
+    """
+    if path is None and ipc_exists():
+        return read_ipc(columns=columns, years=years, cities=cities)
+
+    path = Path(path or SNAPSHOT_PATH)
+    if not path.exists():
+        csv_path = Path(csv_path)
+        if not csv_path.exists():
+            raise FileNotFoundError(
+                f"Neither the HouseTS snapshot ({path}) nor the raw CSV ({csv_path}) exists."
+            )
+        return _read_csv_fallback(csv_path, columns, years, cities)
+
+    dataset = ds.dataset(path, format="parquet")
+    table = dataset.to_table(
+        columns=list(columns) if columns is not None else None,
+        filter=_build_filter(years, cities),
+    )
+    # Snapshots written before a schema change are brought up to date here
+    return apply_schema(table.to_pandas(), name=str(path))
+
+
+def _read_source(source_path: Optional[PathLike]) -> pd.DataFrame:
+    """Read a full table from a CSV/Parquet file, or HouseTS when None."""
+    if source_path is None:
+        # Snapshot or raw CSV, never an existing IPC store being rebuilt
+        return read_house_ts(path=SNAPSHOT_PATH)
+    source_path = Path(source_path)
+    if source_path.suffix == ".parquet":
+        df = pd.read_parquet(source_path)
+    else:
+        df = pd.read_csv(source_path, dtype=csv_dtypes())
+    return apply_schema(df, name=str(source_path))
+
+
+def build_partitions(
+    source_path: Optional[PathLike] = None,
+    out_dir: PathLike = PARTITIONED_DIR,
+    metro_col: str = "city",
+) -> Path:
+    """
+    Write a table as a hive-partitioned dataset (metro=XXX/year=YYYY/).
+
+    Args:
+        source_path: CSV or Parquet file to partition (None reads HouseTS
+            from the snapshot or raw CSV)
+        out_dir: Destination directory (replaced if it exists)
+        metro_col: Column holding the metro key used for `metro=`
+
+    Returns:
+        Path of the written dataset directory
+    """
+    out_dir = Path(out_dir)
+    df = _read_source(source_path)
+    missing = [col for col in (metro_col, "year") if col not in df.columns]
+    if missing:
+        raise ValueError(f"Cannot partition: missing columns {missing}")
+
+    df = df.assign(metro=df[metro_col].astype(str))
+    df = df.sort_values(["metro", "year"], kind="stable").reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    ds.write_dataset(
+        table,
+        tmp_dir,
+        format="parquet",
+        partitioning=ds.partitioning(_PARTITION_SCHEMA, flavor="hive"),
+        basename_template="part-{i}.parquet",
+    )
+    # Swap the finished dataset in; readers only ever see a complete layout
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp_dir.replace(out_dir)
+    return out_dir
+
+
+def partitions_exist(path: Optional[PathLike] = None) -> bool:
+    """Return True if the partitioned dataset has been built."""
+    path = Path(path or PARTITIONED_DIR)
+    return path.is_dir() and any(path.glob("metro=*"))
+
+
+def list_partition_files(
+    metros: Optional[Iterable[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    path: Optional[PathLike] = None,
+) -> List[Path]:
+    """
+    Return the Parquet files of the requested partitions.
+
+    Only the matching `metro=`/`year=` directories are listed; the rest of
+    the dataset is never touched.
+    """
+    path = Path(path or PARTITIONED_DIR)
+    if metros is None:
+        metro_dirs = sorted(path.glob("metro=*"))
+    else:
+        metro_dirs = [path / f"metro={quote(str(m), safe='')}" for m in metros]
+
+    files: List[Path] = []
+    for metro_dir in metro_dirs:
+        if years is None:
+            year_dirs = sorted(metro_dir.glob("year=*"))
+        else:
+            year_dirs = [metro_dir / f"year={int(y)}" for y in years]
+        for year_dir in year_dirs:
+            files.extend(sorted(year_dir.glob("*.parquet")))
+    return files
+
+
+def read_partitions(
+    metros: Optional[Iterable[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    columns: Optional[Sequence[str]] = None,
+    path: Optional[PathLike] = None,
+) -> pd.DataFrame:
+    """
+    Read only the partitions a view needs.
+
+    Args:
+        metros: Metro keys to load (None loads every metro)
+        years: Years to load (None loads every year)
+        columns: Columns to read (None reads all data columns)
+        path: Dataset directory (defaults to PARTITIONED_DIR)
+
+    Returns:
+        DataFrame with the requested rows; `year` is restored from the
+        directory names
+    """
+    path = Path(path or PARTITIONED_DIR)
+    if not partitions_exist(path):
+        raise FileNotFoundError(f"Partitioned dataset not found: {path}")
+
+    files = list_partition_files(metros, years, path)
+    if not files:
+        return pd.DataFrame(columns=list(columns) if columns is not None else None)
+
+    dataset = ds.dataset(
+        [str(f) for f in files],
+        format="parquet",
+        partitioning=ds.partitioning(_PARTITION_SCHEMA, flavor="hive"),
+        partition_base_dir=str(path),
+    )
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != "metro"]
+    table = dataset.to_table(columns=list(columns))
+    return apply_schema(table.to_pandas(), name=str(path))
+
+
+def build_ipc(
+    source_path: Optional[PathLike] = None,
+    out_path: PathLike = IPC_PATH,
+) -> Path:
+    """
+    Write a table as an uncompressed Arrow IPC file for memory-mapping.
+
+    Each column is written as a single uncompressed chunk so readers can
+    map the buffers directly without decoding or copying them.
+
+    Args:
+        source_path: CSV or Parquet file to convert (None reads HouseTS
+            from the snapshot or raw CSV)
+        out_path: Destination .arrow file
+
+    Returns:
+        Path of the written file
+    """
+    return write_ipc(_read_source(source_path), out_path)
+
+
+def write_ipc(df: pd.DataFrame, out_path: PathLike = IPC_PATH) -> Path:
+    """Write a DataFrame as an uncompressed, single-chunk Arrow IPC file."""
+    out_path = Path(out_path)
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    # Atomic replace: processes that already mapped the old file keep their
+    # (now unlinked) inode, new readers see the new one
+    tmp_path.replace(out_path)
+    return out_path
+
+
+def ipc_exists(path: Optional[PathLike] = None) -> bool:
+    """Return True if the Arrow IPC store has been built."""
+    return Path(path or IPC_PATH).exists()
+
+
+def read_ipc(
+    columns: Optional[Sequence[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    cities: Optional[Iterable[str]] = None,
+    path: Optional[PathLike] = None,
+) -> pd.DataFrame:
+    """
+    Read rows from the memory-mapped Arrow IPC store.
+
+    Column buffers are mapped read-only rather than read into process
+    memory, so the pages of an unfiltered projection are shared with every
+    other process mapping the same file. Year/city filters materialize only
+    the matching rows.
+
+    Args:
+        columns: Columns to read (None reads all columns)
+        years: Only return rows for these years
+        cities: Only return rows for these city codes (e.g. 'ATL')
+        path: IPC file (defaults to IPC_PATH)
+
+    Returns:
+        DataFrame with the requested columns and rows
+    """
+    path = Path(path or IPC_PATH)
+    source = pa.memory_map(str(path), "r")
+    table = pa.ipc.open_file(source).read_all()
+
+    expr = _build_filter(years, cities)
+    if expr is not None:
+        table = table.filter(expr)
+    if columns is not None:
+        table = table.select(list(columns))
+    # split_blocks keeps one block per column so numeric columns stay
+    # zero-copy views of the mapped buffers
+    df = table.to_pandas(split_blocks=True)
+    return apply_schema(df, name=str(path))
@@ -0,0 +1,324 @@
+"""
+Incremental ingest of new HouseTS months.
+
+Adding a month used to mean replacing HouseTS.csv and rebuilding everything.
+ingest_delta() instead takes a delta file of (zipcode, date) rows and
+
+  1. upserts them into the affected metro=XXX/year=YYYY partitions only,
+  2. recomputes the rows of the aggregate tables for the affected years,
+  3. optionally starts a background compaction that rewrites the national
+     Parquet snapshot / Arrow IPC store from the partitions.
+
+Run through the build CLI:
+    python -m utils.build_data ingest DELTA.csv
+"""
+import json
+import logging
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote, unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .aggregates import (
+    AGGREGATES_DIR,
+    MANIFEST_NAME,
+    SOURCE_COLUMNS,
+    add_composite_indices,
+    add_story_ratios,
+    city_year_agg,
+    metro_ratio_agg,
+    story_composite_agg,
+    story_summary_agg,
+    zip_coordinates,
+    zip_year_agg,
+)
+from .house_store import (
+    DATA_DIR,
+    IPC_PATH,
+    PARTITIONED_DIR,
+    SNAPSHOT_PATH,
+    ipc_exists,
+    list_partition_files,
+    partitions_exist,
+    read_partitions,
+    snapshot_exists,
+    write_ipc,
+    write_snapshot,
+)
+from .path_utils import get_project_root
+from .story_bundle import STORY_BUNDLE_PATH, story_bundle_exists, write_story_bundle
+from .schema import apply_schema, csv_dtypes
+
+logger = logging.getLogger(__name__)
+
+# Rows are identified by (zipcode, date); a delta row replaces an existing one
+KEY_COLUMNS = ["zipcode", "date"]
+
+COMPACT_LOG_PATH = DATA_DIR / "compact.log"
+
+PathLike = Union[str, Path]
+
+
+def read_delta(delta_path: PathLike) -> pd.DataFrame:
+    """Read a delta file (CSV or Parquet) of new HouseTS rows."""
+    delta_path = Path(delta_path)
+    if delta_path.suffix == ".parquet":
+        df = pd.read_parquet(delta_path)
+    else:
+        df = pd.read_csv(delta_path, dtype=csv_dtypes())
+    df = apply_schema(df, required=KEY_COLUMNS + ["city"], name=str(delta_path))
+    # The partition year always follows the row's date
+    df["year"] = df["date"].dt.year.astype("int16")
+    return df
+
+
+def _write_partition_file(table: pa.Table, partition_dir: Path) -> None:
+    """Replace the contents of one partition directory with a single file."""
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    old_files = list(partition_dir.glob("*.parquet"))
+    tmp_path = partition_dir / "part-0.parquet.tmp"
+    pq.write_table(table, tmp_path)
+    tmp_path.replace(partition_dir / "part-0.parquet")
+    for f in old_files:
+        if f.name != "part-0.parquet":
+            f.unlink()
+
+
+def upsert_partitions(
+    delta: pd.DataFrame, path: PathLike = PARTITIONED_DIR
+) -> List[Tuple[str, int]]:
+    """
+    Merge delta rows into their metro/year partitions.
+
+    Only the partitions of the delta's years are considered: the target
+    partitions are rewritten, and so is any other metro of the same year that
+    still holds one of the delta's (zipcode, date) keys. Files are
+    written with the dataset's existing file schema so all partitions keep
+    identical column types.
+
+    Returns:
+        The (metro, year) partitions that were rewritten
+    """
+    path = Path(path)
+    if not partitions_exist(path):
+        raise FileNotFoundError(
+            f"Partitioned dataset not found: {path}. "
+            "Run `python -m utils.build_data partitions` first."
+        )
+    file_schema = pq.read_schema(list_partition_files(path=path)[0])
+    file_columns = file_schema.names
+
+    # A delta row may move a (zipcode, date) to another metro, so its key is
+    # dropped from every partition of its year, not only the target one
+    delta_keys = pd.MultiIndex.from_frame(delta[KEY_COLUMNS])
+
+    touched = []
+    for year, year_rows in delta.groupby("year", observed=True):
+        year = int(year)
+        targets = {str(metro): rows for metro, rows in year_rows.groupby("city", observed=True)}
+        partition_files: Dict[str, List[Path]] = {}
+        for f in list_partition_files(years=[year], path=path):
+            metro = unquote(f.parent.parent.name.split("=", 1)[1])
+            partition_files.setdefault(metro, []).append(f)
+        for metro in sorted(set(partition_files) | set(targets)):
+            files = partition_files.get(metro, [])
+            if metro not in targets:
+                # Other metros are only rewritten if they hold a moved row
+                keys = pa.concat_tables([pq.read_table(f, columns=KEY_COLUMNS) for f in files])
+                if not pd.MultiIndex.from_frame(keys.to_pandas()).isin(delta_keys).any():
+                    continue
+            parts = []
+            if files:
+                existing = pa.concat_tables([pq.read_table(f) for f in files]).to_pandas()
+                moved = pd.MultiIndex.from_frame(existing[KEY_COLUMNS]).isin(delta_keys)
+                parts.append(existing[~moved])
+            if metro in targets:
+                parts.append(targets[metro].reindex(columns=file_columns))
+            merged = (
+                pd.concat(parts, ignore_index=True)
+                .drop_duplicates(KEY_COLUMNS, keep="last")
+                .sort_values(KEY_COLUMNS, kind="stable")
+                .reset_index(drop=True)
+            )
+            table = pa.Table.from_pandas(merged, preserve_index=False).cast(file_schema)
+            partition_dir = files[0].parent if files else path / f"metro={quote(metro, safe='')}" / f"year={year}"
+            _write_partition_file(table, partition_dir)
+            touched.append((metro, year))
+    return touched
+
+
+def _replace_years(
+    old: pd.DataFrame, new: pd.DataFrame, years: Iterable[int], sort_cols: List[str]
+) -> pd.DataFrame:
+    """Swap the rows of the given years in an aggregate table."""
+    kept = old[~old["year"].isin(list(years))]
+    out = pd.concat([kept, new], ignore_index=True)
+    return out.sort_values(sort_cols, kind="stable").reset_index(drop=True)
+
+
+def update_aggregates(
+    years: Iterable[int],
+    partitions_path: PathLike = PARTITIONED_DIR,
+    out_dir: PathLike = AGGREGATES_DIR,
+    with_coordinates: bool = True,
+) -> List[str]:
+    """
+    Recompute the aggregate tables for the given years only.
+
+    All aggregate tables are per-year (or per-month), so rows of other years
+    are kept as they are; only the Story composite indices, which are
+    relative to the first year, are recomputed over the whole table.
+
+    Returns:
+        Names of the tables that were updated
+    """
+    out_dir = Path(out_dir)
+    years = sorted({int(y) for y in years})
+    rows = read_partitions(years=years, columns=SOURCE_COLUMNS, path=partitions_path)
+    story_rows = add_story_ratios(rows)
+
+    def load(name: str) -> Optional[pd.DataFrame]:
+        path = out_dir / f"{name}.parquet"
+        return pd.read_parquet(path) if path.exists() else None
+
+    updated: Dict[str, pd.DataFrame] = {}
+
+    old = load("house_ts_agg")
+    if old is not None:
+        new = zip_year_agg(rows, with_coordinates=False)
+        # Reuse known ZIP coordinates; only look up ZIPs never seen before
+        coords = old.drop_duplicates("zip_code").set_index("zip_code")[["lat", "lon"]]
+        new["lat"] = new["zip_code"].map(coords["lat"])
+        new["lon"] = new["zip_code"].map(coords["lon"])
+        unknown = new.loc[new["lat"].isna(), "zip_code"]
+        if with_coordinates and not unknown.empty:
+            looked_up = zip_coordinates(unknown).set_index("zip_code_str")
+            keys = new["zip_code"].astype(str).str.zfill(5)
+            new["lat"] = new["lat"].fillna(keys.map(looked_up["lat"]))
+            new["lon"] = new["lon"].fillna(keys.map(looked_up["lon"]))
+        updated["house_ts_agg"] = _replace_years(old, new, years, ["city", "zip_code", "year"])
+
+    old = load("ratio_agg")
+    if old is not None:
+        updated["ratio_agg"] = _replace_years(old, metro_ratio_agg(rows), years, ["city_full", "year"])
+
+    old = load("ratio_monthly_agg")
+    if old is not None:
+        updated["ratio_monthly_agg"] = _replace_years(
+            old, metro_ratio_agg(rows, monthly=True), years, ["city_full", "month"]
+        )
+
+    old = load("city_year")
+    if old is not None:
+        updated["city_year"] = _replace_years(
+            old, city_year_agg(rows), years, ["city_geojson_code", "year"]
+        )
+
+    old = load("story_summary")
+    if old is not None:
+        updated["story_summary"] = _replace_years(
+            old, story_summary_agg(story_rows), years, ["city_full", "year"]
+        )
+
+    old = load("story_composite")
+    if old is not None:
+        merged = _replace_years(old, story_composite_agg(story_rows), years, ["date"])
+        updated["story_composite"] = add_composite_indices(merged)
+
+    for name, table in updated.items():
+        path = out_dir / f"{name}.parquet"
+        tmp_path = path.with_suffix(".parquet.tmp")
+        apply_schema(table, name=name).to_parquet(tmp_path, index=False)
+        tmp_path.replace(path)
+    return list(updated)
+
+
+def _record_ingest(out_dir: Path, delta_path: PathLike, n_rows: int, years: List[int], tables: List[str]) -> None:
+    """Note the ingest in the aggregates manifest."""
+    manifest_path = out_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return
+    manifest = json.loads(manifest_path.read_text())
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    manifest["updated_at"] = now
+    manifest.setdefault("ingests", []).append({
+        "at": now,
+        "delta": str(delta_path),
+        "rows": n_rows,
+        "years": years,
+        "tables": tables,
+    })
+    for name in tables:
+        if name in manifest.get("tables", {}):
+            manifest["tables"][name]["rows"] = int(pq.read_metadata(out_dir / f"{name}.parquet").num_rows)
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+
+
+def compact(partitions_path: PathLike = PARTITIONED_DIR) -> List[Path]:
+    """
+    Rewrite the national snapshot, IPC store and Story bundle from the
+    partitions.
+
+    Only the consolidated files that already exist are rewritten. This is
+    the slow part of an ingest and is meant to run in the background.
+
+    Returns:
+        Paths of the rewritten files
+    """
+    if not (snapshot_exists() or ipc_exists() or story_bundle_exists()):
+        return []
+    df = read_partitions(path=partitions_path)
+    written = []
+    if snapshot_exists():
+        written.append(write_snapshot(df, SNAPSHOT_PATH))
+    if ipc_exists():
+        written.append(write_ipc(df, IPC_PATH))
+    if story_bundle_exists():
+        written.append(write_story_bundle(df, STORY_BUNDLE_PATH, source=str(partitions_path)))
+    return written
+
+
+def start_background_compaction() -> subprocess.Popen:
+    """Run `python -m utils.build_data compact` detached from this process."""
+    COMPACT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # The child keeps its own handle to the log; the parent's copy is closed
+    with open(COMPACT_LOG_PATH, "a") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "utils.build_data", "compact"],
+            cwd=str(get_project_root()),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+def ingest_delta(
+    delta_path: PathLike,
+    partitions_path: PathLike = PARTITIONED_DIR,
+    aggregates_dir: PathLike = AGGREGATES_DIR,
+    with_coordinates: bool = True,
+) -> Dict[str, object]:
+    """
+    Upsert a delta file into the partitions and refresh affected aggregates.
+
+    Args:
+        delta_path: CSV or Parquet file of new/corrected HouseTS rows
+        partitions_path: Partitioned dataset to update
+        aggregates_dir: Directory of the aggregate tables to update
+        with_coordinates: Look up lat/lon for ZIPs new to the Design 1 table
+
+    Returns:
+        Summary with the rewritten partitions, affected years and tables
+    """
+    delta = read_delta(delta_path)
+    partitions = upsert_partitions(delta, partitions_path)
+    years = sorted({year for _, year in partitions})
+    tables = update_aggregates(years, partitions_path, aggregates_dir, with_coordinates)
+    _record_ingest(Path(aggregates_dir), delta_path, len(delta), years, tables)
+    return {"rows": len(delta), "partitions": partitions, "years": years, "tables": tables}
@@ -0,0 +1,411 @@
+"""
+Small query layer over the aggregated page tables.
+
+Pages used to filter, sort and rank their tables with hand-written boolean
+masks. They now register each table once per data version and describe
+lookups as a query:
+
+    register_table("story_summary", summary, data_version,
+                   index=["year"], sort_index=["price_to_income"])
+    top = query("story_summary", where={"year": 2023},
+                sort_by="price_to_income", ascending=False, limit=7)
+
+Supported operations: filter (where), group (group_by + agg), sort
+(sort_by / ascending), top-k (limit) and projection (columns). Predicates
+are `{col: value}` (equality), `{col: [v1, v2]}` (membership) or
+`{col: (op, value)}` with op one of == != < <= > >= in.
+
+Indexes are built when a table is registered:
+  - index:      hash index (value -> row positions) on one column or a
+                tuple of columns, used for equality / membership,
+  - sort_index: sorted positions of a numeric column, used for range
+                predicates (binary search) and for sorting / top-k.
+
+Queries are compiled into a plan (which predicates use which index, which
+are evaluated as masks, how to sort) that is cached by the query's shape,
+so repeated lookups with new values only bind them. Every execution is
+timed per plan; query_stats() reports the latencies.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in")
+RANGE_OPERATORS = ("<", "<=", ">", ">=")
+
+# Compiled plans kept (least recently used are dropped first)
+PLAN_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_tables: Dict[str, dict] = {}
+_plans: "OrderedDict[tuple, dict]" = OrderedDict()
+_stats: Dict[str, dict] = {}
+
+TableSource = Union[pd.DataFrame, Callable[[], pd.DataFrame]]
+IndexSpec = Union[str, Tuple[str, ...]]
+
+
+# ============================================================
+# Registration & indexes
+# ============================================================
+
+def _hash_index(df: pd.DataFrame, cols: Tuple[str, ...]) -> dict:
+    """Map every value (tuple of values for several columns) to its row positions."""
+    keys = cols[0] if len(cols) == 1 else list(cols)
+    positions = df.groupby(keys, observed=True, sort=False).indices
+    return {"cols": cols, "positions": positions}
+
+
+def _sorted_index(df: pd.DataFrame, col: str) -> dict:
+    """
+    Row positions of col in ascending order (missing values excluded) and
+    each row's rank in ascending and descending order (missing rows last).
+    """
+    values = df[col].to_numpy(dtype="float64", na_value=np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    order = valid[np.argsort(values[valid], kind="stable")]
+    order_desc = valid[np.argsort(-values[valid], kind="stable")]
+
+    n_valid = len(order)
+    rank = np.full(len(values), n_valid, dtype=np.int64)
+    rank_desc = rank.copy()
+    rank[order] = np.arange(n_valid)
+    rank_desc[order_desc] = np.arange(n_valid)
+    return {
+        "values": values[order],
+        "order": order,
+        "rank": rank,
+        "rank_desc": rank_desc,
+    }
+
+
+def register_table(
+    name: str,
+    data: TableSource,
+    version: str,
+    index: Iterable[IndexSpec] = (),
+    sort_index: Iterable[str] = (),
+) -> None:
+    """
+    Register a table under name and build its indexes.
+
+    Registration is a no-op while the version is unchanged, so pages can
+    call it on every rerun; pass a zero-argument callable as data to only
+    build the table when the version changes.
+
+    Args:
+        name: Table name used by query()
+        data: The table, or a callable returning it
+        version: Data version the table was built from
+        index: Columns (or tuples of columns) to hash-index
+        sort_index: Numeric columns to sort-index
+    """
+    current = _tables.get(name)
+    if current is not None and current["version"] == version:
+        return
+
+    df = data() if callable(data) else data
+    hash_indexes = [_hash_index(df, (spec,) if isinstance(spec, str) else tuple(spec)) for spec in index]
+    sorted_indexes = {col: _sorted_index(df, col) for col in sort_index}
+    with _lock:
+        _tables[name] = {
+            "version": version,
+            "df": df,
+            "hash": hash_indexes,
+            "sorted": sorted_indexes,
+        }
+        # Plans reference the old indexes
+        for key in [key for key in _plans if key[0] == name]:
+            del _plans[key]
+    logger.debug(f"Registered query table {name} ({len(df)} rows, version {version})")
+
+
+def table_registered(name: str) -> bool:
+    """Return True if a table has been registered under name."""
+    return name in _tables
+
+
+# ============================================================
+# Planning
+# ============================================================
+
+def _normalize_where(where: Optional[dict]) -> List[Tuple[str, str, object]]:
+    """Turn the where mapping into (column, operator, value) predicates."""
+    predicates = []
+    for col, cond in (where or {}).items():
+        if isinstance(cond, tuple) and len(cond) == 2 and cond[0] in OPERATORS:
+            op, value = cond
+        elif isinstance(cond, (list, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+            op, value = "in", cond
+        else:
+            op, value = "==", cond
+        predicates.append((col, op, value))
+    return predicates
+
+
+def _as_tuple(value: Optional[Union[str, Sequence[str]]]) -> Tuple[str, ...]:
+    if value is None:
+        return ()
+    return (value,) if isinstance(value, str) else tuple(value)
+
+
+def _compile(table: dict, shape: tuple) -> dict:
+    """Choose the access path for a query shape (predicates without values)."""
+    pred_shape, sort_by, ascending, has_limit, group_by = shape
+    pending = list(range(len(pred_shape)))
+
+    # Largest hash index fully covered by equality predicates; a single-column
+    # index also serves one membership predicate
+    hash_step = None
+    eq = {col: i for i, (col, op) in enumerate(pred_shape) if op == "=="}
+    member = {col: i for i, (col, op) in enumerate(pred_shape) if op == "in"}
+    for k, idx in enumerate(table["hash"]):
+        cols = idx["cols"]
+        if all(col in eq for col in cols):
+            candidate = {"index": k, "preds": [eq[col] for col in cols], "member": False}
+        elif len(cols) == 1 and cols[0] in member:
+            candidate = {"index": k, "preds": [member[cols[0]]], "member": True}
+        else:
+            continue
+        if hash_step is None or len(candidate["preds"]) > len(hash_step["preds"]) or (
+            hash_step["member"] and not candidate["member"]
+        ):
+            hash_step = candidate
+    if hash_step is not None:
+        pending = [i for i in pending if i not in hash_step["preds"]]
+
+    range_steps = [i for i in pending if pred_shape[i][1] in RANGE_OPERATORS and pred_shape[i][0] in table["sorted"]]
+    residual = [i for i in pending if i not in range_steps]
+
+    # Ranks only apply to rows of the table, not to grouped output
+    rank_sort = len(sort_by) == 1 and sort_by[0] in table["sorted"] and not group_by
+
+    desc = []
+    if hash_step is not None:
+        desc.append("hash(" + ",".join(table["hash"][hash_step["index"]]["cols"]) + ")")
+    desc += [f"range({pred_shape[i][0]})" for i in range_steps]
+    desc += [f"mask({pred_shape[i][0]}{pred_shape[i][1]})" for i in residual]
+    if group_by:
+        desc.append("group(" + ",".join(group_by) + ")")
+    if sort_by:
+        desc.append(("rank" if rank_sort else "sort") + "(" + ",".join(sort_by) + ")")
+    if has_limit:
+        desc.append("limit")
+    return {
+        "hash": hash_step,
+        "range": range_steps,
+        "residual": residual,
+        "rank_sort": rank_sort,
+        "desc": " > ".join(desc) or "scan",
+    }
+
+
+def _get_plan(name: str, table: dict, shape: tuple) -> dict:
+    key = (name, table["version"], shape)
+    with _lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = _compile(table, shape)
+    with _lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+# ============================================================
+# Execution
+# ============================================================
+
+def _intersect(positions: Optional[np.ndarray], other: np.ndarray) -> np.ndarray:
+    if positions is None:
+        return other
+    return np.intersect1d(positions, other, assume_unique=True)
+
+
+def _range_positions(index: dict, op: str, value) -> np.ndarray:
+    """Row positions whose value satisfies `value <op> bound`, via binary search."""
+    values = index["values"]
+    if op in ("<", ">="):
+        cut = np.searchsorted(values, value, side="left")
+    else:
+        cut = np.searchsorted(values, value, side="right")
+    selected = index["order"][:cut] if op in ("<", "<=") else index["order"][cut:]
+    return np.sort(selected)
+
+
+def _compare(values: pd.Series, op: str, value) -> np.ndarray:
+    if op == "in":
+        mask = values.isin(list(value))
+    elif op == "==":
+        mask = values == value
+    elif op == "!=":
+        mask = values != value
+    elif op == "<":
+        mask = values < value
+    elif op == "<=":
+        mask = values <= value
+    elif op == ">":
+        mask = values > value
+    else:
+        mask = values >= value
+    return np.asarray(mask, dtype=bool)
+
+
+def _execute(table: dict, plan: dict, predicates: list, spec: dict) -> pd.DataFrame:
+    df = table["df"]
+    positions = None
+
+    step = plan["hash"]
+    if step is not None:
+        index = table["hash"][step["index"]]
+        if step["member"]:
+            found = [index["positions"].get(v) for v in predicates[step["preds"][0]][2]]
+            found = [p for p in found if p is not None]
+            positions = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+        else:
+            values = [predicates[i][2] for i in step["preds"]]
+            key = values[0] if len(values) == 1 else tuple(values)
+            positions = index["positions"].get(key, np.empty(0, dtype=np.int64))
+
+    for i in plan["range"]:
+        col, op, value = predicates[i]
+        positions = _intersect(positions, _range_positions(table["sorted"][col], op, value))
+
+    for i in plan["residual"]:
+        col, op, value = predicates[i]
+        values = df[col] if positions is None else df[col].take(positions)
+        mask = _compare(values, op, value)
+        positions = np.flatnonzero(mask) if positions is None else positions[mask]
+
+    sort_by, ascending, limit = spec["sort_by"], spec["ascending"], spec["limit"]
+    if plan["rank_sort"]:
+        index = table["sorted"][sort_by[0]]
+        rank = index["rank"] if ascending[0] else index["rank_desc"]
+        if positions is None:
+            positions = np.arange(len(df))
+        ranks = rank[positions]
+        if limit is not None and limit < len(positions):
+            # Top-k: partial partition, then sort only the k kept rows
+            keep = np.argpartition(ranks, limit)[:limit]
+            positions, ranks = positions[keep], ranks[keep]
+        positions = positions[np.argsort(ranks, kind="stable")]
+
+    frame = df.copy(deep=False) if positions is None else df.take(positions)
+
+    if spec["group_by"]:
+        frame = frame.groupby(list(spec["group_by"]), as_index=False, observed=True).agg(**spec["agg"])
+    if sort_by and not plan["rank_sort"]:
+        frame = frame.sort_values(list(sort_by), ascending=list(ascending), kind="stable")
+    if limit is not None:
+        frame = frame.head(limit)
+    if spec["columns"]:
+        frame = frame[list(spec["columns"])]
+    return frame.reset_index(drop=True)
+
+
+def query(
+    name: str,
+    where: Optional[dict] = None,
+    columns: Optional[Sequence[str]] = None,
+    sort_by: Optional[Union[str, Sequence[str]]] = None,
+    ascending: Union[bool, Sequence[bool]] = True,
+    limit: Optional[int] = None,
+    group_by: Optional[Union[str, Sequence[str]]] = None,
+    agg: Optional[Dict[str, Tuple[str, str]]] = None,
+) -> pd.DataFrame:
+    """
+    Run a query against a registered table.
+
+    Args:
+        name: Registered table
+        where: Predicates, see the module docstring
+        columns: Columns to return (default: all)
+        sort_by: Column(s) to sort by (after grouping)
+        ascending: Sort direction, one flag or one per sort column
+        limit: Keep only the first rows (top-k when sorted)
+        group_by: Column(s) to group the filtered rows by
+        agg: Named aggregations for group_by, {out_col: (col, func)}
+
+    Returns:
+        A new DataFrame with a fresh RangeIndex (safe to modify)
+
+    Raises:
+        KeyError: If no table is registered under name
+    """
+    start = time.perf_counter()
+    table = _tables.get(name)
+    if table is None:
+        raise KeyError(f"No query table registered as {name!r}")
+
+    predicates = _normalize_where(where)
+    sort_by = _as_tuple(sort_by)
+    if isinstance(ascending, bool):
+        ascending = (ascending,) * len(sort_by)
+    group_by = _as_tuple(group_by)
+    spec = {
+        "columns": _as_tuple(columns),
+        "sort_by": sort_by,
+        "ascending": tuple(ascending),
+        "limit": limit,
+        "group_by": group_by,
+        "agg": agg or {},
+    }
+    shape = (
+        tuple((col, op) for col, op, _ in predicates),
+        sort_by,
+        tuple(ascending),
+        limit is not None,
+        group_by,
+    )
+    plan = _get_plan(name, table, shape)
+    result = _execute(table, plan, predicates, spec)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    label = f"{name}: {plan['desc']}"
+    with _lock:
+        stats = _stats.setdefault(label, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    logger.debug(f"query {label} -> {len(result)} rows in {elapsed_ms:.2f} ms")
+    return result
+
+
+def explain(name: str, where: Optional[dict] = None, sort_by=None, ascending=True, limit=None, group_by=None) -> str:
+    """Describe the plan query() would use, e.g. "hash(year) > rank(price) > limit"."""
+    sort_by = _as_tuple(sort_by)
+    if isinstance(ascending, bool):
+        ascending = (ascending,) * len(sort_by)
+    shape = (
+        tuple((col, op) for col, op, _ in _normalize_where(where)),
+        sort_by,
+        tuple(ascending),
+        limit is not None,
+        _as_tuple(group_by),
+    )
+    return _get_plan(name, _tables[name], shape)["desc"]
+
+
+def query_stats() -> pd.DataFrame:
+    """
+    Latency per plan since the process started.
+
+    Columns: plan, calls, total_ms, mean_ms, max_ms (slowest first).
+    """
+    with _lock:
+        rows = [{"plan": label, **stats} for label, stats in _stats.items()]
+    out = pd.DataFrame(rows, columns=["plan", "calls", "total_ms", "max_ms"])
+    out["mean_ms"] = out["total_ms"] / out["calls"]
+    return out[["plan", "calls", "total_ms", "mean_ms", "max_ms"]].sort_values(
+        "total_ms", ascending=False, ignore_index=True
+    )
@@ -0,0 +1,111 @@
+"""
+Streaming builder for design2/House_reduced.csv.
+
+House_reduced.csv used to be produced in House_reduced.ipynb by loading all
+of HouseTS.csv into memory. build_reduced() reads HouseTS in fixed-size
+chunks instead, so peak memory is bounded by the chunk size (plus, in
+annual mode, one row per metro/ZIP/year group) regardless of the size of
+the source file.
+
+    python -m utils.build_data reduced [--chunksize N] [--annual]
+"""
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+from .house_store import RAW_CSV_PATH
+from .path_utils import get_project_root
+from .schema import apply_schema, csv_dtypes
+
+REDUCED_CSV_PATH = get_project_root() / "design2" / "House_reduced.csv"
+
+# Projection used by Design 2 / Design 3 (same as House_reduced.ipynb)
+REDUCED_COLUMNS = ["median_sale_price", "Per Capita Income", "year", "city_full", "city", "zipcode"]
+
+# Keys and measures of the optional monthly -> annual aggregation
+ANNUAL_KEYS = ["city", "city_full", "zipcode", "year"]
+ANNUAL_VALUES = ["median_sale_price", "Per Capita Income"]
+
+CHUNK_SIZE = 100_000
+
+PathLike = Union[str, Path]
+
+
+def _merge_partial(state: Optional[pd.DataFrame], chunk: pd.DataFrame) -> pd.DataFrame:
+    """Fold one chunk's per-group sums and counts into the running totals."""
+    # Accumulate in float64; float32 running sums drift over many chunks
+    chunk = chunk.astype({col: "float64" for col in ANNUAL_VALUES})
+    grouped = chunk.groupby(ANNUAL_KEYS, observed=True)[ANNUAL_VALUES]
+    partial = grouped.sum().join(grouped.count(), rsuffix="__n")
+    if state is None:
+        return partial
+    return pd.concat([state, partial]).groupby(level=ANNUAL_KEYS, observed=True).sum()
+
+
+def build_reduced(
+    csv_path: PathLike = RAW_CSV_PATH,
+    out_path: PathLike = REDUCED_CSV_PATH,
+    chunksize: int = CHUNK_SIZE,
+    annual: bool = False,
+) -> Dict[str, int]:
+    """
+    Stream HouseTS into the reduced CSV.
+
+    Args:
+        csv_path: Raw HouseTS CSV
+        out_path: Destination CSV
+        chunksize: Rows parsed per chunk (bounds peak memory)
+        annual: Also aggregate monthly rows to one row per metro/ZIP/year
+            (mean of the measures) instead of copying every month
+
+    Returns:
+        Counts of rows read and written
+    """
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+
+    reader = pd.read_csv(
+        csv_path,
+        usecols=lambda c: c in REDUCED_COLUMNS,
+        dtype=csv_dtypes(REDUCED_COLUMNS),
+        chunksize=chunksize,
+    )
+
+    rows_read = rows_written = 0
+    state = None
+    wrote_header = False
+    for chunk in reader:
+        missing = [c for c in REDUCED_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(
+                f"{csv_path} is missing columns {missing} "
+                "(is it a Git LFS pointer? Run `git lfs pull`)."
+            )
+        chunk = apply_schema(chunk[REDUCED_COLUMNS], name=f"{Path(csv_path).name} chunk")
+        rows_read += len(chunk)
+
+        if annual:
+            state = _merge_partial(state, chunk)
+            continue
+
+        chunk.to_csv(tmp_path, mode="a" if wrote_header else "w", header=not wrote_header, index=False)
+        wrote_header = True
+        rows_written += len(chunk)
+
+    if annual:
+        if state is None:
+            raise ValueError(f"{csv_path} contains no rows")
+        means = pd.DataFrame({
+            col: state[col] / state[f"{col}__n"].where(state[f"{col}__n"] > 0)
+            for col in ANNUAL_VALUES
+        }).reset_index()
+        means[REDUCED_COLUMNS].to_csv(tmp_path, index=False)
+        rows_written = len(means)
+    elif not wrote_header:
+        raise ValueError(f"{csv_path} contains no rows")
+
+    # Atomic replace so readers never see a half-written file
+    tmp_path.replace(out_path)
+    return {"rows_read": rows_read, "rows_written": rows_written}
@@ -0,0 +1,199 @@
+"""
+Declared column schema for the HouseTS tables.
+
+Left to itself, pandas infers float64/object/int64 for every CSV column,
+which makes the 30-metro x ZIP x month table several times larger than it
+needs to be and keeps the city keys as Python strings. This module declares
+one compact dtype per known column (float32 metrics, int16 year, categorical
+city names, fixed-width ZIP codes) and every loader applies it through
+apply_schema(), which validates required columns, downcasts and logs the
+memory saved.
+"""
+import logging
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Dtype used for 5-character ZIP code strings ("02139"); stored as categorical
+ZIP5 = "zip5"
+
+# Numeric HouseTS measures (all stored as float32)
+_FLOAT_COLUMNS = [
+    "median_sale_price",
+    "median_list_price",
+    "median_ppsf",
+    "median_list_ppsf",
+    "homes_sold",
+    "pending_sales",
+    "new_listings",
+    "inventory",
+    "median_dom",
+    "avg_sale_to_list",
+    "sold_above_list",
+    "off_market_in_two_weeks",
+    "bank",
+    "bus",
+    "hospital",
+    "mall",
+    "park",
+    "restaurant",
+    "school",
+    "station",
+    "supermarket",
+    "Total Population",
+    "Median Age",
+    "Per Capita Income",
+    "Total Families Below Poverty",
+    "Total Housing Units",
+    "Median Rent",
+    "Median Home Value",
+    "Total Labor Force",
+    "Unemployed Population",
+    "Total School Age Population",
+    "Total School Enrollment",
+    "Median Commute Time",
+    "price",
+    # Renamed / derived columns used by the design pages
+    "per_capita_income",
+    "lat",
+    "lon",
+]
+
+# column -> compact dtype, for every HouseTS column any loader may see
+HOUSE_TS_SCHEMA: Dict[str, str] = {
+    "date": "datetime64[ns]",
+    "year": "int16",
+    "zipcode": "int32",
+    "zip_code": "Int32",
+    "zip_code_str": ZIP5,
+    "city": "category",
+    "city_full": "category",
+    "city_clean": "category",
+    "city_geojson_code": "category",
+    **{col: "float32" for col in _FLOAT_COLUMNS},
+}
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Return the deep memory usage of a DataFrame in MB."""
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def csv_dtypes(
+    columns: Optional[Iterable[str]] = None,
+    schema: Mapping[str, str] = HOUSE_TS_SCHEMA,
+) -> Dict[str, str]:
+    """
+    Return a `dtype=` mapping for pd.read_csv.
+
+    Only floats and categoricals are parsed directly; integer and date
+    columns may contain gaps in the raw files and are converted afterwards
+    by apply_schema().
+    """
+    cols = schema.keys() if columns is None else [c for c in columns if c in schema]
+    out = {}
+    for col in cols:
+        dtype = schema[col]
+        if dtype in ("float32", "category"):
+            out[col] = dtype
+    return out
+
+
+def _to_zip5(s: pd.Series) -> pd.Series:
+    """
+    Format ZIP codes as zero-padded 5-character strings (categorical).
+
+    A missing ZIP becomes "00000", as the loaders always produced, so such
+    rows keep a key instead of dropping out of the zip_code_str joins.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(object)
+    if pd.api.types.is_numeric_dtype(s):
+        s = pd.to_numeric(s, errors="coerce").astype("Int64").astype("string")
+    s = s.astype("string").str.strip().fillna("").str.zfill(5)
+    return s.astype("category")
+
+
+def _has_dtype(s: pd.Series, dtype: str) -> bool:
+    """Return True if a column already has its declared dtype."""
+    if dtype.startswith("datetime"):
+        # Any resolution is fine; converting would copy the column
+        return pd.api.types.is_datetime64_any_dtype(s)
+    if dtype == ZIP5:
+        return isinstance(s.dtype, pd.CategoricalDtype)
+    return str(s.dtype) == dtype
+
+
+def _cast(s: pd.Series, dtype: str) -> pd.Series:
+    """Cast one column to its declared dtype."""
+    if dtype == ZIP5:
+        return _to_zip5(s)
+    if dtype == "category":
+        return s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+    if dtype.startswith("datetime"):
+        return pd.to_datetime(s, errors="coerce")
+    if dtype == "float32":
+        return pd.to_numeric(s, errors="coerce").astype("float32")
+    if dtype.startswith("int"):
+        values = pd.to_numeric(s, errors="coerce")
+        # Plain numpy ints cannot hold missing values; keep them nullable
+        return values.astype(dtype.capitalize() if values.isna().any() else dtype)
+    return s.astype(dtype)
+
+
+def apply_schema(
+    df: pd.DataFrame,
+    schema: Mapping[str, str] = HOUSE_TS_SCHEMA,
+    required: Sequence[str] = (),
+    name: str = "HouseTS",
+) -> pd.DataFrame:
+    """
+    Validate and downcast a DataFrame to its declared schema.
+
+    Columns not listed in the schema are left untouched.
+
+    Args:
+        df: DataFrame to convert
+        schema: Mapping of column name to compact dtype
+        required: Columns that must be present
+        name: Table name used in error and log messages
+
+    Returns:
+        New DataFrame with the declared dtypes applied
+
+    Raises:
+        ValueError: If a required column is missing
+    """
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        raise ValueError(f"{name} is missing required columns: {missing}")
+
+    before = memory_mb(df)
+    out = df.copy(deep=False)
+    for col, dtype in schema.items():
+        if col in out.columns and not _has_dtype(out[col], dtype):
+            out[col] = _cast(out[col], dtype)
+
+    after = memory_mb(out)
+    logger.info(
+        "%s: %d rows, %.1f MB -> %.1f MB (%.1f MB saved)",
+        name, len(out), before, after, before - after,
+    )
+    return out
+
+
+def categorical_to_str(df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Turn categorical key columns back into plain strings.
+
+    Used on small aggregated tables handed to plotly express, which would
+    otherwise reorder bars and traces by category order instead of data order.
+    """
+    if columns is None:
+        columns = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    columns = [c for c in columns if c in df.columns]
+    if not columns:
+        return df
+    return df.astype({c: str for c in columns})
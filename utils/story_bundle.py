@@ -0,0 +1,153 @@
+"""
+Precomputed Story page bundle.
+
+The Story page used to parse the ZIP-level HouseTS rows on first load and
+derive every chart input from them (ratios, composite series, metro summary,
+band counts, metro PTI lines). None of that depends on anything but the
+dataset version, so build_story_bundle() computes all of it offline and
+writes the tables into one small ZIP archive:
+
+    data/story_bundle.zip
+        manifest.json     build time, source, row counts
+        composite.parquet cross-metro averages per month (+ rating)
+        summary.parquet   metro x year PTI / rent-to-income (+ rating)
+        counts.parquet    metros per affordability band per year
+        metro_pti.parquet metro x month mean PTI
+
+The page reads only this file when it exists. Build it with:
+    python -m utils.build_data story
+"""
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+from .affordability import AFFORDABILITY_ORDER, classify_affordability
+from .aggregates import (
+    add_story_ratios,
+    read_source_rows,
+    story_band_counts,
+    story_composite_agg,
+    story_metro_pti_agg,
+    story_summary_agg,
+)
+from .house_store import DATA_DIR
+from .schema import categorical_to_str
+
+logger = logging.getLogger(__name__)
+
+STORY_BUNDLE_PATH = DATA_DIR / "story_bundle.zip"
+MANIFEST_NAME = "manifest.json"
+
+# Tables of the bundle, in the order they are written
+STORY_TABLES = ["composite", "summary", "counts", "metro_pti"]
+
+PathLike = Union[str, Path]
+
+
+def story_tables(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Compute every Story chart input from raw HouseTS rows.
+
+    df needs the aggregates SOURCE_COLUMNS (only date, year, city_full and
+    the price / income / rent measures are used).
+    """
+    story_rows = add_story_ratios(df)
+
+    comp = story_composite_agg(story_rows)
+    comp["affordability_rating"] = classify_affordability(comp["composite_pti"])
+
+    summary = story_summary_agg(story_rows)
+    summary["affordability_rating"] = classify_affordability(summary["price_to_income"])
+    # Plain-string metro names so plotly keeps the data order
+    summary = categorical_to_str(summary, ["city_full"])
+
+    return {
+        "composite": comp,
+        "summary": summary,
+        "counts": story_band_counts(summary),
+        "metro_pti": story_metro_pti_agg(story_rows),
+    }
+
+
+def write_story_bundle(
+    df: pd.DataFrame,
+    out_path: PathLike = STORY_BUNDLE_PATH,
+    source: str = "HouseTS",
+) -> Path:
+    """Compute the Story tables from df and write them to one archive."""
+    out_path = Path(out_path)
+    tables = story_tables(df)
+    manifest = {
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "source_rows": int(len(df)),
+        "tables": {name: {"file": f"{name}.parquet", "rows": int(len(tables[name]))} for name in STORY_TABLES},
+    }
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    # Parquet is already compressed, so the members are stored as-is
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED) as bundle:
+        for name in STORY_TABLES:
+            buffer = io.BytesIO()
+            tables[name].to_parquet(buffer, index=False)
+            bundle.writestr(f"{name}.parquet", buffer.getvalue())
+        bundle.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    tmp_path.replace(out_path)
+    logger.info(f"Wrote {out_path} ({out_path.stat().st_size / 1e3:.0f} kB)")
+    return out_path
+
+
+def build_story_bundle(
+    source_path: Optional[PathLike] = None,
+    out_path: PathLike = STORY_BUNDLE_PATH,
+) -> Path:
+    """
+    Build the Story page bundle from one read of HouseTS.
+
+    Args:
+        source_path: CSV or Parquet file with the raw HouseTS rows (None
+            reads through read_house_ts: IPC store, snapshot or raw CSV)
+        out_path: Output archive
+
+    Returns:
+        Path of the written bundle
+    """
+    df = read_source_rows(source_path)
+    source = str(source_path) if source_path is not None else "HouseTS"
+    return write_story_bundle(df, out_path, source=source)
+
+
+def story_bundle_exists(path: Optional[PathLike] = None) -> bool:
+    """Return True if the Story bundle has been built."""
+    return Path(path or STORY_BUNDLE_PATH).exists()
+
+
+def read_story_bundle(path: Optional[PathLike] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Load every table of the Story bundle.
+
+    Returns:
+        Mapping of table name (STORY_TABLES) to DataFrame
+    """
+    path = Path(path or STORY_BUNDLE_PATH)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Story bundle not found: {path}. "
+            "Run `python -m utils.build_data story` first."
+        )
+    with zipfile.ZipFile(path) as bundle:
+        tables = {name: pd.read_parquet(io.BytesIO(bundle.read(f"{name}.parquet"))) for name in STORY_TABLES}
+
+    # Parquet keeps the categories; make sure the band order is the shared one
+    for name in ("composite", "summary", "counts"):
+        tables[name]["affordability_rating"] = pd.Categorical(
+            tables[name]["affordability_rating"], categories=AFFORDABILITY_ORDER, ordered=True
+        )
+    return tables